@@ -1,8 +1,10 @@
 """
 Authentication and authorization utilities
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -12,22 +14,61 @@ from sqlalchemy import select
 from config import settings
 from database import get_db
 from models import User
+from user_cache import AuthUser, user_cache
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; min/max rounds pin the cost so hashes made with another cost "need update"
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 # JWT token security
 security = HTTPBearer()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+class PasswordHasher:
+    """Run bcrypt on a dedicated, size-limited thread pool
 
+    bcrypt is slow by design; run inline it would stall the event loop and every
+    other request with it. At most ``max_pending`` operations may be running or
+    waiting at once, further callers get HTTP 429 instead of an unbounded queue.
+    """
 
-def get_password_hash(password: str) -> str:
-    """Generate password hash"""
-    return pwd_context.hash(password)
+    def __init__(self, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bcrypt")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login requests in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Check a password; the second value is a new hash if the stored one uses an outdated cost"""
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -46,7 +87,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
-) -> User:
+) -> AuthUser:
     """Get current authenticated user from JWT token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,25 +95,14 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalar_one_or_none()
-
+    user = await resolve_token_user(credentials.credentials, db)
     if user is None:
         raise credentials_exception
 
     return user
 
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: AuthUser = Depends(get_current_user)) -> AuthUser:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -82,7 +112,7 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
 async def get_optional_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
     db: AsyncSession = Depends(get_db)
-) -> Optional[User]:
+) -> Optional[AuthUser]:
     """Get current user if authenticated, None otherwise (for testing mode)"""
     from config import settings
 
@@ -94,9 +124,16 @@ async def get_optional_user(
     if not credentials:
         return None
 
-    # Try to validate credentials
+    return await get_user_from_token(credentials.credentials, db)
+
+
+async def resolve_token_user(token: str, db: AsyncSession) -> Optional[AuthUser]:
+    """Return the user a valid token belongs to, served from the user cache when possible"""
+    user = user_cache.get(token)
+    if user is not None:
+        return user
+
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
@@ -105,6 +142,16 @@ async def get_optional_user(
         return None
 
     result = await db.execute(select(User).where(User.username == username))
-    user = result.scalar_one_or_none()
+    db_user = result.scalar_one_or_none()
+    if db_user is None:
+        return None
+
+    user = AuthUser.of(db_user)
+    user_cache.put(token, user, payload.get("exp"))
+    return user
+
 
+async def get_user_from_token(token: str, db: AsyncSession) -> Optional[AuthUser]:
+    """Resolve a JWT to an active user, None if the token is invalid (e.g. WebSocket query tokens)"""
+    user = await resolve_token_user(token, db)
     return user if user and user.is_active else None
@@ -0,0 +1,356 @@
+"""
+Conversion throughput benchmark
+Generates deterministic synthetic inputs (lavfi testsrc2 video, sine audio) and runs
+FFmpegConverter over them in each mode and at each concurrency level
+
+Reports frames per second, realtime factor, CPU seconds, peak RSS, output bytes,
+time to first segment and the number of chunks actually encoded in parallel, writes
+them as JSON and optionally compares them with a stored baseline, exiting with
+status 1 when a metric regressed past the threshold.
+
+Usage: python bench_conversion.py [--inputs 640x360:60:h264,1280x720:60:mpeg4]
+           [--modes copy,transcode,chunked,abr] [--concurrency 1,2] [--repeat 3]
+           [--output results.json] [--baseline baseline.json] [--threshold 0.1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Encoder arguments for each synthetic input codec
+INPUT_CODECS: Dict[str, List[str]] = {
+    "h264": ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p"],
+    "hevc": ["-c:v", "libx265", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-tag:v", "hvc1"],
+    "mpeg4": ["-c:v", "mpeg4", "-q:v", "5"],
+}
+
+# FFmpegConverter keyword arguments of each mode (copy falls back to a transcode for
+# sources that cannot be remuxed; the result records the path actually taken)
+MODES: Dict[str, Dict[str, Any]] = {
+    "copy": {},
+    "transcode": {"stream_copy": False},
+    "chunked": {"chunked": True, "stream_copy": False},
+    "abr": {"renditions": ["720p", "360p"]},
+}
+
+# Compared against the baseline: whether a higher or a lower value is better
+METRICS: Dict[str, str] = {
+    "fps": "higher",
+    "realtime": "higher",
+    "cpu_seconds": "lower",
+    "peak_rss_bytes": "lower",
+    "output_bytes": "lower",
+    "time_to_first_segment": "lower",
+}
+
+SAMPLE_SECONDS = 0.05  # polling interval for RSS and the first segment
+
+
+def parse_input(spec: str) -> Dict[str, Any]:
+    """'1280x720:10:h264' -> width, height, seconds and codec"""
+    size, seconds, codec = spec.split(":")
+    width, height = (int(value) for value in size.split("x"))
+    if codec not in INPUT_CODECS:
+        raise ValueError(f"Unknown input codec: {codec}. Allowed: {', '.join(INPUT_CODECS)}")
+    return {"spec": spec, "width": width, "height": height, "seconds": float(seconds), "codec": codec}
+
+
+def generate_input(source: Dict[str, Any], fps: int, input_dir: Path) -> Path:
+    """Encode a synthetic test clip, reused when it already exists
+
+    testsrc2 and sine are deterministic and bitexact flags keep encoder version
+    strings out of the file, so the same arguments give the same input every run.
+    """
+    path = input_dir / f"testsrc2_{source['width']}x{source['height']}_{fps}fps_{source['seconds']:g}s_{source['codec']}.mp4"
+    if path.exists():
+        return path
+    input_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp.mp4")
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={source['width']}x{source['height']}:rate={fps}:duration={source['seconds']:g}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={source['seconds']:g}",
+        *INPUT_CODECS[source["codec"]],
+        "-c:a", "aac", "-b:a", "128k",
+        "-fflags", "+bitexact", "-flags:v", "+bitexact", "-flags:a", "+bitexact",
+        str(tmp_path),
+    ]
+    subprocess.run(cmd, check=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _children_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _rss_bytes(pid: int) -> int:
+    """Resident set size of a process, 0 once it is gone (or without /proc)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return 0
+
+
+def _has_segment(output_dir: Path) -> bool:
+    # Segments are renamed into place once complete (hls temp_file), so any match is whole
+    return any(output_dir.rglob("segment_*")) or (output_dir / "media.mp4").exists()
+
+
+def _first_segment_mtime(output_dir: Path) -> Optional[float]:
+    """When the earliest segment was completed, for conversions faster than the polling"""
+    times = [path.stat().st_mtime for path in output_dir.rglob("segment_*")]
+    return min(times) if times else None
+
+
+async def run_case(
+    input_file: Path,
+    source: Dict[str, Any],
+    fps: int,
+    mode: str,
+    concurrency: int,
+    workdir: Path,
+    options: Dict[str, Any],
+    pin: bool,
+) -> Dict[str, Any]:
+    """Convert ``input_file`` ``concurrency`` times at once and measure the batch"""
+    from cpu_budget import CPUAllocator
+    from disk_usage import measure_output
+    from ffmpeg_converter import FFmpegConverter
+
+    allocator = CPUAllocator(concurrency, reserved=0, pin=pin)
+    converters = []
+    for i in range(concurrency):
+        output_dir = workdir / f"{mode}_{concurrency}_{i}"
+        converter = FFmpegConverter(input_file, output_dir, **{**MODES[mode], **options})
+        if converter.chunked:
+            converter.chunk_workers = os.cpu_count() or 1
+        converter.cpu_budget = allocator.acquire(output_dir.name, demand=concurrency)
+        converters.append(converter)
+
+    first_segment: List[Optional[float]] = [None] * concurrency
+    peak_rss = 0
+    done = asyncio.Event()
+
+    async def monitor(started: float):
+        nonlocal peak_rss
+        while not done.is_set():
+            rss = 0
+            for i, converter in enumerate(converters):
+                for process in [converter.process, *converter.chunk_processes]:
+                    if process and process.returncode is None:
+                        rss += _rss_bytes(process.pid)
+                if first_segment[i] is None and converter.output_dir.exists() and _has_segment(converter.output_dir):
+                    first_segment[i] = time.perf_counter() - started
+            peak_rss = max(peak_rss, rss)
+            try:
+                await asyncio.wait_for(done.wait(), SAMPLE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    cpu_before = _children_cpu_seconds()
+    started_at = time.time()
+    started = time.perf_counter()
+    monitor_task = asyncio.create_task(monitor(started))
+    results = await asyncio.gather(*(converter.convert() for converter in converters))
+    wall = time.perf_counter() - started
+    done.set()
+    await monitor_task
+    cpu_seconds = _children_cpu_seconds() - cpu_before
+
+    output_bytes = 0
+    for i, converter in enumerate(converters):
+        output_bytes += (await asyncio.to_thread(measure_output, converter.output_dir))[0]
+        if first_segment[i] is None:
+            completed_at = await asyncio.to_thread(_first_segment_mtime, converter.output_dir)
+            if completed_at is not None:
+                first_segment[i] = max(completed_at - started_at, 0.0)
+        await asyncio.to_thread(shutil.rmtree, converter.output_dir, True)
+    segment_times = [t for t in first_segment if t is not None]
+
+    return {
+        "ok": all(results),
+        "conversion_path": "abr" if converters[0].renditions else converters[0].conversion_path,
+        "wall_seconds": wall,
+        # Totals over every concurrent conversion
+        "fps": source["seconds"] * fps * concurrency / wall,
+        "realtime": source["seconds"] * concurrency / wall,
+        "cpu_seconds": cpu_seconds,
+        "peak_rss_bytes": peak_rss or None,
+        "output_bytes": output_bytes,
+        "time_to_first_segment": statistics.median(segment_times) if segment_times else None,
+        # Parallel encodes per conversion; chunked mode falls back to 1 for inputs under 2 * MIN_CHUNK_SECONDS
+        "chunks": converters[0].chunk_count,
+    }
+
+
+def _median_result(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Median of every numeric metric over repeated runs (the lower middle run for even counts)"""
+    result = dict(runs[-1])
+    result["ok"] = all(run["ok"] for run in runs)
+    for key in ["wall_seconds", *METRICS]:
+        values = [run[key] for run in runs if run[key] is not None]
+        result[key] = statistics.median_low(values) if values else None
+    return result
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Describe every metric that got worse than the baseline by more than ``threshold``"""
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = previous.get(result["name"])
+        if base is None:
+            continue
+        for metric, better in METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if better == "higher" else change
+            if worse > threshold:
+                regressions.append(f"{result['name']}: {metric} {old:.4g} -> {new:.4g} ({change:+.1%})")
+    return regressions
+
+
+def _ffmpeg_version() -> Optional[str]:
+    try:
+        return subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def main(args: argparse.Namespace) -> int:
+    sources = [parse_input(spec) for spec in args.inputs.split(",")]
+    modes = args.modes.split(",")
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        raise SystemExit(f"Unknown modes: {', '.join(unknown)}. Allowed: {', '.join(MODES)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    options: Dict[str, Any] = {"segment_duration": args.segment_duration, "segment_format": args.segment_format}
+    if args.profile:
+        options["encoding_profile"] = args.profile
+
+    if "chunked" in modes:
+        from ffmpeg_converter import MIN_CHUNK_SECONDS
+        for source in sources:
+            if source["seconds"] < 2 * MIN_CHUNK_SECONDS:
+                print(f"Warning: {source['spec']} is shorter than {2 * MIN_CHUNK_SECONDS}s, "
+                      "so chunked mode runs it as a single transcode")
+
+    input_dir = Path(args.input_dir)
+    workdir = Path(tempfile.mkdtemp(prefix="bench_conversion_"))
+    results = []
+    print(f"{'case':40s} {'path':12s} {'fps':>8s} {'realtime':>9s} {'cpu s':>8s} {'peak rss':>9s} {'bytes':>11s} {'first seg':>9s}")
+    for source in sources:
+        input_file = await asyncio.to_thread(generate_input, source, args.fps, input_dir)
+        for mode in modes:
+            for concurrency in levels:
+                runs = []
+                for _ in range(args.repeat):
+                    runs.append(await run_case(
+                        input_file, source, args.fps, mode, concurrency, workdir, options, args.pin
+                    ))
+                result = {
+                    "name": f"{source['spec']}/{mode}/x{concurrency}",
+                    "input": source["spec"],
+                    "mode": mode,
+                    "concurrency": concurrency,
+                    **_median_result(runs),
+                }
+                results.append(result)
+                rss = f"{result['peak_rss_bytes'] / 1048576:7.1f}MB" if result["peak_rss_bytes"] else f"{'-':>9s}"
+                first = f"{result['time_to_first_segment']:8.2f}s" if result["time_to_first_segment"] is not None else f"{'-':>9s}"
+                print(
+                    f"{result['name']:40s} {result['conversion_path'] or '-':12s} {result['fps']:8.1f} "
+                    f"{result['realtime']:8.2f}x {result['cpu_seconds']:8.2f} {rss} {result['output_bytes']:11d} {first}"
+                    + (f"  {result['chunks']} chunks" if mode == "chunked" else "")
+                    + ("" if result["ok"] else "  FAILED")
+                )
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "commit": _git_commit(),
+            "ffmpeg": _ffmpeg_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "fps": args.fps,
+            "repeat": args.repeat,
+            "options": options,
+            "pin": args.pin,
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+    status = 0 if all(result["ok"] for result in results) else 1
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%} against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            status = 1
+        else:
+            print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--inputs", default="640x360:60:h264,1280x720:60:h264,1280x720:60:mpeg4",
+                        help="comma-separated WIDTHxHEIGHT:SECONDS:CODEC (codecs: h264, hevc, mpeg4)")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated, from {', '.join(MODES)}")
+    parser.add_argument("--concurrency", default="1,2", help="comma-separated numbers of simultaneous conversions")
+    parser.add_argument("--fps", type=int, default=25, help="frame rate of the synthetic inputs")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; metrics are the median")
+    parser.add_argument("--profile", default=None, help="encoding profile (default: the converter's)")
+    parser.add_argument("--segment-duration", type=int, default=6)
+    parser.add_argument("--segment-format", default="ts")
+    parser.add_argument("--pin", action="store_true", help="pin concurrent conversions to disjoint cores")
+    parser.add_argument("--input-dir", default=os.path.join(tempfile.gettempdir(), "bench_conversion_inputs"),
+                        help="where generated inputs are kept and reused")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    # Throwaway database and directories, so the benchmark never touches real data
+    workdir = tempfile.mkdtemp(prefix="bench_conversion_env_")
+    os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{workdir}/bench.db")
+    for name in ("INPUT_DIR", "OUTPUT_DIR", "DATA_DIR"):
+        os.environ.setdefault(name, os.path.join(workdir, name.lower()))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    sys.exit(asyncio.run(main(args)))
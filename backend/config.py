@@ -1,9 +1,11 @@
 """
 Configuration settings for the FastAPI backend
 """
+import os
 import sys
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -15,6 +17,14 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "dev-secret-key-change-in-production-INSECURE"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Verified tokens and their users kept in memory (0 disables), and for how many seconds
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: int = 60
+    # bcrypt cost factor; stored hashes with a different cost are rehashed on login
+    BCRYPT_ROUNDS: int = 12
+    # Threads reserved for password hashing, and hashing requests allowed to wait (more get HTTP 429)
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
 
     # Testing - Set to False to disable authentication (ONLY FOR DEVELOPMENT!)
     ENABLE_AUTH: bool = False
@@ -31,6 +41,16 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = f"sqlite+aiosqlite:///{BASE_DIR}/data/video_platform.db"
+    # SQLite tuning: WAL lets API reads run while conversions commit
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # safe with WAL, far fewer fsyncs than FULL
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # wait this long for a lock instead of "database is locked"
+    SQLITE_MMAP_SIZE: int = 268435456  # 256MB of the database file memory-mapped
+    # PostgreSQL (postgresql+asyncpg://...) connection pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_PRE_PING: bool = True  # test connections before use, survives server restarts
+    DB_POOL_RECYCLE: int = 1800  # seconds before a pooled connection is replaced
 
     # CORS
     CORS_ORIGINS: list = [
@@ -45,6 +65,72 @@ class Settings(BaseSettings):
     # File Upload
     MAX_UPLOAD_SIZE: int = 5368709120  # 5GB in bytes
 
+    # Conversion queue
+    # Number of ffmpeg jobs allowed to run at once (defaults to half the CPU cores)
+    MAX_CONCURRENT_CONVERSIONS: int = max(1, (os.cpu_count() or 2) // 2)
+    # Seconds shutdown waits for running conversions before interrupting them
+    # (interrupted conversions resume from their last complete segment on next start)
+    SHUTDOWN_GRACE_PERIOD: int = 30
+    # CPU budget per job (see cpu_budget.py): cores kept free for the API, whether each job is
+    # pinned to its own cores, and the niceness of priority-0 jobs (one step less per priority point)
+    CONVERSION_RESERVED_CPUS: int = 1
+    CONVERSION_CPU_PINNING: bool = False
+    CONVERSION_NICE: int = 10
+
+    # Adaptive bitrate ladder used when a conversion asks for abr=true
+    # (comma-separated rendition names from ffmpeg_converter.RENDITION_PRESETS)
+    ABR_LADDER: str = "1080p,720p,480p,360p"
+
+    # Encoding profile used when a conversion names none (see encoding_profiles.ENCODING_PROFILES)
+    DEFAULT_ENCODING_PROFILE: str = "standard"
+
+    # Parallel ffmpeg processes (and time ranges) used by chunked conversions
+    CHUNK_WORKERS: int = os.cpu_count() or 1
+
+    # Minimum milliseconds between .progress.json snapshot writes per video
+    PROGRESS_FLUSH_INTERVAL_MS: int = 500
+
+    # Seconds before a hung ffprobe is killed
+    FFPROBE_TIMEOUT: int = 60
+    # Seconds allowed for the keyframe scan, which reads every packet of the video stream
+    FFPROBE_KEYFRAME_TIMEOUT: int = 300
+
+    # Conversion cache: reuse outputs of identical input content + parameters.
+    # Entries are hard-linked into OUTPUT_DIR, so keep the cache on the same filesystem.
+    # Watermarked conversions bypass it (their output is unique per user and minute).
+    CONVERSION_CACHE_ENABLED: bool = True
+    CONVERSION_CACHE_DIR: Path = DATA_DIR / "conversion_cache"
+
+    # WebSocket progress: unsent updates kept per client (latest per video), and
+    # seconds a single send may take before the client is disconnected
+    WS_SEND_QUEUE_SIZE: int = 64
+    WS_SEND_TIMEOUT: int = 10
+
+    # Resumable uploads: partial files live in UPLOAD_DIR (defaults to INPUT_DIR/.uploads,
+    # which must share INPUT_DIR's filesystem so finalizing is a rename, not a copy)
+    UPLOAD_DIR: Optional[Path] = None
+    UPLOAD_CHUNK_SIZE: int = 8388608  # 8MB, suggested to clients
+    UPLOAD_SESSION_TTL_HOURS: int = 24  # idle sessions older than this are deleted
+
+    # Seconds between re-measurements of output directories to correct disk usage counters
+    DISK_USAGE_RECONCILE_INTERVAL: int = 3600
+
+    # Deleted output directories are renamed into TRASH_DIR (defaults to OUTPUT_DIR/.trash, must be
+    # on OUTPUT_DIR's filesystem) and removed in the background by this many concurrent threads
+    TRASH_DIR: Optional[Path] = None
+    TRASH_REAP_CONCURRENCY: int = 4
+
+    # Seconds clients may cache an HLS playlist served by /hls (segments are versioned instead)
+    HLS_PLAYLIST_MAX_AGE: int = 2
+    # In-memory LRU cache of served playlists and segments: total bytes (0 disables),
+    # largest single file cached, and segments per playlist loaded when a conversion completes
+    HLS_CACHE_MAX_BYTES: int = 268435456  # 256MB
+    HLS_CACHE_MAX_ENTRY_BYTES: int = 16777216  # 16MB
+    HLS_CACHE_PREWARM_SEGMENTS: int = 0
+
+    # Prometheus metrics at /metrics (request, database, queue and conversion timings)
+    METRICS_ENABLED: bool = True
+
     class Config:
         env_file = ".env"
 
@@ -55,10 +141,15 @@ settings = Settings()
 settings.INPUT_DIR.mkdir(exist_ok=True)
 settings.OUTPUT_DIR.mkdir(exist_ok=True)
 settings.DATA_DIR.mkdir(exist_ok=True)
+settings.CONVERSION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+if settings.UPLOAD_DIR is None:
+    settings.UPLOAD_DIR = settings.INPUT_DIR / ".uploads"
+settings.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+if settings.TRASH_DIR is None:
+    settings.TRASH_DIR = settings.OUTPUT_DIR / ".trash"
 
 # Security check for production
 if settings.SECRET_KEY == "dev-secret-key-change-in-production-INSECURE":
-    import os
     if os.getenv("ENVIRONMENT", "development").lower() == "production":
         print("=" * 80)
         print("CRITICAL SECURITY WARNING!")
@@ -0,0 +1,170 @@
+"""
+Conversion result cache
+Reuses the HLS output of an earlier conversion with identical input content and encoding parameters
+"""
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from database import AsyncSessionLocal
+from models import CacheEntry
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+KEY_LOCK_STRIPES = 64  # locks shared by hash of the cache key, serialising work on one entry
+
+
+def compute_cache_key(input_file: Path, params: Dict[str, Any]) -> str:
+    """Hash the input file content together with every encoding parameter"""
+    digest = hashlib.sha256()
+    with open(input_file, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def link_tree(src: Path, dst: Path):
+    """Hard-link every media file under ``src`` into ``dst`` (copy across filesystems)
+
+    Dotfiles (progress, logs) belong to a single conversion and are skipped.
+    """
+    for path in src.rglob("*"):
+        relative = path.relative_to(src)
+        if not path.is_file() or any(part.startswith(".") for part in relative.parts):
+            continue
+        target = dst / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copy2(path, target)
+
+
+class ConversionCache:
+    """Reference-counted store of finished conversion outputs, keyed by content hash
+
+    Cached files are hard-linked into each video's output directory, so deleting
+    one video's directory never affects another video sharing the same entry.
+    The cache copy itself is removed when the last referencing video releases it.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self._locks = [asyncio.Lock() for _ in range(KEY_LOCK_STRIPES)]
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        return self._locks[int(key[:8], 16) % KEY_LOCK_STRIPES]
+
+    async def key_for(self, input_file: Path, params: Dict[str, Any]) -> str:
+        """Compute the cache key without blocking the event loop"""
+        return await asyncio.to_thread(compute_cache_key, input_file, params)
+
+    async def acquire(self, key: str) -> Optional[Dict[str, Any]]:
+        """Take a reference to a cached result and return its metadata, or None on a miss"""
+        async with self._lock(key), AsyncSessionLocal() as db:
+            result = await db.execute(select(CacheEntry).where(CacheEntry.key == key))
+            entry = result.scalar_one_or_none()
+            if entry is None:
+                return None
+
+            if not (self.cache_dir / key).is_dir():
+                # Files were removed behind our back, forget the entry
+                await db.delete(entry)
+                await db.commit()
+                return None
+
+            entry.ref_count += 1
+            await db.commit()
+            return json.loads(entry.metadata_json or "{}")
+
+    async def restore(self, key: str, output_dir: Path):
+        """Link the cached files into a video's (empty) output directory"""
+        output_dir.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(link_tree, self.cache_dir / key, output_dir)
+
+    async def store(self, key: str, output_dir: Path, metadata: Dict[str, Any]):
+        """Add a finished conversion to the cache, holding one reference for its video
+
+        The files are linked into a scratch directory and only moved to the entry's
+        place once this call owns the row, so an entry directory another conversion
+        has committed is never replaced.
+        """
+        async with self._lock(key):
+            if await self._share(key):
+                # An identical conversion finished first
+                return
+
+            entry_dir = self.cache_dir / key
+            scratch = self.cache_dir / f".{key}.{secrets.token_hex(4)}"
+            await asyncio.to_thread(link_tree, output_dir, scratch)
+            try:
+                async with AsyncSessionLocal() as db:
+                    db.add(CacheEntry(
+                        key=key,
+                        ref_count=1,
+                        metadata_json=json.dumps(metadata),
+                    ))
+                    try:
+                        await db.flush()
+                    except IntegrityError:
+                        # Stored by another process in the meantime
+                        await db.rollback()
+                        await self._share(key)
+                        return
+
+                    # No committed row owns a directory left at the entry's place
+                    if entry_dir.exists():
+                        await asyncio.to_thread(shutil.rmtree, entry_dir)
+                    await asyncio.to_thread(os.replace, scratch, entry_dir)
+                    await db.commit()
+            finally:
+                await asyncio.to_thread(shutil.rmtree, scratch, True)
+
+    async def _share(self, key: str) -> bool:
+        """Take a reference to an existing entry for a new copy of its output"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(CacheEntry).where(CacheEntry.key == key))
+            entry = result.scalar_one_or_none()
+            if entry is None:
+                return False
+            entry.ref_count += 1
+            await db.commit()
+            return True
+
+    async def release(self, key: Optional[str]):
+        """Drop one reference; the cached files are deleted with the last one"""
+        if not key:
+            return
+
+        async with self._lock(key):
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(CacheEntry).where(CacheEntry.key == key))
+                entry = result.scalar_one_or_none()
+                if entry is None:
+                    return
+
+                entry.ref_count -= 1
+                remove = entry.ref_count <= 0
+                if remove:
+                    await db.delete(entry)
+                await db.commit()
+
+            if remove:
+                await asyncio.to_thread(shutil.rmtree, self.cache_dir / key, True)
+
+    async def clear(self):
+        """Drop every cache entry and its files"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(CacheEntry))
+            await db.commit()
+
+        for entry_dir in list(self.cache_dir.iterdir()):
+            await asyncio.to_thread(shutil.rmtree, entry_dir, True)
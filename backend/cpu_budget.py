@@ -0,0 +1,122 @@
+"""
+CPU budgets for conversions
+Divides the machine's cores between running ffmpeg jobs and sets their scheduling priority
+"""
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+
+def available_cpus() -> List[int]:
+    """Cores this process may run on (respects container and taskset limits)"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+class CPUBudget:
+    """Threads, cores and scheduling priority one conversion job may use"""
+
+    def __init__(self, threads: int, cpus: Optional[List[int]], nice: int, ionice_class: int, ionice_level: int):
+        self.threads = threads
+        # Cores the job's processes are pinned to; None leaves placement to the kernel
+        self.cpus = cpus
+        self.nice = nice
+        # ionice scheduling class: 2 best-effort (with level 0-7, lower is favoured), 3 idle
+        self.ionice_class = ionice_class
+        self.ionice_level = ionice_level
+
+    def command_prefix(self) -> List[str]:
+        """nice/ionice/taskset wrappers that apply this budget to a command before it starts
+
+        The wrappers exec the command, so the process keeps their PID, and the
+        settings hold for every thread FFmpeg creates. Missing tools are skipped.
+        """
+        prefix: List[str] = []
+        if self.nice and shutil.which("nice"):
+            prefix.extend(["nice", "-n", str(self.nice)])
+        if shutil.which("ionice"):
+            prefix.extend(["ionice", "-c", str(self.ionice_class)])
+            if self.ionice_class == 2:
+                prefix.extend(["-n", str(self.ionice_level)])
+        if self.cpus and shutil.which("taskset"):
+            prefix.extend(["taskset", "-c", ",".join(str(cpu) for cpu in self.cpus)])
+        return prefix
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "threads": self.threads,
+            "cpus": self.cpus,
+            "nice": self.nice,
+            "ionice_class": self.ionice_class,
+            "ionice_level": self.ionice_level,
+        }
+
+
+class CPUAllocator:
+    """Work out each job's CPU budget from the core count and the jobs running or waiting
+
+    ``reserved`` cores are kept out of every budget (and never pinned to) so the API
+    stays responsive while encodes run. A job starting while ``demand`` jobs compete
+    for the ``max_jobs`` slots gets an even share of the remaining cores; with
+    ``pin`` it is bound to the least used of them, so shares are disjoint whenever
+    the cores go round.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int,
+        reserved: int = 1,
+        pin: bool = False,
+        base_nice: int = 10,
+        cpus: Optional[List[int]] = None,
+    ):
+        self.max_jobs = max(1, max_jobs)
+        cpus = cpus if cpus is not None else available_cpus()
+        # Never reserve every core
+        self.cpus = cpus[min(max(reserved, 0), len(cpus) - 1):]
+        self.pin = pin
+        self.base_nice = base_nice
+        # Jobs pinned to each core
+        self._load: Dict[int, int] = {cpu: 0 for cpu in self.cpus}
+        self._budgets: Dict[str, CPUBudget] = {}
+
+    def process_priority(self, priority: int) -> Dict[str, int]:
+        """nice and ionice settings for a job priority (higher priority, less nice)"""
+        nice = min(max(self.base_nice - priority, 0), 19)
+        if priority < 0:
+            # Background work only gets disk time nothing else wants
+            return {"nice": nice, "ionice_class": 3, "ionice_level": 0}
+        return {"nice": nice, "ionice_class": 2, "ionice_level": nice * 8 // 20}
+
+    def acquire(self, video_name: str, priority: int = 0, demand: int = 1) -> CPUBudget:
+        """Allot a budget to a starting job; ``demand`` counts it plus the others running or queued"""
+        self.release(video_name)
+        concurrency = min(max(demand, len(self._budgets) + 1), self.max_jobs)
+        threads = max(1, len(self.cpus) // concurrency)
+
+        cpus = None
+        if self.pin:
+            # Least loaded first, lowest number breaking ties, so shares stay contiguous
+            cpus = sorted(sorted(self.cpus, key=lambda cpu: (self._load[cpu], cpu))[:threads])
+            for cpu in cpus:
+                self._load[cpu] += 1
+
+        budget = CPUBudget(threads, cpus, **self.process_priority(priority))
+        self._budgets[video_name] = budget
+        return budget
+
+    def release(self, video_name: str):
+        budget = self._budgets.pop(video_name, None)
+        if budget and budget.cpus:
+            for cpu in budget.cpus:
+                self._load[cpu] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cpus": len(self.cpus),
+            "pinning": self.pin,
+            "allotted_threads": sum(budget.threads for budget in self._budgets.values()),
+            "jobs": {name: budget.to_dict() for name, budget in self._budgets.items()},
+        }
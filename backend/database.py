@@ -1,17 +1,55 @@
 """
 Database setup and session management
 """
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from config import settings
 
+
+def _database_url() -> str:
+    """DATABASE_URL with plain PostgreSQL URLs mapped to the asyncpg driver"""
+    url = settings.DATABASE_URL
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+def _engine_options(url: str) -> dict:
+    """Driver-specific engine arguments"""
+    if make_url(url).get_backend_name() == "sqlite":
+        # Seconds the driver waits on a locked database file
+        return {"connect_args": {"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+
 # Create async engine
+DATABASE_URL = _database_url()
 engine = create_async_engine(
-    settings.DATABASE_URL,
+    DATABASE_URL,
     echo=False,
-    future=True
+    future=True,
+    **_engine_options(DATABASE_URL)
 )
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Apply journal, durability, lock-wait and mmap settings to every new connection"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.close()
+
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -33,6 +71,6 @@ async def get_db():
 
 
 async def init_db():
-    """Initialize database tables"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    """Bring the database schema up to date (see migrations.py)"""
+    from migrations import run_migrations
+    return await run_migrations()
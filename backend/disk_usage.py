@@ -0,0 +1,125 @@
+"""
+Disk usage accounting
+Per-video byte and segment counters are stored on the video row; this module
+measures output directories and periodically reconciles the stored counters
+"""
+import asyncio
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+from sqlalchemy import select, update
+
+from database import AsyncSessionLocal
+from hls_playlist import parse_media_playlist
+from models import Video
+
+
+def format_size(size_bytes: int) -> str:
+    """Format bytes to human-readable size"""
+    for unit in ["B", "K", "M", "G", "T"]:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f}{unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f}P"
+
+
+def measure_output(output_dir: Path, segment_dir: Optional[Path] = None) -> Tuple[int, int]:
+    """Return (total bytes under ``output_dir``, segment files directly in ``segment_dir``)
+
+    Uses a single scandir pass; ``segment_dir`` defaults to ``output_dir`` and is
+    one rendition's directory for multi-rendition output. Dotfiles (progress,
+    logs, scratch directories) are bookkeeping and not counted. Single-file
+    output has no segment files, so its segments are counted from the playlist.
+    """
+    segment_dir = segment_dir or output_dir
+    total_bytes = 0
+    segments = 0
+    pending = [output_dir]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(Path(entry.path))
+            elif entry.is_file(follow_symlinks=False):
+                total_bytes += entry.stat(follow_symlinks=False).st_size
+                if entry.name.startswith("segment_") and Path(directory) == segment_dir:
+                    segments += 1
+
+    playlist = segment_dir / "playlist.m3u8"
+    if not segments and playlist.exists():
+        try:
+            segments = len(parse_media_playlist(playlist))
+        except (OSError, ValueError):
+            pass
+    return total_bytes, segments
+
+
+def segment_dir_for(output_dir: Path, renditions: Optional[str]) -> Path:
+    """Directory whose segments are counted (the first rendition for multi-rendition output)"""
+    if renditions:
+        return output_dir / renditions.split(",")[0]
+    return output_dir
+
+
+class DiskUsageReconciler:
+    """Periodically re-measure output directories and correct drifted counters
+
+    Counters are maintained when conversions finish and videos are deleted; this
+    catches anything changed behind the application's back. Videos with a running
+    conversion are skipped, their counters are set when the job finishes.
+    """
+
+    def __init__(self, output_dir: Path, interval: float):
+        self.output_dir = output_dir
+        self.interval = interval
+
+    async def reconcile(self) -> int:
+        """Re-measure every video once; returns how many rows were corrected"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Video.id, Video.name, Video.renditions, Video.output_bytes, Video.segments)
+                .where(Video.status != "converting")
+            )
+            rows = result.all()
+
+        corrected = 0
+        for video_id, name, renditions, output_bytes, segments in rows:
+            output_dir = self.output_dir / name
+            measured_bytes, measured_segments = await asyncio.to_thread(
+                measure_output, output_dir, segment_dir_for(output_dir, renditions)
+            )
+            if (measured_bytes, measured_segments) == (output_bytes or 0, segments or 0):
+                continue
+
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Video)
+                    .where(Video.id == video_id)
+                    .where(Video.status != "converting")
+                    .values(
+                        output_bytes=measured_bytes,
+                        output_size=format_size(measured_bytes) if measured_bytes else None,
+                        segments=measured_segments,
+                    )
+                )
+                await db.commit()
+            corrected += 1
+        return corrected
+
+    async def run(self):
+        """Reconcile forever, every ``interval`` seconds"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                corrected = await self.reconcile()
+                if corrected:
+                    print(f"Corrected disk usage of {corrected} video(s)")
+            except Exception as e:
+                print(f"Disk usage reconciliation failed: {e}")
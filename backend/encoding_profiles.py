@@ -0,0 +1,66 @@
+"""
+Encoding profiles
+Named libx264/aac settings defined by the server, optionally adjusted per conversion
+"""
+import re
+from typing import Any, Dict, Optional
+
+X264_PRESETS = (
+    "ultrafast", "superfast", "veryfast", "faster", "fast",
+    "medium", "slow", "slower", "veryslow",
+)
+X264_TUNES = ("film", "animation", "grain", "stillimage", "fastdecode", "zerolatency")
+
+# Settings of each profile:
+#   preset        - libx264 speed/compression trade-off (X264_PRESETS)
+#   crf           - constant quality, 0 (lossless) to 51; ABR ladder rungs keep their target bitrates instead
+#   gop           - longest keyframe interval in seconds, capped at the segment duration
+#                   (keyframes are always forced at segment boundaries as well)
+#   tune          - libx264 tune (X264_TUNES) or None
+#   audio_bitrate - AAC bitrate when audio is re-encoded; ABR ladder rungs keep their own
+#   threads       - encoder threads, 0 uses the job's CPU budget (see cpu_budget.py)
+ENCODING_PROFILES: Dict[str, Dict[str, Any]] = {
+    "preview": {"preset": "ultrafast", "crf": 28, "gop": 2, "tune": "fastdecode", "audio_bitrate": "96k", "threads": 0},
+    "fast": {"preset": "veryfast", "crf": 23, "gop": 2, "tune": None, "audio_bitrate": "128k", "threads": 0},
+    "standard": {"preset": "medium", "crf": 23, "gop": 2, "tune": None, "audio_bitrate": "128k", "threads": 0},
+    "quality": {"preset": "slow", "crf": 20, "gop": 2, "tune": "film", "audio_bitrate": "192k", "threads": 0},
+}
+
+# Used by conversions that name no profile (and by jobs queued before profiles existed)
+DEFAULT_PROFILE = "standard"
+
+_AUDIO_BITRATE = re.compile(r"^(\d+)k$")
+
+
+def _validate_setting(key: str, value: Any):
+    if key == "preset":
+        valid = value in X264_PRESETS
+    elif key == "crf":
+        valid = isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 51
+    elif key == "gop":
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool) and 0 < value <= 30
+    elif key == "tune":
+        valid = value is None or value in X264_TUNES
+    elif key == "audio_bitrate":
+        match = _AUDIO_BITRATE.match(value) if isinstance(value, str) else None
+        valid = match is not None and 32 <= int(match.group(1)) <= 512
+    elif key == "threads":
+        valid = isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 64
+    else:
+        raise ValueError(f"Unknown encoding setting: {key}")
+    if not valid:
+        raise ValueError(f"Invalid value for encoding setting {key}: {value!r}")
+
+
+def resolve_encoding(profile: str, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Return the settings of ``profile`` with ``overrides`` applied
+
+    Raises ValueError for an unknown profile, setting or out-of-range value.
+    """
+    if profile not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile: {profile}. Allowed: {', '.join(ENCODING_PROFILES)}")
+    settings = dict(ENCODING_PROFILES[profile])
+    for key, value in (overrides or {}).items():
+        _validate_setting(key, value)
+        settings[key] = value
+    return settings
@@ -3,51 +3,235 @@ FFmpeg video conversion module
 Converts videos to HLS format with progress tracking
 """
 import asyncio
-import subprocess
+import bisect
 import json
-import re
+import os
+import shutil
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import AsyncIterator, Optional, Dict, Any, List, Tuple
 from datetime import datetime
 
+from cpu_budget import CPUBudget
+from disk_usage import format_size, measure_output
+from encoding_profiles import DEFAULT_PROFILE, resolve_encoding
+from ffmpeg_progress import FFmpegProgressParser
+from hls_playlist import PlaylistEntry, parse_media_playlist, write_media_playlist
+from media_probe import ProbeError, probe_media
+from progress_registry import FINAL_STATUSES, progress_registry
+
+
+# Adaptive bitrate ladder rungs: output height and libx264/aac target bitrates
+RENDITION_PRESETS: Dict[str, Dict[str, Any]] = {
+    "1080p": {"height": 1080, "video_bitrate": "5000k", "maxrate": "5350k", "bufsize": "7500k", "audio_bitrate": "192k"},
+    "720p": {"height": 720, "video_bitrate": "2800k", "maxrate": "2996k", "bufsize": "4200k", "audio_bitrate": "128k"},
+    "480p": {"height": 480, "video_bitrate": "1400k", "maxrate": "1498k", "bufsize": "2100k", "audio_bitrate": "128k"},
+    "360p": {"height": 360, "video_bitrate": "800k", "maxrate": "856k", "bufsize": "1200k", "audio_bitrate": "96k"},
+}
+
+# Source codecs that can be remuxed into HLS without re-encoding
+COPYABLE_VIDEO_CODECS = {"h264"}
+COPYABLE_VIDEO_PROFILES = {"Constrained Baseline", "Baseline", "Main", "High"}
+COPYABLE_PIXEL_FORMATS = {"yuv420p", "yuvj420p"}
+COPYABLE_AUDIO_CODECS = {"aac", "mp3"}
+
+# Chunked mode never splits the input into ranges shorter than this
+MIN_CHUNK_SECONDS = 30
+
+# HLS segment layouts:
+#   ts     - MPEG-TS segment_NNN.ts files
+#   fmp4   - fragmented MP4 (CMAF): an init.mp4 plus segment_NNN.m4s files
+#   single - one fragmented MP4 file (media.mp4); segments are byte ranges of it
+SEGMENT_FORMATS = ("ts", "fmp4", "single")
+SEGMENT_EXTENSIONS = {"ts": ".ts", "fmp4": ".m4s"}
+SINGLE_FILE_NAME = "media.mp4"
+
+# Playlist of the segments encoded by a resumed run, merged into playlist.m3u8 when it ends
+RESUME_PLAYLIST_NAME = ".resume.m3u8"
+
 
 class FFmpegConverter:
     """Handle video conversion to HLS format using FFmpeg"""
 
-    def __init__(self, input_file: Path, output_dir: Path, segment_duration: int = 6, watermark_text: Optional[str] = None):
+    def __init__(
+        self,
+        input_file: Path,
+        output_dir: Path,
+        segment_duration: int = 6,
+        watermark_text: Optional[str] = None,
+        renditions: Optional[List[str]] = None,
+        chunked: bool = False,
+        chunk_workers: Optional[int] = None,
+        stream_copy: bool = True,
+        media_info: Optional[Dict[str, Any]] = None,
+        probe_timeout: float = 60,
+        keyframe_probe_timeout: float = 300,
+        segment_format: str = "ts",
+        resume: bool = False,
+        encoding_profile: str = DEFAULT_PROFILE,
+        encoding_overrides: Optional[Dict[str, Any]] = None
+    ):
         self.input_file = input_file
         self.output_dir = output_dir
         self.segment_duration = segment_duration
         self.watermark_text = watermark_text
+        # Rendition names from RENDITION_PRESETS; empty means a single rendition at source size
+        self.renditions: List[str] = list(renditions or [])
+        # Chunked mode encodes time ranges of a single rendition in parallel processes
+        self.chunked = chunked
+        self.chunk_workers = max(1, chunk_workers or os.cpu_count() or 1)
+        # Processes the last run actually split the encode into (1 unless chunked mode found enough duration)
+        self.chunk_count = 1
+        # Allow remuxing compatible streams instead of re-encoding them
+        self.stream_copy = stream_copy
+        # One of SEGMENT_FORMATS
+        if segment_format not in SEGMENT_FORMATS:
+            raise ValueError(f"Unknown segment format: {segment_format}")
+        self.segment_format = segment_format
+        # Name from encoding_profiles.ENCODING_PROFILES and its settings with the overrides applied
+        self.encoding_profile = encoding_profile
+        self.encoding = resolve_encoding(encoding_profile, encoding_overrides)
+        # How the output was produced: copy, copy_video, copy_audio, transcode or audio_only
+        self.conversion_path = "transcode"
+        self.copy_video = False
+        self.copy_audio = False
+        # Result of media_probe.probe_media for the input (may be supplied from a cached probe)
+        self.media_info = media_info
+        self.probe_timeout = probe_timeout
+        self.keyframe_probe_timeout = keyframe_probe_timeout
         self.progress_file = output_dir / ".progress.json"
         self.log_file = output_dir / ".conversion.log"
+        # Parameters of the running conversion, so an interrupted one is only resumed with the same ones
+        self.checkpoint_file = output_dir / ".checkpoint.json"
+        # Continue from the segments of an interrupted run instead of starting over, where possible
+        self.resume = resume
+        # Seconds of output already encoded by an interrupted run
+        self.resume_offset = 0.0
         self.duration: Optional[float] = None
         self.process: Optional[asyncio.subprocess.Process] = None
+        self.chunk_processes: List[asyncio.subprocess.Process] = []
+        # Latest parsed -progress block (fps, speed, bitrate, ...) for throughput reporting
+        self.stats: Optional[Dict[str, Any]] = None
+        # Threads, cores and priority allotted by the scheduler; None leaves FFmpeg unconstrained
+        self.cpu_budget: Optional[CPUBudget] = None
+        self.cancelled = False
+        # Stopped by a server shutdown: the output so far is kept for resuming
+        self.interrupted = False
+        # Streaming ingest (convert_stream): bytes received, whether all of them arrived, and why not
+        self.received_bytes = 0
+        self.input_complete = False
+        self.source_error: Optional[BaseException] = None
+
+    @property
+    def playlist_name(self) -> str:
+        """Name of the top-level playlist (master playlist for multi-rendition output)"""
+        return "master.m3u8" if self.renditions else "playlist.m3u8"
+
+    def cache_params(self) -> Dict[str, Any]:
+        """Every parameter that affects the output, for conversion cache keys"""
+        params = {
+            "segment_duration": self.segment_duration,
+            "watermark_text": self.watermark_text,
+            "renditions": sorted(self.renditions),
+            "chunked": self.chunked,
+            "stream_copy": self.stream_copy,
+            "encoding": self.encoding,
+        }
+        if self.segment_format != "ts":
+            # Only added for the newer formats, so existing cache entries keep their keys
+            params["segment_format"] = self.segment_format
+        return params
+
+    def clear_output(self):
+        """Remove files left in the output directory by an earlier conversion
+
+        Old segments may be hard links shared with the conversion cache, so they
+        must be unlinked rather than overwritten in place.
+        """
+        if not self.output_dir.exists():
+            return
+        for path in self.output_dir.iterdir():
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path)
+            else:
+                path.unlink(missing_ok=True)
 
-    async def get_video_duration(self) -> float:
-        """Get video duration using ffprobe"""
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(self.input_file)
-        ]
+    @property
+    def cacheable(self) -> bool:
+        """Whether the output can be shared through the conversion cache
+
+        A burned-in watermark names the user and the time, so no two outputs match.
+        """
+        return not self.watermark_text
+
+    @property
+    def resumable(self) -> bool:
+        """Whether an interrupted run can be continued (single rendition, one process, MPEG-TS)
+
+        A copied video stream is excluded: the resumed run would seek with ``-ss``,
+        which snaps to the previous source keyframe when copying, so its segments
+        would overlap the ones kept instead of starting exactly where they end.
+        """
+        return not self.renditions and not self.chunked and self.segment_format == "ts" and not self.copy_video
+
+    def _load_checkpoint(self) -> List[PlaylistEntry]:
+        """Return the complete segments of an interrupted run with the same parameters
 
+        Partially written segments are removed and playlist.m3u8 is rewritten to
+        list exactly the segments kept. Returns [] when there is nothing to resume.
+        """
         try:
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            checkpoint = json.loads(self.checkpoint_file.read_text())
+        except (OSError, ValueError):
+            return []
+        if checkpoint.get("params") != self.cache_params():
+            return []
+
+        playlist = self.output_dir / "playlist.m3u8"
+        scratch = self.output_dir / RESUME_PLAYLIST_NAME
+        entries: List[PlaylistEntry] = []
+        ended = False
+        for path in (playlist, scratch):
+            if path.exists():
+                entries.extend(parse_media_playlist(path))
+                ended = "#EXT-X-ENDLIST" in path.read_text()
+        if ended and entries:
+            # A terminated FFmpeg closes its playlist, the last segment may be cut short
+            entries.pop()
+
+        listed = {uri for _, uri in entries}
+        for path in self.output_dir.iterdir():
+            if path.name.startswith("segment_") and path.name not in listed:
+                path.unlink(missing_ok=True)
+        scratch.unlink(missing_ok=True)
+        if entries:
+            write_media_playlist(playlist, entries, ended=False)
+        return entries
+
+    def _write_checkpoint(self):
+        self.checkpoint_file.write_text(json.dumps({"params": self.cache_params()}))
+
+    @property
+    def needs_keyframes(self) -> bool:
+        """Whether the source keyframe index is needed (stream copy check or chunk planning)"""
+        return self.chunked or (self.stream_copy and not self.watermark_text)
+
+    async def probe(self) -> Dict[str, Any]:
+        """Probe the input, reusing ``media_info`` supplied by the caller when it is complete enough"""
+        if self.media_info is None or (self.needs_keyframes and self.media_info.get("keyframes") is None):
+            self.media_info = await probe_media(
+                self.input_file,
+                self.probe_timeout,
+                keyframes=self.needs_keyframes,
+                keyframe_timeout=self.keyframe_probe_timeout,
             )
-            stdout, _ = await proc.communicate()
-            duration = float(stdout.decode().strip())
-            return duration
-        except (ValueError, subprocess.CalledProcessError):
-            return 0.0
+        return self.media_info
 
     async def update_progress(self, status: str, progress: int = 0, **kwargs):
-        """Update progress JSON file"""
+        """Publish progress to the in-process registry
+
+        The .progress.json snapshot is written by the registry at most once per
+        flush interval; final states are written before this returns.
+        """
         progress_data = {
             "status": status,
             "progress": progress,
@@ -55,220 +239,742 @@ class FFmpegConverter:
             **kwargs
         }
 
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        with open(self.progress_file, "w") as f:
-            json.dump(progress_data, f, indent=2)
-
-    async def parse_ffmpeg_progress(self, line: str) -> Optional[Dict[str, Any]]:
-        """Parse FFmpeg progress output"""
-        if not self.duration or self.duration == 0:
-            return None
-
-        # Extract time (format: time=00:01:23.45)
-        time_match = re.search(r"time=(\d{2}):(\d{2}):(\d{2})\.(\d{2})", line)
-        if not time_match:
-            return None
-
-        hours, minutes, seconds, _ = map(int, time_match.groups())
-        current_time = hours * 3600 + minutes * 60 + seconds
+        progress_registry.publish(self.output_dir.name, self.progress_file, progress_data)
+        if status in FINAL_STATUSES:
+            await progress_registry.flush(self.output_dir.name)
 
-        # Calculate progress percentage
-        progress = min(int((current_time / self.duration) * 100), 100)
+    def _format_progress(self, block: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the progress fields (percentage, ETA, time string) from a parsed progress block"""
+        # Output time of this process, plus whatever an interrupted run had already encoded
+        current_time = (block["out_time"] or 0.0) + self.resume_offset
+        speed_val = block["speed"]
 
-        # Extract speed (format: speed=1.23x)
-        speed = "0x"
-        speed_match = re.search(r"speed=([0-9.]+)x", line)
-        if speed_match:
-            speed = f"{speed_match.group(1)}x"
+        # Calculate progress percentage (the duration is unknown while streaming an upload)
+        progress = min(int((current_time / self.duration) * 100), 100) if self.duration else 0
 
-        # Extract frame number
-        frame = "0"
-        frame_match = re.search(r"frame=\s*(\d+)", line)
-        if frame_match:
-            frame = frame_match.group(1)
+        speed = f"{round(speed_val, 2)}x" if speed_val is not None else "0x"
 
         # Calculate ETA
         eta = "calculating..."
-        if speed_match:
-            speed_val = float(speed_match.group(1))
-            if speed_val > 0:
-                remaining = self.duration - current_time
-                eta_seconds = int(remaining / speed_val)
-
-                eta_hours = eta_seconds // 3600
-                eta_minutes = (eta_seconds % 3600) // 60
-                eta_secs = eta_seconds % 60
-
-                if eta_hours > 0:
-                    eta = f"{eta_hours}h {eta_minutes}m"
-                elif eta_minutes > 0:
-                    eta = f"{eta_minutes}m {eta_secs}s"
-                else:
-                    eta = f"{eta_secs}s"
+        if speed_val and self.duration:
+            remaining = max(self.duration - current_time, 0)
+            eta_seconds = int(remaining / speed_val)
+
+            eta_hours = eta_seconds // 3600
+            eta_minutes = (eta_seconds % 3600) // 60
+            eta_secs = eta_seconds % 60
+
+            if eta_hours > 0:
+                eta = f"{eta_hours}h {eta_minutes}m"
+            elif eta_minutes > 0:
+                eta = f"{eta_minutes}m {eta_secs}s"
+            else:
+                eta = f"{eta_secs}s"
 
         # Format time string
-        current_hours = current_time // 3600
-        current_minutes = (current_time % 3600) // 60
-        current_secs = current_time % 60
+        whole_seconds = int(current_time)
+        current_hours = whole_seconds // 3600
+        current_minutes = (whole_seconds % 3600) // 60
+        current_secs = whole_seconds % 60
 
-        duration_hours = int(self.duration) // 3600
-        duration_minutes = (int(self.duration) % 3600) // 60
-        duration_secs = int(self.duration) % 60
+        duration_hours = int(self.duration or 0) // 3600
+        duration_minutes = (int(self.duration or 0) % 3600) // 60
+        duration_secs = int(self.duration or 0) % 60
 
         time_str = f"{current_hours:02d}:{current_minutes:02d}:{current_secs:02d} / {duration_hours:02d}:{duration_minutes:02d}:{duration_secs:02d}"
 
         return {
             "progress": progress,
-            "current_time": current_time,
+            "current_time": round(current_time, 3),
             "time_string": time_str,
-            "frame": frame,
+            "frame": str(block["frame"] or 0),
             "speed": speed,
-            "eta": eta
+            "eta": eta,
+            "fps": block["fps"],
+            "bitrate_kbps": block["bitrate_kbps"],
+            "total_size": block["total_size"],
+            "dup_frames": block["dup_frames"],
+            "drop_frames": block["drop_frames"]
         }
 
+    @staticmethod
+    def _combine_blocks(blocks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Sum progress blocks of concurrently encoding chunks into one overall block"""
+        combined: Dict[str, Any] = {"end": all(block["end"] for block in blocks)}
+        for key in ("out_time", "frame", "fps", "total_size", "speed", "dup_frames", "drop_frames"):
+            values = [block[key] for block in blocks if block.get(key) is not None]
+            combined[key] = sum(values) if values else None
+        # Bitrate is a rate over the output so far, not additive across chunks
+        combined["bitrate_kbps"] = (
+            combined["total_size"] * 8 / 1000 / combined["out_time"]
+            if combined["total_size"] and combined["out_time"] else None
+        )
+        return combined
+
     async def convert(self) -> bool:
         """Convert video to HLS format with progress tracking"""
         try:
-            # Get video duration
+            resumed: List[PlaylistEntry] = []
+            if self.resume and self.resumable:
+                resumed = await asyncio.to_thread(self._load_checkpoint)
+            if not resumed:
+                await asyncio.to_thread(self.clear_output)
+
+            # Probe streams, duration and (when needed) keyframes
             await self.update_progress("initializing", 0, message="Analyzing video...")
-            self.duration = await self.get_video_duration()
+            try:
+                media_info = await self.probe()
+            except ProbeError as e:
+                await self.update_progress("error", 0, message="Could not analyze video", error=str(e))
+                return False
+            self.duration = media_info["duration"]
 
             if self.duration == 0:
                 await self.update_progress("error", 0, message="Could not determine video duration")
                 return False
 
+            if self.cancelled:
+                return False
+
             # Create output directory
             self.output_dir.mkdir(parents=True, exist_ok=True)
 
-            # Build FFmpeg command with optional watermark
-            cmd = ["ffmpeg", "-i", str(self.input_file)]
+            if not media_info["video"]:
+                # Nothing to scale or split, just package the audio
+                self.renditions = []
+                self.chunked = False
+            if self.renditions:
+                self.renditions = self._select_renditions(media_info["video"]["height"])
+            else:
+                self._choose_conversion_path(media_info)
+
+            chunks = []
+            # Chunks are stitched by renaming segment files, which needs one file per segment
+            # sharing no init section, i.e. MPEG-TS
+            if self.chunked and not self.renditions and not self.copy_video and self.segment_format == "ts":
+                chunks = self._plan_chunks()
+            self.chunk_count = max(len(chunks), 1)
+            if len(chunks) > 1:
+                # Chunks are cut mid-stream, so their audio is re-encoded too
+                self.copy_audio = False
+                self.conversion_path = "transcode"
+
+            if resumed and not self.resumable:
+                # Only known once the conversion path is chosen (e.g. the video is copied now)
+                resumed = []
+                await asyncio.to_thread(self.clear_output)
+
+            if self.resumable:
+                await asyncio.to_thread(self._write_checkpoint)
+
+            if resumed:
+                self.resume_offset = sum(duration for duration, _ in resumed)
+                await self.update_progress(
+                    "converting",
+                    min(int(self.resume_offset / self.duration * 100), 99),
+                    message=f"Resuming after {len(resumed)} completed segments...",
+                    duration=int(self.duration)
+                )
+            else:
+                await self.update_progress("converting", 1, message="Starting encoding...", duration=int(self.duration))
+
+            if len(chunks) > 1:
+                returncode = await self._convert_chunked(chunks)
+            elif self.renditions:
+                returncode = await self._run_ffmpeg(self._build_ladder_command(media_info["audio"] is not None))
+            elif resumed:
+                returncode = await self._run_ffmpeg(self._build_single_command(resume_from=resumed))
+                if returncode == 0:
+                    await asyncio.to_thread(self._merge_resumed, resumed)
+            else:
+                returncode = await self._run_ffmpeg(self._build_single_command())
 
-            # Add watermark filter if watermark text is provided
-            if self.watermark_text:
-                # Escape special characters in watermark text for FFmpeg
-                # Replace colons with \: and escape single quotes
-                escaped_text = self.watermark_text.replace(":", r"\:").replace("'", r"'\\\''")
-
-                # Create watermark with semi-transparent text overlay
-                # Position: bottom-right corner with 10px padding
-                # Font size: 24, color: white with 50% opacity
-                watermark_filter = (
-                    f"drawtext=text='{escaped_text}':"
-                    f"fontsize=24:"
-                    f"fontcolor=white@0.5:"
-                    f"x=w-tw-10:"
-                    f"y=h-th-10:"
-                    f"box=1:"
-                    f"boxcolor=black@0.3:"
-                    f"boxborderw=5"
+            # Check if conversion was successful
+            if returncode == 0:
+                await self._publish_completed()
+                return True
+            elif self.cancelled:
+                return False
+            elif self.interrupted:
+                await self.update_progress(
+                    "interrupted",
+                    message="Conversion interrupted by a server shutdown, it continues after a restart",
+                    duration=int(self.duration)
                 )
-                cmd.extend(["-vf", watermark_filter])
-                cmd.extend(["-c:v", "libx264"])
+                return False
             else:
-                cmd.extend(["-c:v", "libx264"])
+                await self._publish_failure()
+                return False
 
-            cmd.extend([
-                "-c:a", "aac",
-                "-start_number", "0",
-                "-hls_time", str(self.segment_duration),
-                "-hls_list_size", "0",
-                "-hls_segment_filename", str(self.output_dir / "segment_%03d.ts"),
-                "-f", "hls",
-                "-progress", "pipe:1",
-                str(self.output_dir / "playlist.m3u8")
-            ])
+        except Exception as e:
+            await self.update_progress(
+                "error",
+                0,
+                message=f"Conversion error: {str(e)}",
+                error=str(e)
+            )
+            return False
 
-            await self.update_progress("converting", 1, message="Starting encoding...", duration=int(self.duration))
+    def _merge_resumed(self, resumed: List[PlaylistEntry]):
+        """Append the segments of a resumed run to playlist.m3u8"""
+        scratch = self.output_dir / RESUME_PLAYLIST_NAME
+        write_media_playlist(
+            self.output_dir / "playlist.m3u8",
+            resumed + parse_media_playlist(scratch),
+            discontinuities={len(resumed)},
+        )
+        scratch.unlink()
+
+    async def _publish_completed(self):
+        """Count the produced segments and publish the final 'completed' state"""
+        self.checkpoint_file.unlink(missing_ok=True)
+        # Count segments (per rendition; every variant has the same segment count) and bytes in one pass;
+        # single-file output has no segment files, its segments are counted from the playlist
+        segment_dir = self.output_dir / self.renditions[0] if self.renditions else self.output_dir
+        output_bytes, segments = await asyncio.to_thread(measure_output, self.output_dir, segment_dir)
+
+        await self.update_progress(
+            "completed",
+            100,
+            message="Conversion completed successfully!",
+            duration=int(self.duration or 0),
+            segments=segments,
+            output_bytes=output_bytes,
+            output_size=format_size(output_bytes),
+            renditions=self.renditions,
+            conversion_path=self.conversion_path
+        )
+
+    async def _publish_failure(self):
+        """Publish the 'error' state with the tail of the FFmpeg log"""
+        # Read error from log file
+        error_msg = "Conversion failed"
+        if self.log_file.exists():
+            with open(self.log_file, "r") as f:
+                lines = f.readlines()
+                error_msg = " ".join(lines[-5:]).strip()
+
+        await self.update_progress(
+            "error",
+            0,
+            message="Conversion failed. Check log file for details.",
+            error=error_msg
+        )
+
+    async def convert_stream(self, chunks: AsyncIterator[bytes], partial_file: Path, expected_size: Optional[int] = None) -> bool:
+        """Encode an input while it is still being received
+
+        Every chunk is appended to ``partial_file`` and written to FFmpeg's stdin,
+        so segments appear before the upload finishes. Once all data has arrived the
+        file is moved to ``input_file`` (``input_complete`` is set even if encoding
+        failed, so the caller can fall back to a regular conversion). The input
+        cannot be probed up front, so it is always transcoded at source size.
+        """
+        self.renditions = []
+        self.chunked = False
+        self.copy_video = False
+        self.copy_audio = False
+        self.conversion_path = "transcode"
 
-            # Start FFmpeg process with proper file handle management
-            log_file_handle = None
-            try:
-                log_file_handle = open(self.log_file, "w")
+        try:
+            await asyncio.to_thread(self.clear_output)
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            await self.update_progress("converting", 0, message="Encoding while receiving upload...")
+
+            with open(self.log_file, "w") as log_file_handle:
                 self.process = await asyncio.create_subprocess_exec(
-                    *cmd,
+                    *self._with_cpu_budget(self._build_single_command("pipe:0")),
+                    stdin=asyncio.subprocess.PIPE,
                     stdout=asyncio.subprocess.PIPE,
                     stderr=log_file_handle
                 )
+                feeder = asyncio.create_task(self._feed_stream(chunks, partial_file))
 
-                # Read progress output
+                parser = FFmpegProgressParser()
                 while True:
                     line = await self.process.stdout.readline()
                     if not line:
                         break
 
-                    line_str = line.decode().strip()
-                    progress_data = await self.parse_ffmpeg_progress(line_str)
+                    block = parser.feed(line.decode().strip())
+                    if block:
+                        self.stats = block
+                        fields = self._format_progress(block)
+                        if expected_size:
+                            # Duration is unknown until the upload ends; report bytes received
+                            fields["progress"] = min(int(self.received_bytes / expected_size * 100), 99)
+                        await self.update_progress("converting", message="Encoding while receiving upload...", **fields)
 
-                    if progress_data:
-                        await self.update_progress(
-                            "converting",
-                            message="Encoding in progress...",
-                            duration=int(self.duration),
-                            **progress_data
-                        )
-
-                # Wait for process to complete
                 await self.process.wait()
-            finally:
-                # Ensure log file is closed
-                if log_file_handle is not None:
-                    log_file_handle.close()
-
-            # Check if conversion was successful
-            if self.process.returncode == 0:
-                # Count segments
-                segments = len(list(self.output_dir.glob("segment_*.ts")))
+                await feeder
 
-                # Get output size
-                total_size = sum(f.stat().st_size for f in self.output_dir.rglob("*") if f.is_file())
-                output_size = self._format_size(total_size)
+            await asyncio.to_thread(os.replace, partial_file, self.input_file)
+            self.input_complete = True
 
-                await self.update_progress(
-                    "completed",
-                    100,
-                    message="Conversion completed successfully!",
-                    duration=int(self.duration),
-                    segments=segments,
-                    output_size=output_size
-                )
-                return True
-            else:
-                # Read error from log file
-                error_msg = "Conversion failed"
-                if self.log_file.exists():
-                    with open(self.log_file, "r") as f:
-                        lines = f.readlines()
-                        error_msg = " ".join(lines[-5:]).strip()
-
-                await self.update_progress(
-                    "error",
-                    0,
-                    message="Conversion failed. Check log file for details.",
-                    error=error_msg
-                )
+            if self.process.returncode != 0:
+                if not self.cancelled:
+                    await self._publish_failure()
                 return False
 
+            try:
+                self.media_info = await probe_media(self.input_file, self.probe_timeout)
+                self.duration = self.media_info["duration"]
+            except ProbeError:
+                self.duration = self.stats["out_time"] if self.stats else None
+            await self._publish_completed()
+            return True
+
         except Exception as e:
+            self.terminate()
+            if not self.input_complete:
+                # The upload broke off: the output is truncated and the input incomplete
+                self.source_error = e
+                partial_file.unlink(missing_ok=True)
             await self.update_progress(
                 "error",
                 0,
-                message=f"Conversion error: {str(e)}",
+                message="Conversion error: upload interrupted" if self.source_error else f"Conversion error: {str(e)}",
                 error=str(e)
             )
             return False
 
-    @staticmethod
-    def _format_size(size_bytes: int) -> str:
-        """Format bytes to human-readable size"""
-        for unit in ["B", "K", "M", "G", "T"]:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f}{unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f}P"
+    async def _feed_stream(self, chunks: AsyncIterator[bytes], partial_file: Path):
+        """Write every received chunk to disk and to FFmpeg's stdin"""
+        encoder_alive = True
+        with open(partial_file, "wb") as f:
+            try:
+                async for data in chunks:
+                    await asyncio.to_thread(f.write, data)
+                    self.received_bytes += len(data)
+                    if not encoder_alive:
+                        continue
+                    try:
+                        self.process.stdin.write(data)
+                        await self.process.stdin.drain()
+                    except (BrokenPipeError, ConnectionResetError):
+                        # FFmpeg gave up on the input; keep saving it for a regular conversion
+                        encoder_alive = False
+            except BaseException:
+                # Never let FFmpeg finalize a truncated stream as a complete output
+                self.terminate()
+                raise
+
+        if encoder_alive:
+            self.process.stdin.close()
+
+    def _choose_conversion_path(self, media_info: Dict[str, Any]):
+        """Decide which streams can be copied as-is for a single-rendition conversion"""
+        video = media_info["video"]
+        audio = media_info["audio"]
+        self.copy_audio = bool(self.stream_copy and audio and audio["codec"] in COPYABLE_AUDIO_CODECS)
+
+        if not video:
+            self.conversion_path = "audio_only"
+            return
+
+        # A watermark has to be burned in, so the video is always re-encoded
+        self.copy_video = False
+        if self.stream_copy and not self.watermark_text and (
+            video["codec"] in COPYABLE_VIDEO_CODECS
+            and video["profile"] in COPYABLE_VIDEO_PROFILES
+            and video["pix_fmt"] in COPYABLE_PIXEL_FORMATS
+        ):
+            # Copied segments can only be cut at source keyframes; if they are
+            # further apart than the segment duration, segments would overrun it
+            keyframes = media_info.get("keyframes") or []
+            gaps = [b - a for a, b in zip(keyframes, keyframes[1:])]
+            if keyframes and max(gaps, default=0) <= self.segment_duration:
+                self.copy_video = True
+
+        if self.copy_video and (self.copy_audio or not audio):
+            self.conversion_path = "copy"
+        elif self.copy_video:
+            self.conversion_path = "copy_video"
+        elif self.copy_audio:
+            self.conversion_path = "copy_audio"
+        else:
+            self.conversion_path = "transcode"
+
+    async def _run_ffmpeg(self, cmd: List[str]) -> int:
+        """Run one FFmpeg process, publishing its progress. Returns the exit code."""
+        # Start FFmpeg process with proper file handle management
+        log_file_handle = None
+        try:
+            log_file_handle = open(self.log_file, "w")
+            self.process = await asyncio.create_subprocess_exec(
+                *self._with_cpu_budget(cmd),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=log_file_handle
+            )
+
+            # Read progress output: one update per completed -progress block
+            parser = FFmpegProgressParser()
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+
+                block = parser.feed(line.decode().strip())
+                if block:
+                    self.stats = block
+                    await self.update_progress(
+                        "converting",
+                        message="Encoding in progress...",
+                        duration=int(self.duration),
+                        **self._format_progress(block)
+                    )
+
+            # Wait for process to complete
+            await self.process.wait()
+        finally:
+            # Ensure log file is closed
+            if log_file_handle is not None:
+                log_file_handle.close()
+
+        return self.process.returncode
+
+    def _plan_chunks(self) -> List[Tuple[float, float]]:
+        """Split the input into time ranges for parallel encoding
+
+        Split points are taken at the source keyframe nearest to an even split
+        and rounded to a multiple of the segment duration, so every chunk starts
+        on a segment boundary of the final playlist.
+        """
+        count = min(self.chunk_workers, int(self.duration // MIN_CHUNK_SECONDS))
+        if count < 2:
+            return []
+
+        keyframes = self.media_info.get("keyframes") or []
+        bounds = [0.0]
+        for k in range(1, count):
+            target = self.duration * k / count
+            if keyframes:
+                i = bisect.bisect_left(keyframes, target)
+                nearby = keyframes[max(0, i - 1):i + 1]
+                target = min(nearby, key=lambda t: abs(t - target))
+            point = float(round(target / self.segment_duration) * self.segment_duration)
+            if bounds[-1] < point < self.duration:
+                bounds.append(point)
+        bounds.append(self.duration)
+
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    async def _convert_chunked(self, chunks: List[Tuple[float, float]]) -> int:
+        """Encode time ranges concurrently and stitch them into one playlist. Returns an exit code."""
+        chunk_root = self.output_dir / ".chunks"
+        await asyncio.to_thread(shutil.rmtree, chunk_root, True)
+        chunk_root.mkdir(parents=True)
+
+        chunk_dirs = [chunk_root / f"chunk_{i:03d}" for i in range(len(chunks))]
+        # Latest progress block per chunk, summed for the overall progress
+        self._chunk_blocks: List[Optional[Dict[str, Any]]] = [None] * len(chunks)
+        # Chunk processes share the job's cores rather than each taking all of them
+        cores = self.cpu_budget.threads if self.cpu_budget else (os.cpu_count() or 1)
+        workers = max(1, min(self.chunk_workers, cores))
+        semaphore = asyncio.Semaphore(workers)
+        threads = max(1, cores // min(workers, len(chunks)))
+
+        returncodes = await asyncio.gather(*(
+            self._encode_chunk(i, start, end, chunk_dirs[i], semaphore, threads, is_last=i == len(chunks) - 1)
+            for i, (start, end) in enumerate(chunks)
+        ))
+
+        failed = next((i for i, code in enumerate(returncodes) if code != 0), None)
+        if failed is not None:
+            # Keep the failing chunk's log where the error reporting expects it
+            chunk_log = chunk_dirs[failed] / ".conversion.log"
+            if chunk_log.exists():
+                await asyncio.to_thread(shutil.copyfile, chunk_log, self.log_file)
+            return returncodes[failed]
+
+        # Thousands of renames for long videos: keep them off the event loop
+        await asyncio.to_thread(self._stitch_chunks, chunk_dirs)
+        await asyncio.to_thread(shutil.rmtree, chunk_root, True)
+        return 0
+
+    def _stitch_chunks(self, chunk_dirs: List[Path]):
+        """Move every chunk's segments into the output directory and list them in one playlist"""
+        entries: List[PlaylistEntry] = []
+        # Each chunk comes from its own encoder (fresh GOP, audio priming)
+        chunk_starts = set()
+        for chunk_dir in chunk_dirs:
+            chunk_starts.add(len(entries))
+            for duration, uri in parse_media_playlist(chunk_dir / "playlist.m3u8"):
+                name = f"segment_{len(entries):03d}.ts"
+                os.replace(chunk_dir / uri, self.output_dir / name)
+                entries.append((duration, name))
+        write_media_playlist(self.output_dir / "playlist.m3u8", entries, discontinuities=chunk_starts)
+
+    async def _encode_chunk(
+        self,
+        index: int,
+        start: float,
+        end: float,
+        chunk_dir: Path,
+        semaphore: asyncio.Semaphore,
+        threads: int,
+        is_last: bool
+    ) -> int:
+        """Encode one time range into its own HLS playlist. Returns the exit code."""
+        async with semaphore:
+            if self.cancelled:
+                return 1
+            chunk_dir.mkdir(parents=True, exist_ok=True)
+
+            # Input seeking starts decoding at the preceding keyframe and drops
+            # frames before ``start``, so the chunk is frame-accurate
+            cmd = ["ffmpeg", "-ss", f"{start:.3f}", "-i", str(self.input_file)]
+            if not is_last:
+                cmd.extend(["-t", f"{end - start:.3f}"])
+
+            watermark_filter = self._watermark_filter()
+            if watermark_filter:
+                cmd.extend(["-vf", watermark_filter])
+
+            cmd.extend(self._video_encoder_args())
+            cmd.extend(self._thread_args(threads))
+            cmd.extend(self._audio_encoder_args())
+            cmd.extend(self._keyframe_args())
+            cmd.extend([
+                # Keep timestamps continuous across chunk boundaries
+                "-output_ts_offset", f"{start:.3f}",
+            ])
+            cmd.extend(self._hls_output_args(chunk_dir, chunk_dir / "playlist.m3u8"))
+
+            with open(chunk_dir / ".conversion.log", "w") as log_file_handle:
+                process = await asyncio.create_subprocess_exec(
+                    *self._with_cpu_budget(cmd),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=log_file_handle
+                )
+                self.chunk_processes.append(process)
+
+                parser = FFmpegProgressParser()
+                while True:
+                    line = await process.stdout.readline()
+                    if not line:
+                        break
+
+                    block = parser.feed(line.decode().strip())
+                    if block:
+                        self._chunk_blocks[index] = block
+                        self.stats = self._combine_blocks([b for b in self._chunk_blocks if b])
+                        await self.update_progress(
+                            "converting",
+                            message=f"Encoding {len(self._chunk_blocks)} chunks in parallel...",
+                            duration=int(self.duration),
+                            **self._format_progress(self.stats)
+                        )
+
+                await process.wait()
+
+            if process.returncode != 0 and not self.cancelled:
+                # One bad chunk fails the whole job, stop the others early
+                self.terminate()
+            return process.returncode
+
+    def _watermark_filter(self) -> Optional[str]:
+        """Build the drawtext filter for the watermark, if any"""
+        if not self.watermark_text:
+            return None
+
+        # Escape special characters in watermark text for FFmpeg
+        # Replace colons with \: and escape single quotes
+        escaped_text = self.watermark_text.replace(":", r"\:").replace("'", r"'\\\''")
+
+        # Create watermark with semi-transparent text overlay
+        # Position: bottom-right corner with 10px padding
+        # Font size: 24, color: white with 50% opacity
+        return (
+            f"drawtext=text='{escaped_text}':"
+            f"fontsize=24:"
+            f"fontcolor=white@0.5:"
+            f"x=w-tw-10:"
+            f"y=h-th-10:"
+            f"box=1:"
+            f"boxcolor=black@0.3:"
+            f"boxborderw=5"
+        )
+
+    def _gop_frames(self) -> Optional[int]:
+        """Longest keyframe interval in frames, None when the frame rate is unknown (e.g. streaming ingest)"""
+        video = (self.media_info or {}).get("video") or {}
+        frame_rate = video.get("frame_rate")
+        if not frame_rate:
+            return None
+        return max(1, round(min(self.encoding["gop"], self.segment_duration) * frame_rate))
+
+    def _video_encoder_args(self, index: Optional[int] = None, crf: bool = True) -> List[str]:
+        """libx264 arguments of the encoding profile, for output video stream ``index`` if given"""
+        specifier = f":v:{index}" if index is not None else ":v"
+        args = [f"-c{specifier}", "libx264", f"-preset{specifier}", self.encoding["preset"]]
+        if crf:
+            args.extend([f"-crf{specifier}", str(self.encoding["crf"])])
+        if self.encoding["tune"]:
+            args.extend([f"-tune{specifier}", self.encoding["tune"]])
+        gop_frames = self._gop_frames()
+        if gop_frames:
+            args.extend([f"-g{specifier}", str(gop_frames)])
+        return args
+
+    def _audio_encoder_args(self) -> List[str]:
+        return ["-c:a", "aac", "-b:a", self.encoding["audio_bitrate"]]
+
+    def _thread_args(self, default: Optional[int] = None) -> List[str]:
+        """Encoder threads: the profile's setting, else ``default``, else the CPU budget's"""
+        threads = self.encoding["threads"] or default or (self.cpu_budget.threads if self.cpu_budget else 0)
+        return ["-threads", str(threads)] if threads else []
+
+    def _with_cpu_budget(self, cmd: List[str]) -> List[str]:
+        """Prefix a command with the nice/ionice/affinity wrappers of the CPU budget"""
+        return self.cpu_budget.command_prefix() + cmd if self.cpu_budget else cmd
+
+    def _keyframe_args(self) -> List[str]:
+        """Force a keyframe at every segment boundary, so segments start cleanly and variants align"""
+        return ["-force_key_frames", f"expr:gte(t,n_forced*{self.segment_duration})"]
+
+    def _hls_output_args(self, segment_dir: Path, playlist: Path, start_number: int = 0) -> List[str]:
+        """HLS muxer arguments shared by all output modes, for the configured segment format"""
+        args = [
+            "-start_number", str(start_number),
+            "-hls_time", str(self.segment_duration),
+            "-hls_list_size", "0",
+        ]
+        if self.segment_format == "single":
+            args.extend([
+                "-hls_segment_type", "fmp4",
+                "-hls_flags", "single_file",
+                "-hls_segment_filename", str(segment_dir / SINGLE_FILE_NAME),
+            ])
+        else:
+            # Segments are written under a temporary name and renamed once complete,
+            # so a segment file that exists is always whole (see _load_checkpoint)
+            args.extend(["-hls_flags", "temp_file"])
+            if self.segment_format == "fmp4":
+                # Variant streams get init_<n>.mp4, a single rendition init.mp4
+                args.extend(["-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4"])
+            extension = SEGMENT_EXTENSIONS[self.segment_format]
+            args.extend(["-hls_segment_filename", str(segment_dir / f"segment_%03d{extension}")])
+        args.extend([
+            "-f", "hls",
+            "-progress", "pipe:1",
+            str(playlist)
+        ])
+        return args
+
+    def _build_single_command(self, source: Optional[str] = None, resume_from: Optional[List[PlaylistEntry]] = None) -> List[str]:
+        """Build FFmpeg command for a single rendition at source resolution
+
+        ``source`` overrides the input. ``resume_from`` lists the segments already
+        encoded; the command then continues after them into a scratch playlist.
+        """
+        cmd = ["ffmpeg"]
+        if resume_from:
+            cmd.extend(["-ss", f"{self.resume_offset:.3f}"])
+        cmd.extend(["-i", source or str(self.input_file)])
+
+        if self.conversion_path == "audio_only":
+            cmd.append("-vn")
+        elif self.copy_video:
+            cmd.extend(["-c:v", "copy"])
+        else:
+            # Add watermark filter if watermark text is provided
+            watermark_filter = self._watermark_filter()
+            if watermark_filter:
+                cmd.extend(["-vf", watermark_filter])
+            cmd.extend(self._video_encoder_args())
+            cmd.extend(self._thread_args())
+            cmd.extend(self._keyframe_args())
+
+        if self.copy_audio:
+            cmd.extend(["-c:a", "copy"])
+        else:
+            cmd.extend(self._audio_encoder_args())
+        if resume_from:
+            # Keep timestamps continuous with the segments already written
+            cmd.extend(["-output_ts_offset", f"{self.resume_offset:.3f}"])
+            cmd.extend(self._hls_output_args(
+                self.output_dir, self.output_dir / RESUME_PLAYLIST_NAME, start_number=len(resume_from)
+            ))
+        else:
+            cmd.extend(self._hls_output_args(self.output_dir, self.output_dir / "playlist.m3u8"))
+        return cmd
+
+    def _select_renditions(self, source_height: int) -> List[str]:
+        """Drop rungs that would upscale the source, keeping at least the smallest one"""
+        requested = sorted(
+            (name for name in self.renditions if name in RENDITION_PRESETS),
+            key=lambda name: RENDITION_PRESETS[name]["height"],
+            reverse=True
+        )
+        if not source_height:
+            return requested
+        selected = [name for name in requested if RENDITION_PRESETS[name]["height"] <= source_height]
+        return selected or requested[-1:]
+
+    def _build_ladder_command(self, has_audio: bool) -> List[str]:
+        """Build one FFmpeg command that decodes once and encodes every rendition
+
+        The decoded (and watermarked) frames are split in a filter graph and scaled
+        per rung, so the source is only demuxed and decoded a single time.
+        """
+        count = len(self.renditions)
+        source_chain = "[0:v]"
+        watermark_filter = self._watermark_filter()
+        if watermark_filter:
+            source_chain += f"{watermark_filter},"
+        graph = [source_chain + f"split={count}" + "".join(f"[s{i}]" for i in range(count))]
+        for i, name in enumerate(self.renditions):
+            graph.append(f"[s{i}]scale=-2:{RENDITION_PRESETS[name]['height']}[v{i}]")
+
+        cmd = ["ffmpeg", "-i", str(self.input_file), "-filter_complex", ";".join(graph)]
+
+        stream_map = []
+        for i, name in enumerate(self.renditions):
+            preset = RENDITION_PRESETS[name]
+            cmd.extend(["-map", f"[v{i}]"])
+            # Rungs are bitrate-targeted: the profile's preset, tune and GOP apply, its CRF does not
+            cmd.extend(self._video_encoder_args(i, crf=False))
+            cmd.extend([
+                f"-b:v:{i}", preset["video_bitrate"],
+                f"-maxrate:v:{i}", preset["maxrate"],
+                f"-bufsize:v:{i}", preset["bufsize"],
+            ])
+            stream_map.append(f"v:{i},a:{i},name:{name}" if has_audio else f"v:{i},name:{name}")
+
+        if has_audio:
+            for i, name in enumerate(self.renditions):
+                cmd.extend(["-map", "0:a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", RENDITION_PRESETS[name]["audio_bitrate"]])
+
+        # Variants can only be switched at keyframes, so align them to segment boundaries
+        cmd.extend(self._thread_args())
+        cmd.extend(self._keyframe_args())
+        cmd.extend([
+            "-var_stream_map", " ".join(stream_map),
+            "-master_pl_name", "master.m3u8",
+        ])
+        cmd.extend(self._hls_output_args(self.output_dir / "%v", self.output_dir / "%v" / "playlist.m3u8"))
+        return cmd
+
+    def interrupt(self):
+        """Stop FFmpeg for a server shutdown, keeping the output written so far"""
+        self.interrupted = True
+        self.terminate()
+
+    def terminate(self):
+        """Send SIGTERM to every FFmpeg process still running for this conversion"""
+        for process in [self.process, *self.chunk_processes]:
+            if process and process.returncode is None:
+                try:
+                    process.terminate()
+                except ProcessLookupError:
+                    pass
 
     async def cancel(self):
         """Cancel the conversion process"""
-        if self.process:
-            self.process.terminate()
-            await self.process.wait()
-            await self.update_progress("cancelled", 0, message="Conversion cancelled")
+        self.cancelled = True
+        self.terminate()
+        for process in [self.process, *self.chunk_processes]:
+            if process:
+                await process.wait()
+        await self.update_progress("cancelled", 0, message="Conversion cancelled")
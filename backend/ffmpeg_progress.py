@@ -0,0 +1,72 @@
+"""
+Parser for FFmpeg's machine-readable progress output (-progress pipe:1)
+FFmpeg writes blocks of key=value lines, each terminated by progress=continue or progress=end
+"""
+from typing import Any, Dict, Optional
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value: Optional[str], suffix: str = "") -> Optional[float]:
+    if value is None:
+        return None
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        # FFmpeg reports "N/A" until a value is known
+        return None
+
+
+def parse_progress_block(fields: Dict[str, str]) -> Dict[str, Any]:
+    """Convert the raw key=value pairs of one block into typed values"""
+    # out_time_us is microseconds; out_time_ms is also microseconds (a long-standing FFmpeg quirk)
+    out_time_us = _to_int(fields.get("out_time_us"))
+    if out_time_us is None:
+        out_time_us = _to_int(fields.get("out_time_ms"))
+
+    return {
+        "out_time": max(out_time_us, 0) / 1_000_000 if out_time_us is not None else None,
+        "frame": _to_int(fields.get("frame")),
+        "fps": _to_float(fields.get("fps")),
+        "bitrate_kbps": _to_float(fields.get("bitrate"), "kbits/s"),
+        "total_size": _to_int(fields.get("total_size")),
+        "speed": _to_float(fields.get("speed"), "x"),
+        "dup_frames": _to_int(fields.get("dup_frames")),
+        "drop_frames": _to_int(fields.get("drop_frames")),
+        "end": fields.get("progress") == "end",
+    }
+
+
+class FFmpegProgressParser:
+    """Accumulate progress lines and emit exactly one update per completed block"""
+
+    def __init__(self):
+        self._fields: Dict[str, str] = {}
+        self._out_time: Optional[float] = None
+
+    def feed(self, line: str) -> Optional[Dict[str, Any]]:
+        """Add one output line; returns the parsed block when the line closes it"""
+        key, sep, value = line.partition("=")
+        if not sep:
+            return None
+
+        key = key.strip()
+        self._fields[key] = value.strip()
+        if key != "progress":
+            return None
+
+        fields, self._fields = self._fields, {}
+        block = parse_progress_block(fields)
+
+        # out_time can briefly read N/A or step back (e.g. while flushing the muxer); never report regress
+        if self._out_time is not None and (block["out_time"] is None or block["out_time"] < self._out_time):
+            block["out_time"] = self._out_time
+        self._out_time = block["out_time"]
+        return block
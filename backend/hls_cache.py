@@ -0,0 +1,125 @@
+"""
+HLS asset cache
+Keeps hot playlists and segments in memory so concurrent viewers of a video
+do not re-read the same files from disk
+"""
+import asyncio
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from hls_delivery import load_playlist, make_etag
+from hls_playlist import parse_init_sections, parse_media_playlist
+
+# (video name, file path)
+AssetKey = Tuple[str, str]
+
+
+class HLSAssetCache:
+    """LRU cache of file bodies bounded by their total size in bytes
+
+    Entries are stored with the ETag of the file they were read from and only
+    served while it still matches, so a rewritten file is never answered from
+    memory. Invalidating a video frees its entries right away.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self._entries: "OrderedDict[AssetKey, Tuple[str, bytes]]" = OrderedDict()
+        self._videos: Dict[str, Set[AssetKey]] = {}
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def accepts(self, size: int) -> bool:
+        return 0 < size <= self.max_entry_bytes
+
+    def get(self, video_name: str, path: Path, etag: str) -> Optional[bytes]:
+        key = (video_name, str(path))
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != etag:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, video_name: str, path: Path, etag: str, body: bytes):
+        if not self.accepts(len(body)):
+            return
+        key = (video_name, str(path))
+        self._drop(key)
+        self._entries[key] = (etag, body)
+        self._videos.setdefault(video_name, set()).add(key)
+        self.size_bytes += len(body)
+
+        while self.size_bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate_video(self, video_name: str):
+        """Forget every cached file of a video, e.g. when it is re-converted or deleted"""
+        for key in list(self._videos.get(video_name, ())):
+            self._drop(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._videos.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    async def prewarm(self, video_name: str, output_dir: Path, playlist_name: str, renditions: List[str], count: int) -> int:
+        """Load the playlists and first ``count`` segments of a completed video; returns bytes loaded"""
+        if self.max_bytes <= 0:
+            return 0
+        before = self.size_bytes
+        playlists = [output_dir / playlist_name]
+        playlists += [output_dir / rendition / "playlist.m3u8" for rendition in renditions]
+
+        for playlist in playlists:
+            try:
+                stat_result = await asyncio.to_thread(playlist.stat)
+                etag, body = await asyncio.to_thread(load_playlist, playlist, stat_result, True)
+                self.put(video_name, playlist, etag, body)
+                if count <= 0 or playlist.name == "master.m3u8":
+                    continue
+                entries = await asyncio.to_thread(parse_media_playlist, playlist)
+                init_sections = await asyncio.to_thread(parse_init_sections, playlist)
+            except FileNotFoundError:
+                continue
+
+            # fMP4 init sections are needed before any segment can be played
+            uris = list(dict.fromkeys(init_sections + [uri for _, uri in entries[:count]]))
+            for uri in uris:
+                segment = playlist.parent / uri.split("?", 1)[0]
+                try:
+                    stat_result = await asyncio.to_thread(segment.stat)
+                    if self.accepts(stat_result.st_size):
+                        self.put(video_name, segment, make_etag(stat_result), await asyncio.to_thread(segment.read_bytes))
+                except FileNotFoundError:
+                    continue
+        return max(self.size_bytes - before, 0)
+
+    def _drop(self, key: AssetKey):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size_bytes -= len(entry[1])
+        keys = self._videos.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._videos[key[0]]
@@ -0,0 +1,231 @@
+"""
+HLS delivery
+Serves playlists and segments from OUTPUT_DIR with byte ranges, validators and cache headers
+"""
+import asyncio
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Mapping, Optional, Tuple
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".vtt": "text/vtt",
+    ".key": "application/octet-stream",
+}
+
+# Completed segments never change under a versioned URL
+IMMUTABLE_CACHE_CONTROL = "max-age=31536000, immutable"
+# Segments of a running conversion, or requested without a version
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+READ_CHUNK_SIZE = 256 * 1024  # bytes per read when the server offers no zero-copy send
+
+# Segment and init-section references inside a playlist: URI lines and URI="..." attributes
+_URI_LINE = re.compile(r"^(?!#)(\S+)$", re.MULTILINE)
+_URI_ATTRIBUTE = re.compile(r'URI="([^"]+)"')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def resolve_output_file(video_dir: Path, file_path: str) -> Optional[Path]:
+    """Map a request path to a regular file inside ``video_dir``, None if it is not servable
+
+    Rejects traversal outside the directory and dotfiles (progress, logs, scratch data).
+    """
+    parts = Path(file_path).parts
+    if not parts or any(part.startswith(".") for part in parts):
+        return None
+    path = (video_dir / file_path).resolve()
+    try:
+        path.relative_to(video_dir.resolve())
+    except ValueError:
+        return None
+    if path.suffix.lower() not in MEDIA_TYPES or not path.is_file():
+        return None
+    return path
+
+
+def make_etag(stat_result: os.stat_result, suffix: str = "") -> str:
+    """Strong validator: any rewrite of the file changes its inode, mtime or size"""
+    return f'"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}{suffix}"'
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison (RFC 9110 8.8.3.2): W/"x" and "x" match, as If-None-Match requires"""
+    candidates = [_opaque_tag(candidate.strip()) for candidate in header.split(",")]
+    return "*" in candidates or _opaque_tag(etag) in candidates
+
+
+def _not_before(header: str, mtime: float) -> bool:
+    try:
+        return parsedate_to_datetime(header).timestamp() >= int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def is_not_modified(headers: Mapping[str, str], etag: str, mtime: float) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    return if_modified_since is not None and _not_before(if_modified_since, mtime)
+
+
+def parse_range(headers: Mapping[str, str], size: int, etag: str, mtime: float) -> Optional[Tuple[int, int]]:
+    """Return the inclusive (start, end) of a single-range request, None to send the whole file
+
+    Multi-range requests are answered with the whole file, which RFC 9110 allows.
+    Raises RangeNotSatisfiable for ranges outside the file.
+    """
+    header = headers.get("range")
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    if_range = headers.get("if-range")
+    if if_range is not None:
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            # Strong comparison: a weak validator never matches
+            if if_range.startswith("W/") or if_range != etag:
+                return None
+        elif not _not_before(if_range, mtime):
+            return None
+
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end or (not first and not last):
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def version_playlist(text: str, version: str) -> str:
+    """Append ``?v=<version>`` to every URI, so completed segments can be cached as immutable"""
+    def versioned(uri: str) -> str:
+        if "://" in uri or uri.startswith("/"):
+            return uri
+        return f"{uri}{'&' if '?' in uri else '?'}v={version}"
+
+    text = _URI_ATTRIBUTE.sub(lambda match: f'URI="{versioned(match.group(1))}"', text)
+    return _URI_LINE.sub(lambda match: versioned(match.group(1)), text)
+
+
+def load_playlist(path: Path, stat_result: os.stat_result, completed: bool) -> Tuple[str, bytes]:
+    """Read a playlist as served: (ETag, body), versioned when the video is completed"""
+    text = path.read_text()
+    if not completed:
+        return make_etag(stat_result), text.encode()
+    version = f"{stat_result.st_mtime_ns:x}"
+    return make_etag(stat_result, f"-v{version}"), version_playlist(text, version).encode()
+
+
+def playlist_etag(stat_result: os.stat_result, completed: bool) -> str:
+    """ETag of ``load_playlist`` without reading the file"""
+    return make_etag(stat_result, f"-v{stat_result.st_mtime_ns:x}" if completed else "")
+
+
+def base_headers(stat_result: os.stat_result, etag: str, cache_control: str) -> dict:
+    return {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+    }
+
+
+class FileRangeResponse(Response):
+    """Send ``path`` or one byte range of it
+
+    ``content`` is the file body when it is already in memory. Otherwise the
+    ASGI zero-copy (sendfile) or pathsend extension is used when the server
+    offers one, and positioned reads from a worker thread when it does not.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        stat_result: os.stat_result,
+        headers: dict,
+        media_type: str,
+        byte_range: Optional[Tuple[int, int]] = None,
+        content: Optional[bytes] = None,
+    ):
+        self.path = path
+        self.content = content
+        self.size = stat_result.st_size
+        self.start, self.end = byte_range or (0, self.size - 1)
+        self.status_code = 206 if byte_range else 200
+        self.media_type = media_type
+        self.background = None
+
+        headers = {**headers, "accept-ranges": "bytes", "content-length": str(self.end - self.start + 1)}
+        if byte_range:
+            headers["content-range"] = f"bytes {self.start}-{self.end}/{self.size}"
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        length = self.end - self.start + 1
+        if scope["method"].upper() == "HEAD" or length <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if self.content is not None:
+            body = self.content[self.start:self.end + 1] if self.status_code == 206 else self.content
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions and self.status_code == 200:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+            return
+
+        f = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            if "http.response.zerocopy" in extensions:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f,
+                    "offset": self.start,
+                    "count": length,
+                    "more_body": False,
+                })
+                return
+
+            offset = self.start
+            while offset <= self.end:
+                size = min(READ_CHUNK_SIZE, self.end - offset + 1)
+                chunk = await asyncio.to_thread(os.pread, f.fileno(), size, offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": offset <= self.end})
+            if offset <= self.end:
+                # File shrank underneath us; end the response rather than hang
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await asyncio.to_thread(f.close)
@@ -0,0 +1,70 @@
+"""
+HLS playlist helpers
+Read and write media playlists produced by FFmpeg's HLS muxer
+"""
+import math
+from pathlib import Path
+from typing import Collection, List, Tuple
+
+# (segment duration in seconds, segment URI)
+PlaylistEntry = Tuple[float, str]
+
+
+def parse_media_playlist(playlist: Path) -> List[PlaylistEntry]:
+    """Return the segments listed in a media playlist, in order"""
+    entries: List[PlaylistEntry] = []
+    pending_duration = None
+
+    with open(playlist, "r") as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if line.startswith("#EXTINF:"):
+                pending_duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            elif line and not line.startswith("#") and pending_duration is not None:
+                entries.append((pending_duration, line))
+                pending_duration = None
+
+    return entries
+
+
+def parse_init_sections(playlist: Path) -> List[str]:
+    """Return the URIs of EXT-X-MAP init sections (fMP4 output) in a media playlist"""
+    uris = []
+    with open(playlist, "r") as f:
+        for line in f:
+            if line.startswith("#EXT-X-MAP:") and 'URI="' in line:
+                uris.append(line.split('URI="', 1)[1].split('"', 1)[0])
+    return uris
+
+
+def write_media_playlist(
+    playlist: Path,
+    entries: List[PlaylistEntry],
+    ended: bool = True,
+    discontinuities: Collection[int] = (),
+):
+    """Write a VOD media playlist listing ``entries``
+
+    ``discontinuities`` are indices of entries that start output of another FFmpeg
+    process (a chunk, a resumed run); an EXT-X-DISCONTINUITY tag before each makes
+    players reset their decoders there instead of glitching on the encoder restart.
+    """
+    target_duration = math.ceil(max((duration for duration, _ in entries), default=1))
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+    ]
+    for index, (duration, uri) in enumerate(entries):
+        if index in discontinuities and index > 0:
+            lines.append("#EXT-X-DISCONTINUITY")
+        lines.append(f"#EXTINF:{duration:.6f},")
+        lines.append(uri)
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+
+    tmp_path = playlist.with_suffix(playlist.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    tmp_path.replace(playlist)
@@ -0,0 +1,430 @@
+"""
+Conversion job scheduler
+Persists conversion jobs in the database and runs them on a bounded worker pool
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from cpu_budget import CPUAllocator
+from database import AsyncSessionLocal
+from metrics import metrics
+from models import ConversionJob, Video
+from ffmpeg_converter import FFmpegConverter
+from media_probe import load_cached_probe
+from progress_registry import progress_registry
+
+# Statuses of jobs that still hold (or are waiting for) a worker slot
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+# Seconds interrupted jobs get to exit at shutdown once the grace period is over
+INTERRUPT_TIMEOUT_SECONDS = 10
+
+# Coroutine that performs the conversion and records the result on the video row
+JobRunner = Callable[[FFmpegConverter, int], Awaitable[bool]]
+
+
+class JobScheduler:
+    """Run queued conversion jobs with at most ``max_workers`` ffmpeg processes at once"""
+
+    def __init__(self, runner: JobRunner, max_workers: int):
+        self.runner = runner
+        self.max_workers = max(1, max_workers)
+        # Converters currently running, keyed by video name
+        self.running: Dict[str, FFmpegConverter] = {}
+        self._running_jobs: Dict[str, int] = {}
+        # Set once a running job's result has been recorded, keyed by video name
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._cancelled: set = set()
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        # One per conversion allowed at once, taken by workers and streaming jobs alike
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._workers: List[asyncio.Task] = []
+        self._stopping = False
+        # Splits the cores between running jobs
+        self.cpu = CPUAllocator(
+            self.max_workers,
+            reserved=settings.CONVERSION_RESERVED_CPUS,
+            pin=settings.CONVERSION_CPU_PINNING,
+            base_nice=settings.CONVERSION_NICE,
+        )
+
+    async def start(self):
+        """Requeue jobs interrupted by a previous shutdown or crash and start the workers
+
+        Requeued jobs run again with ``resume``, continuing from the segments the
+        interrupted run completed where the converter supports it.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(ConversionJob.video_id).where(ConversionJob.status == "running")
+            )
+            video_ids = result.scalars().all()
+            if video_ids:
+                await db.execute(
+                    update(ConversionJob)
+                    .where(ConversionJob.status == "running")
+                    .values(status="queued", started_at=None)
+                )
+                await db.execute(
+                    update(Video)
+                    .where(Video.id.in_(video_ids))
+                    .where(Video.status == "converting")
+                    .values(status="pending")
+                )
+                await db.commit()
+                print(f"✓ Requeued {len(video_ids)} interrupted conversion job(s)")
+
+        self._stopping = False
+
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.max_workers)
+        ]
+        self._wakeup.set()
+
+    async def stop(self, grace_period: float = 0):
+        """Stop the workers, letting running jobs finish for up to ``grace_period`` seconds
+
+        Jobs still running after that are interrupted: their completed segments are
+        kept, they stay 'running' and are requeued and resumed on next start.
+        """
+        self._stopping = True
+        pending = [asyncio.create_task(finished.wait()) for finished in self._finished.values()]
+        if pending and grace_period > 0:
+            print(f"Waiting up to {grace_period:g}s for {len(pending)} running conversion(s)...")
+            _, pending = await asyncio.wait(pending, timeout=grace_period)
+
+        for converter in list(self.running.values()):
+            converter.interrupt()
+        if pending:
+            # Give interrupted jobs a moment to record that they stopped
+            _, pending = await asyncio.wait(pending, timeout=INTERRUPT_TIMEOUT_SECONDS)
+        for task in pending:
+            task.cancel()
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        video: Video,
+        input_file: Path,
+        segment_duration: int,
+        watermark_text: Optional[str] = None,
+        priority: int = 0,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> ConversionJob:
+        """Persist a new job for ``video`` and wake an idle worker
+
+        ``options`` holds extra FFmpegConverter keyword arguments (e.g. renditions).
+        """
+        job = ConversionJob(
+            video_id=video.id,
+            video_name=video.name,
+            input_file=str(input_file),
+            segment_duration=segment_duration,
+            watermark_text=watermark_text,
+            options=json.dumps(options) if options else None,
+            priority=priority,
+            status="queued",
+            user_id=video.user_id,
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+
+        self._wakeup.set()
+        return job
+
+    async def get_active_job(self, db: AsyncSession, video_name: str) -> Optional[ConversionJob]:
+        """Return the queued or running job for a video, if any"""
+        result = await db.execute(
+            select(ConversionJob)
+            .where(ConversionJob.video_name == video_name)
+            .where(ConversionJob.status.in_(ACTIVE_JOB_STATUSES))
+        )
+        return result.scalars().first()
+
+    async def cancel(self, video_name: str, wait: bool = False) -> bool:
+        """Cancel the queued or running job for a video. Returns False if there was none.
+
+        With ``wait``, a running job is also given time to record its result, so
+        nothing writes to the video's output directory or row afterwards.
+        """
+        job_id = self._running_jobs.get(video_name)
+        if job_id is not None:
+            # Claimed jobs are flagged even before their converter exists; _execute then never starts it
+            finished = self._finished.get(video_name)
+            self._cancelled.add(job_id)
+            converter = self.running.get(video_name)
+            if converter:
+                await converter.cancel()
+            if wait and finished:
+                await finished.wait()
+            return True
+
+        async with AsyncSessionLocal() as db:
+            job = await self.get_active_job(db, video_name)
+            if not job or job.status != "queued":
+                return False
+
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+            video = await db.get(Video, job.video_id)
+            if video:
+                video.status = "cancelled"
+            await db.commit()
+        return True
+
+    async def _worker(self):
+        """Claim and run jobs until cancelled"""
+        while not self._stopping:
+            self._wakeup.clear()
+            # Hold a slot while claiming, so no job is claimed while streaming jobs use every slot
+            async with self._slots:
+                job = await self._claim_next()
+                if job is not None:
+                    await self._run(job)
+            if job is None:
+                await self._wakeup.wait()
+
+    async def _claim_next(self) -> Optional[ConversionJob]:
+        """Mark the highest-priority queued job as running and return it"""
+        async with self._claim_lock:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(ConversionJob)
+                    .where(ConversionJob.status == "queued")
+                    .order_by(
+                        ConversionJob.priority.desc(),
+                        ConversionJob.created_at,
+                        ConversionJob.id,
+                    )
+                    .limit(1)
+                )
+                job = result.scalar_one_or_none()
+                if job is None:
+                    return None
+
+                job.status = "running"
+                job.started_at = datetime.utcnow()
+                job.attempts = (job.attempts or 0) + 1
+                video = await db.get(Video, job.video_id)
+                if video:
+                    video.status = "converting"
+                await db.commit()
+                self._claim(job)
+                return job
+
+    def _claim(self, job: ConversionJob):
+        """Track a job from the moment it is marked running, so it can be cancelled before it starts"""
+        self._running_jobs[job.video_name] = job.id
+        self._finished[job.video_name] = asyncio.Event()
+
+    def _unclaim(self, job: ConversionJob):
+        self._running_jobs.pop(job.video_name, None)
+        self._cancelled.discard(job.id)
+        finished = self._finished.pop(job.video_name, None)
+        if finished:
+            finished.set()
+
+    def claimed_video_names(self) -> List[str]:
+        """Videos whose job is running or claimed by a worker and about to start"""
+        return list(self._running_jobs)
+
+    async def _run(self, job: ConversionJob):
+        """Run one claimed job and record its outcome"""
+        try:
+            converter = await self._prepare(job)
+        except Exception:
+            self._unclaim(job)
+            raise
+        await self._execute(job, converter, lambda: self.runner(converter, job.video_id))
+
+    async def _prepare(self, job: ConversionJob) -> FFmpegConverter:
+        input_file = Path(job.input_file)
+
+        # Reuse the stored probe if the input file has not changed since
+        async with AsyncSessionLocal() as db:
+            video = await db.get(Video, job.video_id)
+            media_info = None
+            if video:
+                media_info = await asyncio.to_thread(
+                    load_cached_probe, video.media_info, video.media_info_key, input_file
+                )
+
+        return FFmpegConverter(
+            input_file,
+            settings.OUTPUT_DIR / job.video_name,
+            job.segment_duration,
+            job.watermark_text,
+            media_info=media_info,
+            probe_timeout=settings.FFPROBE_TIMEOUT,
+            keyframe_probe_timeout=settings.FFPROBE_KEYFRAME_TIMEOUT,
+            # A job claimed again was interrupted; continue from its completed segments
+            resume=job.attempts > 1,
+            **json.loads(job.options or "{}"),
+        )
+
+    async def run_attached(
+        self,
+        db: AsyncSession,
+        video: Video,
+        converter: FFmpegConverter,
+        run: Callable[[], Awaitable[bool]],
+        options: Optional[Dict[str, Any]] = None,
+    ) -> Optional[ConversionJob]:
+        """Record a job and run it in the caller's task instead of the worker pool
+
+        Used for streaming ingest: the input arrives with the request, so it cannot
+        wait for a free worker slot. It still takes one, so MAX_CONCURRENT_CONVERSIONS
+        holds; returns None without recording anything when every slot is taken
+        (or queued jobs are waiting for one). The job is listed and cancellable like
+        any other. ``options`` are stored as for ``enqueue``, so a job interrupted by a
+        shutdown after its upload completed is requeued with the same settings; one
+        interrupted mid-upload has no input to resume from and ends as an error.
+        """
+        if self._stopping or self._slots.locked():
+            return None
+        await self._slots.acquire()
+        try:
+            return await self._run_attached(db, video, converter, run, options)
+        finally:
+            self._slots.release()
+
+    async def _run_attached(
+        self,
+        db: AsyncSession,
+        video: Video,
+        converter: FFmpegConverter,
+        run: Callable[[], Awaitable[bool]],
+        options: Optional[Dict[str, Any]],
+    ) -> ConversionJob:
+        job = ConversionJob(
+            video_id=video.id,
+            video_name=video.name,
+            input_file=str(converter.input_file),
+            segment_duration=converter.segment_duration,
+            watermark_text=converter.watermark_text,
+            options=json.dumps(options) if options else None,
+            status="running",
+            started_at=datetime.utcnow(),
+            attempts=1,
+            user_id=video.user_id,
+        )
+        db.add(job)
+        video.status = "converting"
+        await db.commit()
+        await db.refresh(job)
+        self._claim(job)
+
+        job.status = await self._execute(job, converter, run, streaming=True)
+        return job
+
+    async def queued_count(self) -> int:
+        """Number of jobs waiting for a worker"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(func.count()).select_from(ConversionJob).where(ConversionJob.status == "queued")
+            )
+            return result.scalar_one()
+
+    async def _execute(
+        self,
+        job: ConversionJob,
+        converter: FFmpegConverter,
+        run: Callable[[], Awaitable[bool]],
+        streaming: bool = False,
+    ) -> str:
+        """Run a job's conversion, record its outcome and return the final job status
+
+        The job must have been claimed (``_claim``) when it was marked running.
+        ``streaming`` jobs receive their input while converting (see ``run_attached``).
+        """
+        finished = self._finished[job.video_name]
+        # Share the cores with the jobs running now and those about to start
+        demand = len(self.running) + 1 + await self.queued_count()
+        converter.cpu_budget = self.cpu.acquire(job.video_name, job.priority or 0, demand)
+        self.running[job.video_name] = converter
+        progress_registry.set_owner(job.video_name, job.user_id)
+        started = time.monotonic()
+
+        error_message = None
+        try:
+            if job.id in self._cancelled:
+                # Cancelled between claim and start (the video may already be deleted)
+                converter.cancelled = True
+                success = False
+            else:
+                success = await run()
+        except Exception as e:
+            print(f"Conversion job {job.id} failed: {e}")
+            success = False
+            error_message = str(e)
+        finally:
+            self.running.pop(job.video_name, None)
+            self._running_jobs.pop(job.video_name, None)
+            self.cpu.release(job.video_name)
+
+        try:
+            if converter.interrupted and (not streaming or converter.input_complete):
+                # Left 'running' on purpose: requeued and resumed on next start
+                metrics.observe_conversion("interrupted", time.monotonic() - started, converter.stats)
+                return "interrupted"
+
+            video_status = None
+            if converter.interrupted:
+                # The upload was cut off with the stream, so there is no input to requeue
+                job_status = "error"
+                error_message = "Interrupted by a server shutdown before the upload completed"
+                video_status = "error"
+            elif job.id in self._cancelled:
+                self._cancelled.discard(job.id)
+                job_status = "cancelled"
+                # Normally recorded by the runner, but not when the job never started
+                video_status = "cancelled"
+            else:
+                job_status = "completed" if success else "error"
+            metrics.observe_conversion(job_status, time.monotonic() - started, converter.stats)
+
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(ConversionJob)
+                    .where(ConversionJob.id == job.id)
+                    .values(
+                        status=job_status,
+                        error_message=error_message,
+                        fps=converter.stats["fps"] if converter.stats else None,
+                        speed=converter.stats["speed"] if converter.stats else None,
+                        encoding_profile=converter.encoding_profile,
+                        finished_at=datetime.utcnow(),
+                    )
+                )
+                if video_status:
+                    # Only if the runner did not record an outcome itself
+                    values: Dict[str, Any] = {"status": video_status}
+                    if video_status == "error":
+                        values["error_message"] = error_message
+                    await db.execute(
+                        update(Video)
+                        .where(Video.id == job.video_id)
+                        .where(Video.status == "converting")
+                        .values(**values)
+                    )
+                await db.commit()
+            return job_status
+        finally:
+            finished.set()
+            if self._finished.get(job.video_name) is finished:
+                del self._finished[job.video_name]
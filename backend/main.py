@@ -3,40 +3,80 @@ FastAPI backend for HLS Video Platform
 Main application with all API endpoints
 """
 import asyncio
-import shutil
+import base64
+import json
+import secrets
+import time
 from pathlib import Path
 from datetime import timedelta, datetime
-from typing import List, Optional, Dict
+from typing import AsyncIterator, List, Optional
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, HTTPException, Query, status, UploadFile, File, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import and_, or_, select, delete, func
 
 from config import settings
-from database import get_db, init_db
-from models import User, Video
+from database import AsyncSessionLocal, engine, get_db, init_db
+from models import User, Video, ConversionJob
 from schemas import (
     UserCreate, UserLogin, UserResponse, Token,
-    VideoCreate, VideoResponse, ConversionRequest,
-    ProgressResponse, ServerStatus
+    VideoCreate, VideoResponse, ConversionRequest, JobResponse,
+    ProgressResponse, ServerStatus, MediaInfoResponse,
+    UploadSessionCreate, UploadSessionResponse, UploadCompleteRequest
 )
 from auth import (
-    get_password_hash, verify_password, create_access_token,
-    get_current_active_user, get_optional_user
+    password_hasher, create_access_token,
+    get_current_active_user, get_optional_user, get_user_from_token
 )
-from ffmpeg_converter import FFmpegConverter
+from ffmpeg_converter import FFmpegConverter, RENDITION_PRESETS, SEGMENT_FORMATS
+from job_queue import JobScheduler
+from conversion_cache import ConversionCache
+from disk_usage import DiskUsageReconciler, format_size, measure_output
+from encoding_profiles import ENCODING_PROFILES, resolve_encoding
+from hls_cache import HLSAssetCache
+from hls_delivery import (
+    IMMUTABLE_CACHE_CONTROL, MEDIA_TYPES, REVALIDATE_CACHE_CONTROL, FileRangeResponse,
+    RangeNotSatisfiable, base_headers, is_not_modified, load_playlist, make_etag,
+    parse_range, playlist_etag, resolve_output_file
+)
+from metrics import MetricsMiddleware, metrics
+from media_probe import ProbeError, is_streamable, load_cached_probe, probe_key, probe_media
+from progress_registry import progress_registry, read_snapshot
+from trash import TrashReaper
+from uploads import UploadError, UploadManager, received_bytes, save_stream
+from user_cache import AuthUser, user_cache
+from ws_connections import ALL_TOPIC, ConnectionRegistry, topics_of_video, user_topic, video_topic
 
 # Lifespan context manager for startup/shutdown events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    await init_db()
+    applied = await init_db()
+    if applied:
+        print(f"✓ Applied database migrations: {', '.join(map(str, applied))}")
     print(f"✓ Database initialized")
+    progress_registry.flush_interval = settings.PROGRESS_FLUSH_INTERVAL_MS / 1000
+    if settings.METRICS_ENABLED:
+        # Every route exists by now; give each its series before the first request
+        metrics.register_routes(app.routes)
+    await scheduler.start()
+    print(f"✓ Conversion queue started ({scheduler.max_workers} workers)")
+    upload_gc = asyncio.create_task(upload_manager.run_gc())
+    reconciler = asyncio.create_task(
+        DiskUsageReconciler(settings.OUTPUT_DIR, settings.DISK_USAGE_RECONCILE_INTERVAL).run()
+    )
+    reaper = asyncio.create_task(trash.run())
     print(f"✓ Server starting on {settings.HOST}:{settings.PORT}")
     yield
-    # Shutdown (cleanup if needed)
+    # Shutdown: drain running jobs for the grace period; unfinished ones are resumed on next start
+    upload_gc.cancel()
+    reconciler.cancel()
+    reaper.cancel()
+    await scheduler.stop(settings.SHUTDOWN_GRACE_PERIOD)
+    await progress_registry.flush_all()
+    password_hasher.shutdown()
     print("✓ Server shutting down")
 
 # Create FastAPI app
@@ -54,41 +94,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination metadata of /api/videos, range and validator headers of /hls
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Content-Range", "Content-Length", "ETag"],
 )
 
-# Store for active conversions with thread safety
-active_conversions: Dict[str, "FFmpegConverter"] = {}
-conversions_lock = asyncio.Lock()
-
-# WebSocket connections manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+if settings.METRICS_ENABLED:
+    # Outermost, so request timings include CORS handling
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    metrics.instrument_engine(engine.sync_engine)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: dict):
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"WebSocket broadcast error: {e}")
-                disconnected.append(connection)
-
-        # Remove disconnected clients
-        for conn in disconnected:
-            try:
-                self.active_connections.remove(conn)
-            except ValueError:
-                pass
+# Deleted output directories, removed in the background
+trash = TrashReaper(settings.TRASH_DIR, settings.TRASH_REAP_CONCURRENCY)
 
-manager = ConnectionManager()
+# WebSocket progress subscribers, fed by every progress update
+connections = ConnectionRegistry(settings.WS_SEND_QUEUE_SIZE, settings.WS_SEND_TIMEOUT)
+progress_registry.add_listener(connections.publish_progress)
 
 
 # ==================== Authentication Endpoints ====================
@@ -110,7 +130,7 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     db_user = User(
         username=user.username,
         email=user.email,
-        hashed_password=get_password_hash(user.password)
+        hashed_password=await password_hasher.hash(user.password)
     )
     db.add(db_user)
     await db.commit()
@@ -125,13 +145,23 @@ async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.username == user.username))
     db_user = result.scalar_one_or_none()
 
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    valid, new_hash = False, None
+    if db_user:
+        # bcrypt runs on the hashing pool, not the event loop
+        valid, new_hash = await password_hasher.verify(user.password, db_user.hashed_password)
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    if new_hash:
+        # Stored hash used a different bcrypt cost; upgrade it transparently
+        db_user.hashed_password = new_hash
+        await db.commit()
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": db_user.username}, expires_delta=access_token_expires
@@ -141,39 +171,137 @@ async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
 
 
 @app.get("/api/auth/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(
+    current_user: AuthUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
     """Get current user info"""
-    return current_user
+    # The cached user only carries what authorization needs; load the full profile
+    db_user = await db.get(User, current_user.id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
 
 
 # ==================== Video Management Endpoints ====================
 
-@app.get("/api/videos", response_model=List[VideoResponse])
+# Columns /api/videos can return (?fields=...), in VideoResponse order
+VIDEO_LIST_FIELDS = list(VideoResponse.model_fields)
+VIDEO_PAGE_MAX = 1000
+
+
+def encode_video_cursor(created_at: datetime, video_id: int) -> str:
+    """Opaque keyset cursor pointing after the given row"""
+    raw = json.dumps([created_at.isoformat() if created_at else None, video_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_video_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, video_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(video_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get(
+    "/api/videos",
+    response_class=ORJSONResponse,
+    responses={200: {
+        "model": List[VideoResponse],
+        "description": "Videos, each holding only the keys named in ``fields`` when given",
+    }},
+)
 async def list_videos(
+    limit: Optional[int] = Query(None, ge=1, le=VIDEO_PAGE_MAX),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    include_total: bool = False,
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_user)
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
 ):
-    """List all videos (or user-specific if authenticated)"""
+    """List all videos (or user-specific if authenticated), newest first
+
+    With ``limit`` the list is paginated: pass the ``X-Next-Cursor`` response header
+    back as ``cursor`` for the next page. ``fields`` selects columns (comma-separated),
+    so items are partial VideoResponse objects, and ``include_total`` adds an
+    ``X-Total-Count`` header. Rows are returned as projected, without response_model
+    validation.
+    """
+    selected = VIDEO_LIST_FIELDS
+    if fields:
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in VIDEO_LIST_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(VIDEO_LIST_FIELDS)}"
+            )
+
+    conditions = []
     if current_user:
         # Authenticated: show only user's videos
-        result = await db.execute(
-            select(Video)
-            .where(Video.user_id == current_user.id)
-            .order_by(Video.created_at.desc())
+        conditions.append(Video.user_id == current_user.id)
+    if status_filter:
+        conditions.append(Video.status == status_filter)
+    if created_after:
+        conditions.append(Video.created_at >= created_after)
+    if created_before:
+        conditions.append(Video.created_at < created_before)
+
+    total = None
+    if include_total:
+        result = await db.execute(select(func.count(Video.id)).where(*conditions))
+        total = result.scalar_one()
+
+    # Project plain columns (plus the keyset columns) instead of loading ORM objects
+    columns = {name: getattr(Video, name) for name in ["id", "created_at", *selected]}
+    query = (
+        select(*columns.values())
+        .where(*conditions)
+        .order_by(Video.created_at.desc(), Video.id.desc())
+    )
+
+    if cursor:
+        cursor_created_at, cursor_id = decode_video_cursor(cursor)
+        # Compare against the stored value of the cursor row so the timestamp
+        # round-trips exactly; fall back to the encoded one if the row is gone
+        anchor = func.coalesce(
+            select(Video.created_at).where(Video.id == cursor_id).scalar_subquery(),
+            cursor_created_at
         )
-    else:
-        # Testing mode: show all videos
-        result = await db.execute(select(Video).order_by(Video.created_at.desc()))
+        query = query.where(or_(
+            Video.created_at < anchor,
+            and_(Video.created_at == anchor, Video.id < cursor_id)
+        ))
+
+    if limit:
+        # One extra row tells whether there is a next page
+        query = query.limit(limit + 1)
+
+    result = await db.execute(query)
+    rows = result.all()
 
-    videos = result.scalars().all()
-    return videos
+    headers = {}
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_video_cursor(rows[-1].created_at, rows[-1].id)
+    if total is not None:
+        headers["X-Total-Count"] = str(total)
+
+    videos = [{name: row._mapping[name] for name in selected} for row in rows]
+    return ORJSONResponse(videos, headers=headers)
 
 
 @app.get("/api/videos/{video_id}", response_model=VideoResponse)
 async def get_video(
     video_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_user)
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
 ):
     """Get video by ID (with user ownership check if authenticated)"""
     if current_user:
@@ -195,11 +323,52 @@ async def get_video(
     return video
 
 
+@app.get("/api/videos/{video_id}/media", response_model=MediaInfoResponse)
+async def get_video_media_info(
+    video_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """Get probed stream information for a video's source file"""
+    query = select(Video).where(Video.id == video_id)
+    if current_user:
+        query = query.where(Video.user_id == current_user.id)
+    result = await db.execute(query)
+    video = result.scalar_one_or_none()
+
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    input_file = settings.INPUT_DIR / video.original_filename
+    media_info = await asyncio.to_thread(load_cached_probe, video.media_info, video.media_info_key, input_file)
+
+    if media_info is None:
+        if not input_file.exists():
+            if not video.media_info:
+                raise HTTPException(status_code=404, detail="Input video file not found")
+            # Source was removed; the last probe is still the best description
+            media_info = json.loads(video.media_info)
+        else:
+            try:
+                media_info = await probe_media(input_file, settings.FFPROBE_TIMEOUT)
+            except ProbeError as e:
+                raise HTTPException(status_code=422, detail=f"Could not probe video: {e}")
+            video.media_info = json.dumps(media_info)
+            video.media_info_key = await asyncio.to_thread(probe_key, input_file)
+            await db.commit()
+
+    keyframes = media_info.get("keyframes")
+    return {
+        **{key: value for key, value in media_info.items() if key != "keyframes"},
+        "keyframe_count": len(keyframes) if keyframes is not None else None
+    }
+
+
 @app.delete("/api/videos/{video_id}")
 async def delete_video(
     video_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_user)
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
 ):
     """Delete a video (with ownership check if authenticated)"""
     if current_user:
@@ -218,33 +387,48 @@ async def delete_video(
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
-    # Delete output directory
-    output_dir = settings.OUTPUT_DIR / video.name
-    if output_dir.exists():
-        shutil.rmtree(output_dir)
+    # Stop any queued or running conversion and let it finish writing before removing its output
+    await scheduler.cancel(video.name, wait=True)
 
-    # Delete from database
+    # Delete the rows first (jobs reference the video), so a failed commit leaves the files in place
+    video_name, cache_key = video.name, video.cache_key
+    await db.execute(delete(ConversionJob).where(ConversionJob.video_id == video.id))
     await db.delete(video)
     await db.commit()
 
-    return {"message": f"Video '{video.name}' deleted successfully"}
+    await release_video_output(video_name, cache_key)
+
+    return {"message": f"Video '{video_name}' deleted successfully"}
+
+
+async def release_video_output(video_name: str, cache_key: Optional[str]):
+    """Drop a deleted video's cache reference, in-memory state and output directory
+
+    The output directory is moved to the trash; the reaper deletes the files in the background.
+    """
+    await conversion_cache.release(cache_key)
+    progress_registry.discard(video_name)
+    hls_cache.invalidate_video(video_name)
+    await trash.trash(settings.OUTPUT_DIR / video_name)
+
+
+ALLOWED_VIDEO_EXTENSIONS = [".mp4", ".avi", ".mkv", ".mov", ".flv", ".wmv", ".webm"]
 
 
 @app.post("/api/videos/upload")
 async def upload_video(
     file: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_user)
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
 ):
     """Upload a video file (user-specific if authenticated)"""
     # Validate file type
-    allowed_extensions = [".mp4", ".avi", ".mkv", ".mov", ".flv", ".wmv", ".webm"]
     file_ext = Path(file.filename).suffix.lower()
 
-    if file_ext not in allowed_extensions:
+    if file_ext not in ALLOWED_VIDEO_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"
         )
 
     # Check file size (read in chunks to avoid memory issues)
@@ -290,29 +474,141 @@ async def upload_video(
     }
 
 
-# ==================== Conversion Endpoints ====================
+# ==================== Resumable Upload Endpoints ====================
 
-@app.post("/api/convert")
-async def convert_video(
-    request: ConversionRequest,
-    db: AsyncSession = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_user)
+upload_manager = UploadManager(settings.UPLOAD_DIR, settings.UPLOAD_SESSION_TTL_HOURS)
+
+
+def upload_session_response(session) -> dict:
+    ranges = json.loads(session.received_ranges or "[]")
+    received = received_bytes(ranges)
+    return {
+        "upload_id": session.id,
+        "filename": session.filename,
+        "size": session.total_size,
+        "received_bytes": received,
+        "received_ranges": ranges,
+        "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+        "complete": received == session.total_size,
+        "expires_at": upload_manager.expires_at(session),
+    }
+
+
+async def get_upload_session(upload_id: str, current_user: Optional[AuthUser]):
+    """Load an upload session (with ownership check if authenticated)"""
+    session = await upload_manager.get(upload_id)
+    if not session or (current_user and session.user_id != current_user.id):
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+@app.post("/api/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload(
+    request: UploadSessionCreate,
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
 ):
-    """Start video conversion to HLS format (user-specific if authenticated)"""
-    # Validate segment_duration
-    if request.segment_duration < 1 or request.segment_duration > 30:
+    """Start a resumable upload; send the data with PUT /api/uploads/{id}?offset=N"""
+    filename = Path(request.filename).name
+    if Path(filename).suffix.lower() not in ALLOWED_VIDEO_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail="Segment duration must be between 1 and 30 seconds"
+            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"
+        )
+    if request.size < 0:
+        raise HTTPException(status_code=400, detail="Invalid file size")
+    if request.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE / (1024**3):.1f}GB"
         )
 
-    input_file = settings.INPUT_DIR / request.video_name
+    session = await upload_manager.create(
+        filename, request.size, request.checksum, current_user.id if current_user else None
+    )
+    return upload_session_response(session)
+
+
+@app.get("/api/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(
+    upload_id: str,
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """Report which byte ranges of an upload have been received"""
+    session = await get_upload_session(upload_id, current_user)
+    return upload_session_response(session)
 
-    if not input_file.exists():
-        raise HTTPException(status_code=404, detail="Input video file not found")
 
+@app.put("/api/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """Store the raw request body at ``offset``; chunks may be sent in parallel and retried"""
+    session = await get_upload_session(upload_id, current_user)
+
+    content_length = request.headers.get("content-length")
+    length = int(content_length) if content_length and content_length.isdigit() else None
+
+    try:
+        session = await upload_manager.write_chunk(session, offset, length, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    return upload_session_response(session)
+
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    request: UploadCompleteRequest,
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """Verify the checksum and move the assembled file into the input directory"""
+    session = await get_upload_session(upload_id, current_user)
+    file_path = settings.INPUT_DIR / session.filename
+
+    try:
+        file_size = await upload_manager.complete(session, file_path, request.checksum)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    return {
+        "message": "File uploaded successfully",
+        "filename": session.filename,
+        "size": file_size,
+        "path": str(file_path)
+    }
+
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_upload(
+    upload_id: str,
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """Cancel an upload and discard the received data"""
+    session = await get_upload_session(upload_id, current_user)
+    await upload_manager.abort(session)
+    return {"message": "Upload cancelled"}
+
+
+# ==================== Conversion Endpoints ====================
+
+async def prepare_video_record(
+    db: AsyncSession,
+    filename: str,
+    file_size: Optional[int],
+    segment_duration: int,
+    renditions: Optional[List[str]],
+    current_user: Optional[AuthUser]
+) -> Video:
+    """Create or reset the video row for a new conversion of ``filename``
+
+    Raises 409 if a conversion of the same video is already queued or running.
+    """
     # Check if video already exists in database
-    video_basename = input_file.stem
+    video_basename = Path(filename).stem
     if current_user:
         # Authenticated: check for user's video
         result = await db.execute(
@@ -328,19 +624,29 @@ async def convert_video(
 
     existing_video = result.scalar_one_or_none()
 
+    if existing_video and await scheduler.get_active_job(db, existing_video.name):
+        raise HTTPException(
+            status_code=409,
+            detail="A conversion for this video is already queued or running"
+        )
+
     if existing_video:
-        # Update existing video
+        # Update existing video; its output is about to be rewritten
+        hls_cache.invalidate_video(existing_video.name)
         db_video = existing_video
         db_video.status = "pending"
         db_video.progress = 0
         db_video.error_message = None
+        db_video.segment_duration = segment_duration
+        db_video.renditions = ",".join(renditions) if renditions else None
     else:
         # Create new video record
         db_video = Video(
             name=video_basename,
-            original_filename=request.video_name,
-            file_size=input_file.stat().st_size,
-            segment_duration=request.segment_duration,
+            original_filename=filename,
+            file_size=file_size,
+            segment_duration=segment_duration,
+            renditions=",".join(renditions) if renditions else None,
             status="pending",
             user_id=current_user.id if current_user else None
         )
@@ -348,172 +654,513 @@ async def convert_video(
 
     await db.commit()
     await db.refresh(db_video)
+    return db_video
 
-    # Start conversion in background
-    output_dir = settings.OUTPUT_DIR / video_basename
 
-    # Create watermark text (user-specific if authenticated, or IP address if not)
-    watermark_text = None
-    if current_user:
+def validate_segment_format(segment_format: str):
+    if segment_format not in SEGMENT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown segment format: {segment_format}. Allowed: {', '.join(SEGMENT_FORMATS)}"
+        )
+
+
+def validate_encoding(profile: str, overrides: Optional[dict] = None):
+    try:
+        resolve_encoding(profile, overrides)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def make_watermark_text(watermark: bool, current_user: Optional[AuthUser]) -> Optional[str]:
+    """Create watermark text (user-specific if authenticated, generic if not)"""
+    if watermark and current_user:
         # Authenticated user: use username and timestamp
-        from datetime import datetime
-        watermark_text = f"{current_user.username} | {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
-    else:
+        return f"{current_user.username} | {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
+    elif watermark:
         # Testing mode: use a generic watermark with timestamp
-        from datetime import datetime
-        watermark_text = f"Video Platform | {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
+        return f"Video Platform | {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
+    return None
 
-    converter = FFmpegConverter(input_file, output_dir, request.segment_duration, watermark_text)
 
-    # Store converter for potential cancellation (thread-safe)
-    async with conversions_lock:
-        active_conversions[video_basename] = converter
+@app.get("/api/encoding-profiles")
+async def list_encoding_profiles():
+    """Server-defined encoding profiles a conversion can name, and the one used by default"""
+    return {"default": settings.DEFAULT_ENCODING_PROFILE, "profiles": ENCODING_PROFILES}
 
-    # Run conversion in background
-    asyncio.create_task(run_conversion(converter, db_video.id))
+
+@app.post("/api/convert")
+async def convert_video(
+    request: ConversionRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """Start video conversion to HLS format (user-specific if authenticated)"""
+    # Validate segment_duration
+    if request.segment_duration < 1 or request.segment_duration > 30:
+        raise HTTPException(
+            status_code=400,
+            detail="Segment duration must be between 1 and 30 seconds"
+        )
+
+    renditions = request.renditions
+    if renditions is None and request.abr:
+        renditions = [name.strip() for name in settings.ABR_LADDER.split(",") if name.strip()]
+    unknown = [name for name in renditions or [] if name not in RENDITION_PRESETS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown renditions: {', '.join(unknown)}. Allowed: {', '.join(RENDITION_PRESETS)}"
+        )
+
+    if request.chunked and renditions:
+        raise HTTPException(
+            status_code=400,
+            detail="Chunked encoding is only supported for single-rendition conversions"
+        )
+    validate_segment_format(request.segment_format)
+    encoding_profile = request.encoding_profile or settings.DEFAULT_ENCODING_PROFILE
+    encoding_overrides = request.encoding.model_dump(exclude_none=True) if request.encoding else None
+    validate_encoding(encoding_profile, encoding_overrides)
+
+    input_file = settings.INPUT_DIR / request.video_name
+
+    if not input_file.exists():
+        raise HTTPException(status_code=404, detail="Input video file not found")
+
+    db_video = await prepare_video_record(
+        db, request.video_name, input_file.stat().st_size, request.segment_duration, renditions, current_user
+    )
+    video_basename = db_video.name
+
+    # Without a watermark the video stream may be copied instead of re-encoded
+    watermark_text = make_watermark_text(request.watermark, current_user)
+
+    options = {}
+    if renditions:
+        options["renditions"] = renditions
+    if request.chunked:
+        options["chunked"] = True
+        options["chunk_workers"] = settings.CHUNK_WORKERS
+    if not request.stream_copy:
+        options["stream_copy"] = False
+    if request.segment_format != "ts":
+        options["segment_format"] = request.segment_format
+    options["encoding_profile"] = encoding_profile
+    if encoding_overrides:
+        options["encoding_overrides"] = encoding_overrides
+
+    # Queue the job; a scheduler worker starts it when a slot is free
+    job = await scheduler.enqueue(
+        db,
+        db_video,
+        input_file,
+        request.segment_duration,
+        watermark_text,
+        priority=request.priority,
+        options=options
+    )
 
     return {
-        "message": f"Conversion started for '{request.video_name}'",
+        "message": f"Conversion queued for '{request.video_name}'",
         "video_id": db_video.id,
-        "video_name": video_basename
+        "video_name": video_basename,
+        "job_id": job.id,
+        "status": job.status
     }
 
 
-async def run_conversion(converter: FFmpegConverter, video_id: int):
-    """Background task to run video conversion"""
-    success = await converter.convert()
+# Reference-counted cache of finished conversions
+conversion_cache = ConversionCache(settings.CONVERSION_CACHE_DIR)
+
+# Hot playlists and segments of /hls kept in memory
+hls_cache = HLSAssetCache(settings.HLS_CACHE_MAX_BYTES, settings.HLS_CACHE_MAX_ENTRY_BYTES)
+
+
+async def run_conversion(converter: FFmpegConverter, video_id: int) -> bool:
+    """Run a video conversion and record the result (called by scheduler workers)"""
+    cache_key = None
+    cached = None
+    # Watermarked outputs are never reused, so their input is not hashed either
+    if settings.CONVERSION_CACHE_ENABLED and converter.cacheable:
+        await converter.update_progress("initializing", 0, message="Checking conversion cache...")
+        cache_key = await conversion_cache.key_for(converter.input_file, converter.cache_params())
+        cached = await conversion_cache.acquire(cache_key)
+
+    if cached:
+        # Identical input and parameters were converted before: link the result in
+        await asyncio.to_thread(converter.clear_output)
+        await conversion_cache.restore(cache_key, converter.output_dir)
+        converter.renditions = cached.get("renditions") or []
+        converter.conversion_path = cached.get("conversion_path") or converter.conversion_path
+        await converter.update_progress(
+            "completed",
+            100,
+            message="Conversion restored from cache",
+            **cached
+        )
+        success = True
+    else:
+        success = await converter.convert()
 
+    await save_conversion_result(converter, video_id, success, cache_key, cached)
+    return success
+
+
+async def save_conversion_result(
+    converter: FFmpegConverter,
+    video_id: int,
+    success: bool,
+    cache_key: Optional[str] = None,
+    cached: Optional[dict] = None
+):
+    """Record a finished conversion on its video row and announce it"""
+    if converter.interrupted:
+        # Stopped by a shutdown; the row is reset and the job resumed on next start
+        return
     # Create new database session for background task
-    from database import AsyncSessionLocal
     async with AsyncSessionLocal() as db:
         async with db.begin():
             result = await db.execute(select(Video).where(Video.id == video_id))
             video = result.scalar_one_or_none()
 
             if video:
-                if success:
-                    # Read final progress file
-                    if converter.progress_file.exists():
-                        import json
-                        with open(converter.progress_file, "r") as f:
-                            progress_data = json.load(f)
+                if converter.media_info is not None:
+                    # Keep the probe so re-conversions and the media endpoint skip ffprobe
+                    video.media_info = json.dumps(converter.media_info)
+                    video.media_info_key = await asyncio.to_thread(probe_key, converter.input_file)
 
+                if success:
+                    # Final progress published by the converter
+                    progress_data = progress_registry.get(converter.output_dir.name)
+                    if progress_data:
                         video.status = "completed"
                         video.progress = 100
                         video.segments = progress_data.get("segments")
                         video.output_size = progress_data.get("output_size")
+                        video.output_bytes = progress_data.get("output_bytes")
+                        if video.output_bytes is None:
+                            # Cache entries stored before byte counters existed
+                            video.output_bytes, _ = await asyncio.to_thread(measure_output, converter.output_dir)
                         video.duration = progress_data.get("duration")
-                        video.playlist_path = f"output/{video.name}/playlist.m3u8"
+                        video.playlist_path = f"output/{video.name}/{converter.playlist_name}"
+                        video.renditions = ",".join(converter.renditions) or None
+                        video.conversion_path = None if converter.renditions else converter.conversion_path
+                        video.segment_format = converter.segment_format
+                        video.encoding_profile = converter.encoding_profile
+                        video.encoding_settings = json.dumps(converter.encoding)
+
+                        if not cached:
+                            metrics.output_bytes.inc(video.output_bytes or 0)
+                        if cache_key and not cached:
+                            try:
+                                await conversion_cache.store(cache_key, converter.output_dir, {
+                                    "segments": video.segments,
+                                    "output_size": video.output_size,
+                                    "output_bytes": video.output_bytes,
+                                    "duration": video.duration,
+                                    "renditions": converter.renditions,
+                                    "conversion_path": converter.conversion_path,
+                                })
+                            except Exception as e:
+                                # The conversion still succeeded, it just is not shared
+                                print(f"Could not cache conversion of '{video.name}': {e}")
+                                cache_key = None
+
+                        # Swap this video's cache reference for the new entry
+                        previous_key = video.cache_key
+                        video.cache_key = cache_key
+                        if previous_key:
+                            await conversion_cache.release(previous_key)
+                elif converter.cancelled:
+                    video.status = "cancelled"
                 else:
                     video.status = "error"
                     video.error_message = "Conversion failed"
 
+                if not success:
+                    # The old output was cleared before converting; count what is left of the new one
+                    video.output_bytes, _ = await asyncio.to_thread(measure_output, converter.output_dir)
+                    if video.cache_key:
+                        await conversion_cache.release(video.cache_key)
+                        video.cache_key = None
+
                 await db.commit()
 
-                # Remove from active conversions (thread-safe)
-                if video and video.name in active_conversions:
-                    async with conversions_lock:
-                        if video.name in active_conversions:
-                            del active_conversions[video.name]
+                if video.status == "completed" and settings.HLS_CACHE_PREWARM_SEGMENTS > 0:
+                    await hls_cache.prewarm(
+                        video.name, converter.output_dir, converter.playlist_name,
+                        converter.renditions, settings.HLS_CACHE_PREWARM_SEGMENTS
+                    )
 
-                # Broadcast completion via WebSocket
-                await manager.broadcast({
+                # Announce completion to the subscribers of the video (not every connection)
+                connections.publish(topics_of_video(video.name, video.user_id), f"complete:{video.name}", {
                     "type": "conversion_complete",
                     "video_id": video_id,
+                    "video_name": video.name,
                     "status": video.status
                 })
 
 
+# Scheduler owning all queued and running conversions
+scheduler = JobScheduler(run_conversion, settings.MAX_CONCURRENT_CONVERSIONS)
+
+
+# Bytes read from an ingest upload to decide whether it can be encoded while streaming
+INGEST_PROBE_BYTES = 65536
+
+
+async def limited_body(head: bytes, body: AsyncIterator[bytes], max_size: int) -> AsyncIterator[bytes]:
+    """Yield an already-read head followed by the rest of a request body, enforcing ``max_size``"""
+    received = len(head)
+    if head:
+        yield head
+    async for data in body:
+        received += len(data)
+        if received > max_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size: {max_size / (1024**3):.1f}GB"
+            )
+        yield data
+
+
+@app.post("/api/videos/ingest")
+async def ingest_video(
+    request: Request,
+    filename: str,
+    segment_duration: int = 6,
+    watermark: bool = True,
+    priority: int = 0,
+    segment_format: str = "ts",
+    encoding_profile: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """Upload and convert in one request; the raw request body is the video file
+
+    Streamable inputs (Matroska/WebM, FLV, MP4/MOV with the moov atom first) are
+    encoded while they arrive, so segments appear before the upload ends, when a
+    conversion slot is free. Other files, streams FFmpeg cannot decode from a pipe,
+    and uploads arriving while every slot is busy are saved and then queued like a
+    regular conversion.
+    """
+    filename = Path(filename).name
+    if Path(filename).suffix.lower() not in ALLOWED_VIDEO_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"
+        )
+    if segment_duration < 1 or segment_duration > 30:
+        raise HTTPException(
+            status_code=400,
+            detail="Segment duration must be between 1 and 30 seconds"
+        )
+    validate_segment_format(segment_format)
+    encoding_profile = encoding_profile or settings.DEFAULT_ENCODING_PROFILE
+    validate_encoding(encoding_profile)
+
+    content_length = request.headers.get("content-length")
+    expected_size = int(content_length) if content_length and content_length.isdigit() else None
+    if expected_size is not None and expected_size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE / (1024**3):.1f}GB"
+        )
+
+    # Peek at the start of the body to find out whether it can be decoded from a pipe
+    body = request.stream()
+    head = b""
+    async for data in body:
+        head += data
+        if len(head) >= INGEST_PROBE_BYTES:
+            break
+    chunks = limited_body(head, body, settings.MAX_UPLOAD_SIZE)
+
+    input_file = settings.INPUT_DIR / filename
+    partial_file = settings.UPLOAD_DIR / f"{secrets.token_hex(16)}.part"
+    db_video = await prepare_video_record(db, filename, expected_size, segment_duration, None, current_user)
+    watermark_text = make_watermark_text(watermark, current_user)
+    options = {"encoding_profile": encoding_profile}
+    if segment_format != "ts":
+        options["segment_format"] = segment_format
+
+    if is_streamable(filename, head):
+        converter = FFmpegConverter(
+            input_file,
+            settings.OUTPUT_DIR / db_video.name,
+            segment_duration,
+            watermark_text,
+            probe_timeout=settings.FFPROBE_TIMEOUT,
+            keyframe_probe_timeout=settings.FFPROBE_KEYFRAME_TIMEOUT,
+            segment_format=segment_format,
+            encoding_profile=encoding_profile
+        )
+
+        async def run_streaming() -> bool:
+            success = await converter.convert_stream(chunks, partial_file, expected_size)
+            await save_conversion_result(converter, db_video.id, success)
+            return success
+
+        job = await scheduler.run_attached(db, db_video, converter, run_streaming, options)
+
+        if job is None:
+            # Every conversion slot is busy: save the upload and queue it like any other
+            await save_stream(chunks, partial_file, input_file)
+        elif isinstance(converter.source_error, HTTPException):
+            raise converter.source_error
+        elif converter.source_error:
+            raise HTTPException(status_code=400, detail=f"Upload failed: {converter.source_error}")
+        elif job.status != "error" or not converter.input_complete:
+            return {
+                "message": f"'{filename}' uploaded and converted while streaming",
+                "video_id": db_video.id,
+                "video_name": db_video.name,
+                "job_id": job.id,
+                "status": job.status,
+                "mode": "streaming"
+            }
+        else:
+            # FFmpeg could not decode the stream from a pipe; the complete file was saved, convert it normally
+            await db.refresh(db_video)
+            db_video.status = "pending"
+            db_video.error_message = None
+    else:
+        await save_stream(chunks, partial_file, input_file)
+
+    job = await scheduler.enqueue(
+        db,
+        db_video,
+        input_file,
+        segment_duration,
+        watermark_text,
+        priority=priority,
+        options=options
+    )
+
+    return {
+        "message": f"'{filename}' uploaded, conversion queued",
+        "video_id": db_video.id,
+        "video_name": db_video.name,
+        "job_id": job.id,
+        "status": job.status,
+        "mode": "queued"
+    }
+
+
+@app.get("/api/jobs", response_model=List[JobResponse])
+async def list_jobs(
+    status_filter: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """List conversion jobs, optionally filtered by status (queued, running, completed, error, cancelled)"""
+    query = select(ConversionJob).order_by(ConversionJob.created_at.desc())
+    if current_user:
+        query = query.where(ConversionJob.user_id == current_user.id)
+    if status_filter:
+        query = query.where(ConversionJob.status == status_filter)
+
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """Get a conversion job by ID (with ownership check if authenticated)"""
+    job = await db.get(ConversionJob, job_id)
+
+    if not job or (current_user and job.user_id != current_user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+async def load_progress(video_name: str) -> Optional[dict]:
+    """Latest progress for a video: in-memory registry first, then the on-disk snapshot (e.g. after a restart)"""
+    progress_data = progress_registry.get(video_name)
+    if progress_data is None:
+        progress_file = settings.OUTPUT_DIR / video_name / ".progress.json"
+        progress_data = await asyncio.to_thread(read_snapshot, progress_file)
+    return progress_data
+
+
 @app.get("/api/progress/{video_name}", response_model=ProgressResponse)
 async def get_progress(video_name: str):
     """Get conversion progress for a video"""
-    progress_file = settings.OUTPUT_DIR / video_name / ".progress.json"
+    progress_data = await load_progress(video_name)
 
-    if not progress_file.exists():
+    if progress_data is None:
         raise HTTPException(
             status_code=404,
             detail="No conversion in progress for this video"
         )
 
-    try:
-        import json
-        with open(progress_file, "r") as f:
-            progress_data = json.load(f)
-        return progress_data
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Invalid progress file format")
+    return progress_data
 
 
 @app.post("/api/convert/cancel/{video_name}")
 async def cancel_conversion(
     video_name: str,
-    current_user: Optional[User] = Depends(get_optional_user)
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
 ):
-    """Cancel an active conversion (with ownership check if authenticated)"""
-    async with conversions_lock:
-        if video_name not in active_conversions:
-            raise HTTPException(status_code=404, detail="No active conversion found")
-
-        converter = active_conversions[video_name]
-        await converter.cancel()
-
-        del active_conversions[video_name]
+    """Cancel a queued or running conversion (with ownership check if authenticated)"""
+    if not await scheduler.cancel(video_name):
+        raise HTTPException(status_code=404, detail="No active conversion found")
 
     return {"message": f"Conversion cancelled for '{video_name}'"}
 
 
 # ==================== Server Status Endpoints ====================
 
+def format_uptime(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    if days:
+        return f"{days}d {hours}h {minutes}m"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m {secs}s"
+
+
 @app.get("/api/status", response_model=ServerStatus)
 async def get_server_status(
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_user)
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
 ):
     """Get server status and statistics (user-specific if authenticated)"""
+    # Counts and sizes come from the per-video counters in a single aggregate
+    query = select(
+        func.count(Video.id),
+        func.coalesce(func.sum(Video.output_bytes), 0),
+        func.coalesce(func.sum(Video.segments), 0)
+    )
     if current_user:
         # Authenticated: show only user's stats
-        result = await db.execute(
-            select(Video).where(Video.user_id == current_user.id)
-        )
-        videos_count = len(result.scalars().all())
+        query = query.where(Video.user_id == current_user.id)
 
-        # Calculate disk usage for user's videos only (memory efficient)
-        total_size = 0
-        user_videos = await db.execute(
-            select(Video).where(Video.user_id == current_user.id)
-        )
-        for video in user_videos.scalars().all():
-            video_dir = settings.OUTPUT_DIR / video.name
-            if video_dir.exists():
-                for f in video_dir.rglob("*"):
-                    if f.is_file():
-                        total_size += f.stat().st_size
-    else:
-        # Testing mode: show all stats
-        result = await db.execute(select(Video))
-        videos_count = len(result.scalars().all())
-
-        # Calculate total disk usage (memory efficient)
-        total_size = 0
-        if settings.OUTPUT_DIR.exists():
-            for f in settings.OUTPUT_DIR.rglob("*"):
-                if f.is_file():
-                    total_size += f.stat().st_size
-
-    disk_usage = FFmpegConverter._format_size(total_size)
+    result = await db.execute(query)
+    videos_count, total_size, segments_count = result.one()
 
     return {
         "status": "running",
         "videos_count": videos_count,
-        "disk_usage": disk_usage,
-        "uptime": "N/A"  # Can be implemented with process start time
+        "disk_usage": format_size(total_size),
+        "disk_usage_bytes": total_size,
+        "segments_count": segments_count,
+        "uptime": format_uptime(time.time() - metrics.started_at)
     }
 
 
 @app.delete("/api/cleanup")
 async def cleanup_all(
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_user)
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
 ):
     """Delete all videos (user-specific if authenticated, all if testing mode)"""
     if current_user:
@@ -521,65 +1168,247 @@ async def cleanup_all(
         result = await db.execute(
             select(Video).where(Video.user_id == current_user.id)
         )
-        user_videos = result.scalars().all()
+        user_videos = [(video.id, video.name, video.cache_key) for video in result.scalars().all()]
 
-        # Delete output directories for user's videos
-        for video in user_videos:
-            output_dir = settings.OUTPUT_DIR / video.name
-            if output_dir.exists():
-                shutil.rmtree(output_dir)
+        for _, video_name, _ in user_videos:
+            await scheduler.cancel(video_name, wait=True)
 
-        # Delete all video records for this user
-        await db.execute(delete(Video).where(Video.user_id == current_user.id))
+        # Delete the records (and their jobs) before touching any files
+        video_ids = [video_id for video_id, _, _ in user_videos]
+        await db.execute(delete(ConversionJob).where(ConversionJob.video_id.in_(video_ids)))
+        await db.execute(delete(Video).where(Video.id.in_(video_ids)))
         await db.commit()
 
+        for _, video_name, cache_key in user_videos:
+            await release_video_output(video_name, cache_key)
+
         return {"message": "All your videos and output files deleted"}
     else:
         # Testing mode: delete all videos
-        for item in settings.OUTPUT_DIR.iterdir():
-            if item.is_dir():
-                shutil.rmtree(item)
+        for video_name in scheduler.claimed_video_names():
+            await scheduler.cancel(video_name, wait=True)
 
-        # Delete all video records
+        # Delete all job and video records before touching any files; this also
+        # releases the write lock before the conversion cache opens its own session
+        await db.execute(delete(ConversionJob))
         await db.execute(delete(Video))
         await db.commit()
 
+        for item in await asyncio.to_thread(lambda: list(settings.OUTPUT_DIR.iterdir())):
+            # Dot-directories are internal (e.g. the trash itself)
+            if item.is_dir() and not item.name.startswith("."):
+                progress_registry.discard(item.name)
+                await trash.trash(item)
+        await conversion_cache.clear()
+        hls_cache.clear()
+
         return {"message": "All videos and output files deleted"}
 
 
+# ==================== HLS Delivery ====================
+
+
+@app.get("/hls/{video_name}/{file_path:path}")
+@app.head("/hls/{video_name}/{file_path:path}", operation_id="head_hls")
+async def serve_hls(
+    video_name: str,
+    file_path: str,
+    request: Request,
+    v: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[AuthUser] = Depends(get_optional_user)
+):
+    """Serve a playlist or segment of a video (with ownership check if authenticated)
+
+    Playlists of completed videos are rewritten to versioned segment URLs, which
+    are then cacheable as immutable; everything else must be revalidated.
+    """
+    query = select(Video.status).where(Video.name == video_name)
+    if current_user:
+        query = query.where(Video.user_id == current_user.id)
+    video_status = (await db.execute(query)).scalar_one_or_none()
+    if video_status is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    path = await asyncio.to_thread(resolve_output_file, settings.OUTPUT_DIR / video_name, file_path)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    stat_result = await asyncio.to_thread(path.stat)
+    media_type = MEDIA_TYPES[path.suffix.lower()]
+    completed = video_status == "completed"
+    # Shared caches must not hand one user's videos to another
+    visibility = "private" if current_user else "public"
+
+    if path.suffix.lower() == ".m3u8":
+        etag = playlist_etag(stat_result, completed)
+        headers = base_headers(stat_result, etag, f"{visibility}, max-age={settings.HLS_PLAYLIST_MAX_AGE}")
+        if is_not_modified(request.headers, etag, stat_result.st_mtime):
+            return Response(status_code=304, headers=headers)
+        body = hls_cache.get(video_name, path, etag)
+        if body is None:
+            etag, body = await asyncio.to_thread(load_playlist, path, stat_result, completed)
+            hls_cache.put(video_name, path, etag, body)
+            headers["etag"] = etag
+        return Response(content=b"" if request.method == "HEAD" else body, media_type=media_type, headers=headers)
+
+    etag = make_etag(stat_result)
+    cache_control = IMMUTABLE_CACHE_CONTROL if completed and v else REVALIDATE_CACHE_CONTROL
+    headers = base_headers(stat_result, etag, f"{visibility}, {cache_control}")
+    if is_not_modified(request.headers, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        byte_range = parse_range(request.headers, stat_result.st_size, etag, stat_result.st_mtime)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "content-range": f"bytes */{stat_result.st_size}"})
+
+    content = None
+    if request.method == "GET" and hls_cache.accepts(stat_result.st_size):
+        content = hls_cache.get(video_name, path, etag)
+        if content is None:
+            content = await asyncio.to_thread(path.read_bytes)
+            if len(content) == stat_result.st_size:
+                hls_cache.put(video_name, path, etag, content)
+            else:
+                # Changed between stat and read; stream it from disk instead
+                content = None
+
+    return FileRangeResponse(path, stat_result, headers, media_type, byte_range, content)
+
+
 # ==================== WebSocket Endpoint ====================
 
+async def can_watch_video(video_name: str, user_id: Optional[int]) -> bool:
+    """Whether a WebSocket client may follow a video (same ownership rule as the video endpoints)"""
+    if not settings.ENABLE_AUTH:
+        return True
+    if user_id is None:
+        return False
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Video.id).where(Video.name == video_name).where(Video.user_id == user_id)
+        )
+        return result.first() is not None
+
+
 @app.websocket("/ws/progress")
 async def websocket_progress(websocket: WebSocket):
-    """WebSocket endpoint for real-time progress updates"""
-    await manager.connect(websocket)
+    """WebSocket endpoint for real-time progress updates
+
+    Send ``subscribe:<topic>`` / ``unsubscribe:<topic>`` where topic is
+    ``video:<name>``, ``user`` (the user of the ``?token=`` query parameter),
+    ``user:<id>`` or ``all``. A bare ``subscribe:<name>`` subscribes to one video.
+    Every progress update of a subscribed topic is pushed as it happens.
+
+    With authentication enabled, videos must belong to the token's user and
+    ``all`` means all of that user's videos.
+    """
+    user_id = None
+    token = websocket.query_params.get("token")
+    if token:
+        async with AsyncSessionLocal() as db:
+            user = await get_user_from_token(token, db)
+        user_id = user.id if user else None
+
+    connection = await connections.connect(websocket, user_id)
 
     try:
         while True:
-            # Keep connection alive and listen for client messages
             data = await websocket.receive_text()
 
-            # Client can request specific video progress
-            if data.startswith("subscribe:"):
-                video_name = data.split(":")[1]
-                progress_file = settings.OUTPUT_DIR / video_name / ".progress.json"
+            action, _, target = data.partition(":")
+            if action not in ("subscribe", "unsubscribe") or not target:
+                continue
 
-                if progress_file.exists():
-                    import json
-                    with open(progress_file, "r") as f:
-                        progress_data = json.load(f)
-                    await websocket.send_json(progress_data)
+            if target == "all":
+                if not settings.ENABLE_AUTH:
+                    topic = ALL_TOPIC
+                elif user_id is None:
+                    connection.offer("error", {"type": "error", "message": "Authentication required for all topic"})
+                    continue
+                else:
+                    topic = user_topic(user_id)
+            elif target == "user":
+                if user_id is None:
+                    connection.offer("error", {"type": "error", "message": "Authentication required for user topic"})
+                    continue
+                topic = user_topic(user_id)
+            elif target.startswith("user:"):
+                requested = target[len("user:"):]
+                if not requested.isdigit() or (settings.ENABLE_AUTH and int(requested) != user_id):
+                    connection.offer("error", {"type": "error", "message": "Not allowed to subscribe to this user"})
+                    continue
+                topic = user_topic(int(requested))
+            else:
+                video_name = target[len("video:"):] if target.startswith("video:") else target
+                if action == "subscribe" and not await can_watch_video(video_name, user_id):
+                    connection.offer("error", {"type": "error", "message": "Video not found"})
+                    continue
+                topic = video_topic(video_name)
+
+            if action == "unsubscribe":
+                connections.unsubscribe(connection, topic)
+                continue
+
+            connections.subscribe(connection, topic)
+
+            # Send the current state right away, later updates are pushed
+            if topic.startswith("video:"):
+                video_name = topic[len("video:"):]
+                progress_data = await load_progress(video_name)
+                if progress_data is not None:
+                    connection.offer(video_name, {"type": "progress", "video_name": video_name, **progress_data})
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        connections.disconnect(connection)
 
 
 # ==================== Health Check ====================
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics (text exposition format)"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+
+    running = list(scheduler.running.items())
+    gauges = [
+        ("conversion_queue_depth", "Conversion jobs waiting for a worker", [({}, await scheduler.queued_count())]),
+        ("conversion_jobs_running", "Conversion jobs currently running", [({}, len(running))]),
+        ("conversion_job_fps", "Encoded frames per second of each running conversion", [
+            ({"video": name}, converter.stats["fps"])
+            for name, converter in running if converter.stats and converter.stats.get("fps") is not None
+        ]),
+        ("conversion_job_realtime_factor", "Encode speed (media seconds per second) of each running conversion", [
+            ({"video": name}, converter.stats["speed"])
+            for name, converter in running if converter.stats and converter.stats.get("speed") is not None
+        ]),
+        ("websocket_connections", "Open WebSocket progress connections", [({}, len(connections.connections))]),
+        ("auth_cache_entries", "Tokens currently held in the user cache", [({}, user_cache.stats()["size"])]),
+    ]
+    counters = [
+        ("websocket_dropped_messages_total", "Progress messages dropped from full WebSocket send queues",
+         connections.dropped_messages),
+        ("auth_cache_hits_total", "Authenticated requests served from the user cache", user_cache.hits),
+        ("auth_cache_misses_total", "Authenticated requests that had to decode the token and query the user",
+         user_cache.misses),
+    ]
+    return Response(metrics.render(gauges, counters), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {
+        "status": "healthy",
+        "timestamp": datetime.utcnow().isoformat(),
+        "auth_cache": user_cache.stats(),
+        "hls_cache": hls_cache.stats(),
+        "trash": trash.stats(),
+        "cpu": scheduler.cpu.stats()
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,204 @@
+"""
+Media probing
+Collects stream and codec information with one ffprobe call, and optionally a keyframe index with a second
+"""
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+# Containers FFmpeg can demux front to back from a pipe
+STREAMABLE_EXTENSIONS = {".mkv", ".webm", ".flv"}
+# ISO base media files are only streamable when the moov atom comes first
+ISO_BMFF_EXTENSIONS = {".mp4", ".mov", ".m4v"}
+
+
+class ProbeError(Exception):
+    """ffprobe failed, timed out or returned unusable output"""
+
+
+def probe_key(input_file: Path) -> str:
+    """Identify a version of a file by size and modification time"""
+    stat = input_file.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def is_streamable(filename: str, head: bytes) -> bool:
+    """Whether a file can be decoded without seeking, judged by its name and first bytes
+
+    MP4/MOV keep their sample index in the moov atom; when it is written after the
+    media data (no "faststart"), FFmpeg has to seek to the end before decoding.
+    """
+    ext = Path(filename).suffix.lower()
+    if ext in STREAMABLE_EXTENSIONS:
+        return True
+    if ext not in ISO_BMFF_EXTENSIONS:
+        return False
+
+    # Walk the top-level boxes until moov or mdat shows up
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset:offset + 4], "big")
+        box_type = head[offset + 4:offset + 8]
+        if box_type == b"moov":
+            return True
+        if box_type == b"mdat":
+            return False
+        if size == 1:
+            if offset + 16 > len(head):
+                return False
+            size = int.from_bytes(head[offset + 8:offset + 16], "big")
+        if size < 8:
+            return False
+        offset += size
+    return False
+
+
+def load_cached_probe(media_info_json: Optional[str], media_info_key: Optional[str], input_file: Path) -> Optional[Dict[str, Any]]:
+    """Return a stored probe result if it was taken from the current version of ``input_file``"""
+    if not media_info_json or not input_file.exists() or media_info_key != probe_key(input_file):
+        return None
+    try:
+        return json.loads(media_info_json)
+    except ValueError:
+        return None
+
+
+def _parse_rate(rate: Optional[str]) -> Optional[float]:
+    """Convert an ffprobe rational like '30000/1001' to a float"""
+    if not rate:
+        return None
+    num, _, den = rate.partition("/")
+    try:
+        value = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return round(value, 3) if value else None
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _summarize(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce raw ffprobe JSON to the fields the platform uses"""
+    fmt = raw.get("format", {})
+    info: Dict[str, Any] = {
+        "duration": float(fmt.get("duration") or 0),
+        "bit_rate": _int_or_none(fmt.get("bit_rate")),
+        "format_name": fmt.get("format_name"),
+        "size": _int_or_none(fmt.get("size")),
+        "video": None,
+        "audio": None,
+        "streams": [],
+        "keyframes": None,
+    }
+
+    for stream in raw.get("streams", []):
+        codec_type = stream.get("codec_type")
+        info["streams"].append({
+            "index": stream.get("index"),
+            "codec_type": codec_type,
+            "codec_name": stream.get("codec_name"),
+        })
+        # Cover art in audio files shows up as a one-frame video stream
+        if stream.get("disposition", {}).get("attached_pic"):
+            continue
+
+        if codec_type == "video" and info["video"] is None:
+            info["video"] = {
+                "index": stream.get("index"),
+                "codec": stream.get("codec_name"),
+                "profile": stream.get("profile"),
+                "pix_fmt": stream.get("pix_fmt"),
+                "width": _int_or_none(stream.get("width")) or 0,
+                "height": _int_or_none(stream.get("height")) or 0,
+                "frame_rate": _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate")),
+                "bit_rate": _int_or_none(stream.get("bit_rate")),
+            }
+        elif codec_type == "audio" and info["audio"] is None:
+            info["audio"] = {
+                "codec": stream.get("codec_name"),
+                "profile": stream.get("profile"),
+                "sample_rate": _int_or_none(stream.get("sample_rate")),
+                "channels": _int_or_none(stream.get("channels")),
+                "bit_rate": _int_or_none(stream.get("bit_rate")),
+            }
+
+    return info
+
+
+def _parse_keyframes(output: str) -> List[float]:
+    """Keyframe times from ``pts_time,flags`` CSV lines of ffprobe's packet list"""
+    times: List[float] = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" not in flags:
+            continue
+        try:
+            times.append(float(pts_time))
+        except ValueError:
+            continue
+    return sorted(times)
+
+
+async def _run_ffprobe(args: List[str], timeout: float, what: str) -> str:
+    """Run ffprobe with ``args`` and return its output, killing it after ``timeout`` seconds"""
+    proc = await asyncio.create_subprocess_exec(
+        "ffprobe", "-v", "error", *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise ProbeError(f"{what} timed out after {timeout:.0f}s")
+
+    if proc.returncode != 0:
+        raise ProbeError(stderr.decode(errors="replace").strip() or f"{what} failed")
+    return stdout.decode(errors="replace")
+
+
+async def probe_media(
+    input_file: Path,
+    timeout: float = 60,
+    keyframes: bool = False,
+    keyframe_timeout: float = 300,
+) -> Dict[str, Any]:
+    """Run ffprobe and return a summary of the file
+
+    With ``keyframes`` a second pass lists the packets of the video stream only
+    (demux, no decoding) to build its keyframe index. That pass reads the whole
+    file, so it gets its own ``keyframe_timeout`` instead of ``timeout``.
+    """
+    output = await _run_ffprobe(
+        ["-show_format", "-show_streams", "-of", "json", str(input_file)], timeout, "ffprobe"
+    )
+    try:
+        raw = json.loads(output or "{}")
+    except ValueError:
+        raise ProbeError("ffprobe returned invalid JSON")
+    info = _summarize(raw)
+
+    if keyframes:
+        info["keyframes"] = []
+        if info["video"] and info["video"]["index"] is not None:
+            output = await _run_ffprobe(
+                [
+                    "-select_streams", str(info["video"]["index"]),
+                    "-show_entries", "packet=pts_time,flags",
+                    "-of", "csv=print_section=0",
+                    str(input_file),
+                ],
+                keyframe_timeout,
+                "ffprobe keyframe scan",
+            )
+            info["keyframes"] = _parse_keyframes(output)
+
+    return info
@@ -0,0 +1,233 @@
+"""
+Prometheus metrics
+Counters and histograms rendered in the Prometheus text format at /metrics. Every
+labelled series is created up front, so recording one on the hot path is a dict
+lookup and a few increments, with no label sets built per request
+"""
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.routing import Route
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Upper bounds (seconds) of the histogram buckets
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+CONVERSION_BUCKETS = (5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0)
+# Realtime factor (ffmpeg speed) and frames per second of finished conversions
+SPEED_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+FPS_BUCKETS = (5.0, 15.0, 30.0, 60.0, 120.0, 240.0, 480.0, 960.0)
+
+CONVERSION_OUTCOMES = ("completed", "error", "cancelled", "interrupted")
+DB_OPERATIONS = ("select", "insert", "update", "delete", "other")
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+# Route label of requests no route matched (404s, probes of random paths)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # One slot per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RouteSeries:
+    """Latency histogram and per-status-class counters of one route and method"""
+    __slots__ = ("latency", "responses")
+
+    def __init__(self):
+        self.latency = Histogram(REQUEST_BUCKETS)
+        self.responses = [Counter() for _ in STATUS_CLASSES]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_histogram(lines: List[str], name: str, labels: Dict[str, Any], histogram: Histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(float(bound))})} {cumulative}")
+    lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+
+def _header(lines: List[str], name: str, kind: str, help_text: str):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+class Metrics:
+    """Every metric the backend records, plus gauges sampled when /metrics is scraped"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        # (endpoint, method) -> series, filled in by register_routes
+        self._routes: Dict[Tuple[Any, str], RouteSeries] = {}
+        self._route_labels: List[Tuple[str, str, RouteSeries]] = []
+        self._unmatched = RouteSeries()
+        self.db_queries = {operation: Histogram(DB_QUERY_BUCKETS) for operation in DB_OPERATIONS}
+        self.conversions = {outcome: Histogram(CONVERSION_BUCKETS) for outcome in CONVERSION_OUTCOMES}
+        self.conversion_speed = Histogram(SPEED_BUCKETS)
+        self.conversion_fps = Histogram(FPS_BUCKETS)
+        self.output_bytes = Counter()
+
+    def register_routes(self, routes: Iterable[Any]):
+        """Create the series of every HTTP route (call once all routes are added)"""
+        for route in routes:
+            if not isinstance(route, Route):
+                continue
+            for method in sorted(route.methods or ()):
+                if (route.endpoint, method) in self._routes:
+                    continue
+                series = RouteSeries()
+                self._routes[(route.endpoint, method)] = series
+                self._route_labels.append((route.path, method, series))
+
+    def observe_request(self, endpoint: Any, method: str, status_code: int, seconds: float):
+        series = self._routes.get((endpoint, method), self._unmatched)
+        series.latency.observe(seconds)
+        series.responses[min(max(status_code // 100, 1), 5) - 1].inc()
+
+    def observe_conversion(self, outcome: str, seconds: float, stats: Optional[Dict[str, Any]]):
+        histogram = self.conversions.get(outcome)
+        if histogram is not None:
+            histogram.observe(seconds)
+        if outcome == "completed" and stats:
+            if stats.get("speed") is not None:
+                self.conversion_speed.observe(stats["speed"])
+            if stats.get("fps") is not None:
+                self.conversion_fps.observe(stats["fps"])
+
+    def instrument_engine(self, sync_engine):
+        """Time every statement executed through a SQLAlchemy engine"""
+        from sqlalchemy import event
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info["query_started"].pop()
+            operation = statement.lstrip()[:6].lower()
+            histogram = self.db_queries.get(operation) or self.db_queries["other"]
+            histogram.observe(time.perf_counter() - started)
+
+    def render(self, gauges: Iterable[Tuple[str, str, List[Tuple[Dict[str, Any], float]]]] = (),
+               counters: Iterable[Tuple[str, str, float]] = ()) -> str:
+        """Prometheus text exposition of everything recorded plus ``gauges``/``counters`` sampled by the caller
+
+        ``gauges`` are (name, help, [(labels, value), ...]); ``counters`` are
+        (name, help, value) totals kept elsewhere (e.g. by the WebSocket registry).
+        """
+        lines: List[str] = []
+
+        _header(lines, "http_request_duration_seconds", "histogram", "HTTP request latency by route and method")
+        for path, method, series in self._route_labels:
+            _render_histogram(lines, "http_request_duration_seconds", {"route": path, "method": method}, series.latency)
+        _render_histogram(lines, "http_request_duration_seconds", {"route": UNMATCHED_ROUTE, "method": ""}, self._unmatched.latency)
+
+        _header(lines, "http_responses_total", "counter", "HTTP responses by route, method and status class")
+        for path, method, series in [*self._route_labels, (UNMATCHED_ROUTE, "", self._unmatched)]:
+            for status_class, counter in zip(STATUS_CLASSES, series.responses):
+                if counter.value:
+                    lines.append(f"http_responses_total{_labels({'route': path, 'method': method, 'status': status_class})} {counter.value}")
+
+        _header(lines, "db_query_duration_seconds", "histogram", "Database statement latency by operation")
+        for operation, histogram in self.db_queries.items():
+            _render_histogram(lines, "db_query_duration_seconds", {"operation": operation}, histogram)
+
+        _header(lines, "conversion_duration_seconds", "histogram", "Wall time of conversion jobs by outcome")
+        for outcome, histogram in self.conversions.items():
+            _render_histogram(lines, "conversion_duration_seconds", {"outcome": outcome}, histogram)
+
+        _header(lines, "conversion_realtime_factor", "histogram", "Average encode speed (media seconds per second) of completed conversions")
+        _render_histogram(lines, "conversion_realtime_factor", {}, self.conversion_speed)
+        _header(lines, "conversion_fps", "histogram", "Average encoded frames per second of completed conversions")
+        _render_histogram(lines, "conversion_fps", {}, self.conversion_fps)
+
+        _header(lines, "conversion_output_bytes_total", "counter", "Bytes of HLS output produced by conversions")
+        lines.append(f"conversion_output_bytes_total {self.output_bytes.value}")
+
+        for name, help_text, value in counters:
+            _header(lines, name, "counter", help_text)
+            lines.append(f"{name} {_number(value)}")
+
+        _header(lines, "process_start_time_seconds", "gauge", "Start time of the process since the Unix epoch")
+        lines.append(f"process_start_time_seconds {_number(self.started_at)}")
+        for name, help_text, samples in gauges:
+            _header(lines, name, "gauge", help_text)
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request into its route's pre-created series
+
+    Runs inside the router's scope updates, so once the app returns the matched
+    route's endpoint is in ``scope["endpoint"]``.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: "Metrics"):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.observe_request(scope.get("endpoint"), scope["method"], status_code, time.perf_counter() - started)
+
+
+# Shared by the app, the database engine and the job scheduler
+metrics = Metrics()
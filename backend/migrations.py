@@ -0,0 +1,148 @@
+"""
+Database schema migrations
+Versioned schema changes applied at startup, so existing databases gain new
+columns and indexes without being dropped
+
+Each migration runs once per database, in order, and is written so that it is
+also safe on a database whose tables were created from the current models.
+Add new schema changes as a new entry at the end of MIGRATIONS.
+
+Usage: python migrations.py          # apply pending migrations
+       python migrations.py --list   # show applied and pending migrations
+"""
+import asyncio
+import sys
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import func
+
+import models  # noqa: F401 (registers every table on Base.metadata)
+from database import Base, engine
+
+# Bookkeeping table, kept out of Base.metadata so create_all never touches it
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def add_column(conn: Connection, table_name: str, column_name: str):
+    """ALTER TABLE ... ADD COLUMN for a model column, unless it already exists"""
+    existing = {column["name"] for column in inspect(conn).get_columns(table_name)}
+    if column_name in existing:
+        return
+    column = Base.metadata.tables[table_name].c[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+
+
+def widen_column(conn: Connection, table_name: str, column_name: str):
+    """ALTER COLUMN ... TYPE to a model column's current type
+
+    SQLite is skipped: its INTEGER columns already hold 64-bit values and it has no ALTER COLUMN.
+    """
+    if conn.dialect.name == "sqlite":
+        return
+    column = Base.metadata.tables[table_name].c[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} TYPE {column_type}"))
+
+
+def create_index(conn: Connection, table_name: str, index_name: str):
+    """Create an index declared on a model, unless it already exists"""
+    index = next(i for i in Base.metadata.tables[table_name].indexes if i.name == index_name)
+    index.create(conn, checkfirst=True)
+
+
+def _initial_schema(conn: Connection):
+    # Creates missing tables only; existing tables are left as they are
+    Base.metadata.create_all(conn)
+
+
+def _video_processing_columns(conn: Connection):
+    for column_name in ("renditions", "conversion_path", "cache_key", "media_info", "media_info_key", "output_bytes"):
+        add_column(conn, "videos", column_name)
+    create_index(conn, "videos", "ix_videos_cache_key")
+    for column_name in ("fps", "speed"):
+        add_column(conn, "conversion_jobs", column_name)
+
+
+def _video_listing_indexes(conn: Connection):
+    create_index(conn, "videos", "ix_videos_user_created")
+    create_index(conn, "videos", "ix_videos_user_status")
+
+
+def _segment_format_column(conn: Connection):
+    add_column(conn, "videos", "segment_format")
+
+
+def _job_attempts_column(conn: Connection):
+    add_column(conn, "conversion_jobs", "attempts")
+
+
+def _encoding_profile_columns(conn: Connection):
+    for column_name in ("encoding_profile", "encoding_settings"):
+        add_column(conn, "videos", column_name)
+    add_column(conn, "conversion_jobs", "encoding_profile")
+
+
+def _byte_count_bigint_columns(conn: Connection):
+    # int4 overflows at 2 GiB; uploads may be up to MAX_UPLOAD_SIZE (5GB) and outputs larger
+    for column_name in ("file_size", "output_bytes"):
+        widen_column(conn, "videos", column_name)
+    widen_column(conn, "upload_sessions", "total_size")
+
+
+# (version, description, migration)
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "initial schema", _initial_schema),
+    (2, "conversion options, cache, probe and disk usage columns", _video_processing_columns),
+    (3, "video listing indexes", _video_listing_indexes),
+    (4, "video segment format", _segment_format_column),
+    (5, "conversion job attempts", _job_attempts_column),
+    (6, "encoding profile columns", _encoding_profile_columns),
+    (7, "64-bit byte count columns", _byte_count_bigint_columns),
+]
+
+
+def _applied_versions(conn: Connection) -> set:
+    schema_migrations.create(conn, checkfirst=True)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def _migrate(conn: Connection) -> List[int]:
+    applied = _applied_versions(conn)
+    ran = []
+    for version, description, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        migration(conn)
+        conn.execute(schema_migrations.insert().values(version=version, description=description))
+        ran.append(version)
+    return ran
+
+
+async def run_migrations() -> List[int]:
+    """Apply pending migrations in one transaction; returns the versions applied"""
+    async with engine.begin() as conn:
+        return await conn.run_sync(_migrate)
+
+
+async def _list_migrations():
+    async with engine.begin() as conn:
+        applied = await conn.run_sync(_applied_versions)
+    for version, description, _ in MIGRATIONS:
+        print(f"{'applied' if version in applied else 'pending'}  {version:3d}  {description}")
+
+
+if __name__ == "__main__":
+    if "--list" in sys.argv:
+        asyncio.run(_list_migrations())
+    else:
+        applied = asyncio.run(run_migrations())
+        print(f"✓ Applied {len(applied)} migration(s)" if applied else "✓ Database is up to date")
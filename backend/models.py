@@ -1,7 +1,7 @@
 """
 Database models for the video platform
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Index, Text
 from sqlalchemy.sql import func
 from database import Base
 
@@ -25,15 +25,79 @@ class Video(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
     original_filename = Column(String, nullable=False)
-    file_size = Column(Integer)  # in bytes
+    file_size = Column(BigInteger)  # in bytes
     duration = Column(Float)  # in seconds
     segments = Column(Integer)  # number of HLS segments
     segment_duration = Column(Integer, default=6)  # segment duration in seconds
     output_size = Column(String)  # human-readable size (e.g., "125M")
+    output_bytes = Column(BigInteger, default=0)  # bytes under the output directory, summed for disk usage
     status = Column(String, default="pending")  # pending, converting, completed, error
     progress = Column(Integer, default=0)  # 0-100
     error_message = Column(String, nullable=True)
-    playlist_path = Column(String)  # path to .m3u8 file
+    playlist_path = Column(String)  # path to .m3u8 file (master.m3u8 for multi-rendition output)
+    renditions = Column(String, nullable=True)  # comma-separated ABR ladder, e.g. "1080p,720p"
+    conversion_path = Column(String, nullable=True)  # copy, copy_video, copy_audio, transcode, audio_only
+    segment_format = Column(String, default="ts")  # ts, fmp4 (init.mp4 + .m4s) or single (byte ranges of media.mp4)
+    encoding_profile = Column(String, nullable=True)  # name from encoding_profiles.ENCODING_PROFILES
+    encoding_settings = Column(Text, nullable=True)  # JSON profile settings with the request's overrides applied
+    cache_key = Column(String, nullable=True, index=True)  # conversion cache entry shared by this output
+    media_info = Column(Text, nullable=True)  # JSON ffprobe summary of the input (see media_probe.py)
+    media_info_key = Column(String, nullable=True)  # "size:mtime_ns" of the input when it was probed
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    __table_args__ = (
+        # Per-user listing in created_at order (keyset pagination) and status filters
+        Index("ix_videos_user_created", "user_id", "created_at", "id"),
+        Index("ix_videos_user_status", "user_id", "status"),
+    )
+
+
+class CacheEntry(Base):
+    """Cached conversion output, shared by every video with the same content and parameters"""
+    __tablename__ = "conversion_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True, nullable=False)  # sha256 of input content + parameters
+    ref_count = Column(Integer, default=0)  # videos currently using this entry
+    metadata_json = Column(Text, nullable=True)  # segments, duration, output_size, output_bytes, renditions, ...
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ConversionJob(Base):
+    """Queued conversion job, picked up by the scheduler worker pool"""
+    __tablename__ = "conversion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    video_id = Column(Integer, ForeignKey("videos.id"), nullable=False, index=True)
+    video_name = Column(String, nullable=False, index=True)
+    input_file = Column(String, nullable=False)
+    segment_duration = Column(Integer, default=6)
+    watermark_text = Column(String, nullable=True)
+    options = Column(Text, nullable=True)  # JSON of extra FFmpegConverter keyword arguments
+    priority = Column(Integer, default=0)  # higher runs first
+    status = Column(String, default="queued", index=True)  # queued, running, completed, error, cancelled
+    error_message = Column(String, nullable=True)
+    fps = Column(Float, nullable=True)  # average encoded frames per second reported by ffmpeg
+    speed = Column(Float, nullable=True)  # average realtime factor reported by ffmpeg
+    encoding_profile = Column(String, nullable=True)  # profile encoded with, to compare throughput across profiles
+    attempts = Column(Integer, default=0)  # times claimed by a worker; > 1 means resumed after an interruption
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class UploadSession(Base):
+    """Resumable upload in progress, written chunk by chunk into a preallocated file"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True)  # random token, also the partial file name
+    filename = Column(String, nullable=False)  # target name in INPUT_DIR
+    total_size = Column(BigInteger, nullable=False)  # in bytes
+    checksum = Column(String, nullable=True)  # expected sha256 hex digest, if given up front
+    received_ranges = Column(Text, default="[]")  # JSON list of merged [start, end) byte ranges
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
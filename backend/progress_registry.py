@@ -0,0 +1,116 @@
+"""
+In-process conversion progress registry
+Converters publish progress here and API endpoints read it from memory; the
+.progress.json file on disk is only a debounced snapshot
+"""
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Statuses after which no further updates are expected, written to disk immediately
+FINAL_STATUSES = ("completed", "error", "cancelled")
+
+# Called with (video name, owner user id, progress data) on every publish
+ProgressListener = Callable[[str, Optional[int], Dict[str, Any]], None]
+
+
+def write_snapshot(progress_file: Path, data: Dict[str, Any]):
+    """Atomically replace the progress file so readers never see a partial write"""
+    progress_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = progress_file.with_name(f"{progress_file.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, progress_file)
+
+
+def read_snapshot(progress_file: Path) -> Optional[Dict[str, Any]]:
+    """Read a progress file written by this or an earlier process"""
+    try:
+        with open(progress_file, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class ProgressRegistry:
+    """Latest progress per video, with coalesced writes of the on-disk snapshot
+
+    ``publish`` only touches memory. Each video gets at most one file write per
+    ``flush_interval`` seconds, always of the newest state, done off the event loop.
+    """
+
+    def __init__(self, flush_interval: float = 0.5):
+        self.flush_interval = flush_interval
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._files: Dict[str, Path] = {}
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._owners: Dict[str, Optional[int]] = {}
+        self._listeners: List[ProgressListener] = []
+
+    def add_listener(self, listener: ProgressListener):
+        """Receive every published update (listeners must not block)"""
+        self._listeners.append(listener)
+
+    def set_owner(self, name: str, user_id: Optional[int]):
+        """Remember which user a video belongs to so listeners can route by user"""
+        self._owners[name] = user_id
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Latest progress published for a video in this process"""
+        return self._snapshots.get(name)
+
+    def publish(self, name: str, progress_file: Path, data: Dict[str, Any]):
+        """Record new progress and schedule a debounced snapshot write"""
+        self._snapshots[name] = data
+        self._files[name] = progress_file
+        if name not in self._pending:
+            self._pending[name] = asyncio.create_task(self._flush_later(name))
+
+        owner_id = self._owners.get(name)
+        for listener in self._listeners:
+            listener(name, owner_id, data)
+
+    async def flush(self, name: str):
+        """Write the newest snapshot for a video to disk now"""
+        progress_file = self._files.get(name)
+        if progress_file is None:
+            return
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            data = self._snapshots.get(name)
+            if data is not None:
+                await asyncio.to_thread(write_snapshot, progress_file, data)
+
+    async def flush_all(self):
+        """Write every pending snapshot (used at shutdown)"""
+        for task in list(self._pending.values()):
+            task.cancel()
+        self._pending.clear()
+        for name in list(self._files):
+            await self.flush(name)
+
+    def discard(self, name: str):
+        """Forget a video, e.g. after it was deleted"""
+        task = self._pending.pop(name, None)
+        if task:
+            task.cancel()
+        self._snapshots.pop(name, None)
+        self._files.pop(name, None)
+        self._locks.pop(name, None)
+        self._owners.pop(name, None)
+
+    async def _flush_later(self, name: str):
+        try:
+            await asyncio.sleep(self.flush_interval)
+        finally:
+            if self._pending.get(name) is asyncio.current_task():
+                del self._pending[name]
+        await self.flush(name)
+
+
+# Shared by the converter and the API
+progress_registry = ProgressRegistry()
@@ -2,7 +2,7 @@
 Pydantic schemas for request/response validation
 """
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -50,10 +50,16 @@ class VideoResponse(BaseModel):
     segments: Optional[int]
     segment_duration: int
     output_size: Optional[str]
+    output_bytes: Optional[int] = None
     status: str
     progress: int
     error_message: Optional[str]
     playlist_path: Optional[str]
+    renditions: Optional[str] = None
+    conversion_path: Optional[str] = None
+    segment_format: Optional[str] = None
+    encoding_profile: Optional[str] = None
+    encoding_settings: Optional[str] = None  # JSON settings the video was encoded with
     created_at: datetime
     updated_at: Optional[datetime]
 
@@ -61,9 +67,80 @@ class VideoResponse(BaseModel):
         from_attributes = True
 
 
+class MediaInfoResponse(BaseModel):
+    duration: float
+    bit_rate: Optional[int] = None
+    format_name: Optional[str] = None
+    size: Optional[int] = None
+    video: Optional[dict] = None
+    audio: Optional[dict] = None
+    streams: List[dict] = []
+    keyframe_count: Optional[int] = None
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int  # total file size in bytes
+    checksum: Optional[str] = None  # sha256 hex digest, verified on completion
+
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    received_bytes: int
+    received_ranges: List[List[int]]  # merged [start, end) byte ranges already stored
+    chunk_size: int  # suggested PUT size
+    complete: bool  # every byte has been received
+    expires_at: datetime
+
+
+class UploadCompleteRequest(BaseModel):
+    checksum: Optional[str] = None  # sha256 hex digest, overrides the one given at creation
+
+
+class EncodingOverrides(BaseModel):
+    """Per-conversion changes to an encoding profile (ranges checked by encoding_profiles)"""
+    preset: Optional[str] = None
+    crf: Optional[int] = None
+    gop: Optional[float] = None  # seconds
+    tune: Optional[str] = None
+    audio_bitrate: Optional[str] = None  # e.g. "128k"
+    threads: Optional[int] = None
+
+
 class ConversionRequest(BaseModel):
     video_name: str
     segment_duration: int = 6
+    priority: int = 0  # higher-priority jobs are started first
+    abr: bool = False  # encode the configured adaptive bitrate ladder
+    renditions: Optional[List[str]] = None  # explicit ladder, e.g. ["720p", "360p"]
+    chunked: bool = False  # encode time ranges in parallel (single rendition only)
+    watermark: bool = True  # burn in the user/timestamp watermark (forces a video re-encode)
+    stream_copy: bool = True  # remux streams that are already HLS-compatible instead of re-encoding
+    segment_format: str = "ts"  # ts, fmp4 (CMAF) or single (byte ranges of one fMP4 file)
+    encoding_profile: Optional[str] = None  # server-defined profile, defaults to DEFAULT_ENCODING_PROFILE
+    encoding: Optional[EncodingOverrides] = None
+
+
+class JobResponse(BaseModel):
+    id: int
+    video_id: int
+    video_name: str
+    segment_duration: int
+    priority: int
+    status: str
+    error_message: Optional[str]
+    fps: Optional[float] = None
+    speed: Optional[float] = None
+    attempts: Optional[int] = None
+    encoding_profile: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
 
 
 class ProgressResponse(BaseModel):
@@ -71,13 +148,19 @@ class ProgressResponse(BaseModel):
     progress: int
     message: Optional[str] = None
     duration: Optional[int] = None
-    current_time: Optional[int] = None
+    current_time: Optional[float] = None
     time_string: Optional[str] = None
     frame: Optional[str] = None
     speed: Optional[str] = None
     eta: Optional[str] = None
+    fps: Optional[float] = None
+    bitrate_kbps: Optional[float] = None
+    total_size: Optional[int] = None
+    dup_frames: Optional[int] = None
+    drop_frames: Optional[int] = None
     segments: Optional[int] = None
     output_size: Optional[str] = None
+    output_bytes: Optional[int] = None
     error: Optional[str] = None
     timestamp: Optional[str] = None
 
@@ -86,4 +169,6 @@ class ServerStatus(BaseModel):
     status: str
     videos_count: int
     disk_usage: str
+    disk_usage_bytes: int = 0
+    segments_count: int = 0
     uptime: str
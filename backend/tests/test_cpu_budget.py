@@ -0,0 +1,121 @@
+import cpu_budget
+from cpu_budget import CPUAllocator, CPUBudget
+
+EIGHT_CPUS = list(range(8))
+
+
+def test_reserved_cores_are_left_out():
+    allocator = CPUAllocator(2, reserved=2, cpus=EIGHT_CPUS)
+    assert allocator.cpus == [2, 3, 4, 5, 6, 7]
+
+
+def test_every_core_is_never_reserved():
+    allocator = CPUAllocator(2, reserved=4, cpus=[0, 1])
+    assert allocator.cpus == [1]
+
+
+def test_threads_are_shared_between_competing_jobs():
+    allocator = CPUAllocator(4, reserved=0, cpus=EIGHT_CPUS)
+    assert allocator.acquire("a").threads == 8
+    assert allocator.acquire("b").threads == 4
+    assert allocator.acquire("c", demand=4).threads == 2
+
+
+def test_demand_is_capped_at_max_jobs():
+    allocator = CPUAllocator(2, reserved=0, cpus=EIGHT_CPUS)
+    assert allocator.acquire("a", demand=10).threads == 4
+
+
+def test_every_job_gets_a_thread():
+    allocator = CPUAllocator(4, reserved=0, cpus=[0, 1])
+    assert allocator.acquire("a", demand=4).threads == 1
+
+
+def test_without_pinning_placement_is_left_to_the_kernel():
+    allocator = CPUAllocator(2, reserved=0, cpus=EIGHT_CPUS)
+    assert allocator.acquire("a", demand=2).cpus is None
+
+
+def test_pinned_jobs_get_disjoint_cores():
+    allocator = CPUAllocator(2, reserved=0, pin=True, cpus=EIGHT_CPUS)
+    first = allocator.acquire("a", demand=2)
+    second = allocator.acquire("b", demand=2)
+    assert first.cpus == [0, 1, 2, 3]
+    assert second.cpus == [4, 5, 6, 7]
+
+
+def test_pinning_skips_reserved_cores():
+    allocator = CPUAllocator(2, reserved=1, pin=True, cpus=[0, 1, 2, 3, 4])
+    first = allocator.acquire("a", demand=2)
+    second = allocator.acquire("b", demand=2)
+    assert first.cpus == [1, 2]
+    assert second.cpus == [3, 4]
+
+
+def test_released_cores_are_reused():
+    allocator = CPUAllocator(2, reserved=0, pin=True, cpus=EIGHT_CPUS)
+    allocator.acquire("a", demand=2)
+    allocator.acquire("b", demand=2)
+    allocator.release("a")
+    assert allocator.acquire("c", demand=2).cpus == [0, 1, 2, 3]
+
+
+def test_jobs_beyond_the_cores_share_the_least_loaded():
+    allocator = CPUAllocator(4, reserved=0, pin=True, cpus=[0, 1, 2, 3])
+    budgets = [allocator.acquire(name, demand=4) for name in "abcd"]
+    assert [budget.cpus for budget in budgets] == [[0], [1], [2], [3]]
+    allocator.release("b")
+    assert allocator.acquire("e", demand=4).cpus == [1]
+
+
+def test_acquiring_again_replaces_the_previous_budget():
+    allocator = CPUAllocator(2, reserved=0, pin=True, cpus=EIGHT_CPUS)
+    allocator.acquire("a", demand=2)
+    assert allocator.acquire("a", demand=2).cpus == [0, 1, 2, 3]
+    assert list(allocator.stats()["jobs"]) == ["a"]
+    assert allocator.acquire("b", demand=2).cpus == [4, 5, 6, 7]
+
+
+def test_releasing_an_unknown_job_is_harmless():
+    allocator = CPUAllocator(2, reserved=0, pin=True, cpus=EIGHT_CPUS)
+    allocator.acquire("a", demand=2)
+    allocator.release("missing")
+    allocator.release("a")
+    allocator.release("a")
+    assert allocator.acquire("b", demand=2).cpus == [0, 1, 2, 3]
+    assert allocator.acquire("c", demand=2).cpus == [4, 5, 6, 7]
+
+
+def test_stats():
+    allocator = CPUAllocator(2, reserved=0, pin=True, cpus=EIGHT_CPUS)
+    allocator.acquire("a", demand=2)
+    stats = allocator.stats()
+    assert stats["cpus"] == 8
+    assert stats["pinning"] is True
+    assert stats["allotted_threads"] == 4
+    assert stats["jobs"]["a"]["cpus"] == [0, 1, 2, 3]
+
+
+def test_process_priority():
+    allocator = CPUAllocator(1, base_nice=10, cpus=EIGHT_CPUS)
+    assert allocator.process_priority(0) == {"nice": 10, "ionice_class": 2, "ionice_level": 4}
+    assert allocator.process_priority(10) == {"nice": 0, "ionice_class": 2, "ionice_level": 0}
+    assert allocator.process_priority(50)["nice"] == 0
+    assert allocator.process_priority(-20)["nice"] == 19
+    assert allocator.process_priority(-1) == {"nice": 11, "ionice_class": 3, "ionice_level": 0}
+
+
+def test_command_prefix(monkeypatch):
+    monkeypatch.setattr(cpu_budget.shutil, "which", lambda name: f"/usr/bin/{name}")
+    budget = CPUBudget(threads=2, cpus=[2, 3], nice=10, ionice_class=2, ionice_level=4)
+    assert budget.command_prefix() == [
+        "nice", "-n", "10", "ionice", "-c", "2", "-n", "4", "taskset", "-c", "2,3",
+    ]
+    idle = CPUBudget(threads=2, cpus=None, nice=0, ionice_class=3, ionice_level=0)
+    assert idle.command_prefix() == ["ionice", "-c", "3"]
+
+
+def test_command_prefix_skips_missing_tools(monkeypatch):
+    monkeypatch.setattr(cpu_budget.shutil, "which", lambda name: None)
+    budget = CPUBudget(threads=2, cpus=[2, 3], nice=10, ionice_class=2, ionice_level=4)
+    assert budget.command_prefix() == []
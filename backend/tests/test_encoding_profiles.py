@@ -0,0 +1,74 @@
+import pytest
+
+from encoding_profiles import DEFAULT_PROFILE, ENCODING_PROFILES, resolve_encoding
+
+
+def test_default_profile_exists():
+    assert DEFAULT_PROFILE in ENCODING_PROFILES
+
+
+@pytest.mark.parametrize("profile", list(ENCODING_PROFILES))
+def test_profiles_resolve_to_their_settings(profile):
+    assert resolve_encoding(profile) == ENCODING_PROFILES[profile]
+
+
+def test_overrides_are_applied():
+    settings = resolve_encoding("standard", {"crf": 18, "preset": "slow", "tune": None, "audio_bitrate": "160k"})
+    assert settings["crf"] == 18
+    assert settings["preset"] == "slow"
+    assert settings["tune"] is None
+    assert settings["audio_bitrate"] == "160k"
+    assert settings["gop"] == ENCODING_PROFILES["standard"]["gop"]
+
+
+def test_overrides_do_not_change_the_profile():
+    resolve_encoding("fast", {"crf": 30})
+    assert ENCODING_PROFILES["fast"]["crf"] == 23
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="Unknown encoding profile"):
+        resolve_encoding("ludicrous")
+
+
+def test_unknown_setting_is_rejected():
+    with pytest.raises(ValueError, match="Unknown encoding setting"):
+        resolve_encoding("standard", {"vcodec": "libx265"})
+
+
+@pytest.mark.parametrize("key, value", [
+    ("preset", "warp"),
+    ("crf", -1),
+    ("crf", 52),
+    ("crf", 23.5),
+    ("crf", True),
+    ("crf", "23"),
+    ("gop", 0),
+    ("gop", 31),
+    ("gop", False),
+    ("tune", "cinema"),
+    ("audio_bitrate", "128"),
+    ("audio_bitrate", "16k"),
+    ("audio_bitrate", "1024k"),
+    ("audio_bitrate", 128),
+    ("threads", -1),
+    ("threads", 65),
+    ("threads", 2.0),
+])
+def test_out_of_range_overrides_are_rejected(key, value):
+    with pytest.raises(ValueError, match=f"Invalid value for encoding setting {key}"):
+        resolve_encoding("standard", {key: value})
+
+
+@pytest.mark.parametrize("key, value", [
+    ("crf", 0),
+    ("crf", 51),
+    ("gop", 0.5),
+    ("gop", 30),
+    ("audio_bitrate", "32k"),
+    ("audio_bitrate", "512k"),
+    ("threads", 0),
+    ("threads", 64),
+])
+def test_boundary_overrides_are_accepted(key, value):
+    assert resolve_encoding("standard", {key: value})[key] == value
@@ -0,0 +1,93 @@
+from ffmpeg_progress import FFmpegProgressParser, parse_progress_block
+
+BLOCK = """frame=250
+fps=49.87
+stream_0_0_q=28.0
+bitrate=1234.5kbits/s
+total_size=1543210
+out_time_us=10000000
+out_time_ms=10000000
+out_time=00:00:10.000000
+dup_frames=1
+drop_frames=2
+speed=1.99x
+progress=continue"""
+
+
+def feed_all(parser, text):
+    return [block for block in map(parser.feed, text.splitlines()) if block is not None]
+
+
+def test_complete_block_is_parsed():
+    [block] = feed_all(FFmpegProgressParser(), BLOCK)
+    assert block == {
+        "out_time": 10.0,
+        "frame": 250,
+        "fps": 49.87,
+        "bitrate_kbps": 1234.5,
+        "total_size": 1543210,
+        "speed": 1.99,
+        "dup_frames": 1,
+        "drop_frames": 2,
+        "end": False,
+    }
+
+
+def test_partial_block_emits_nothing_until_progress_line():
+    parser = FFmpegProgressParser()
+    lines = BLOCK.splitlines()
+    assert feed_all(parser, "\n".join(lines[:-1])) == []
+    block = parser.feed(lines[-1])
+    assert block is not None and block["frame"] == 250
+
+
+def test_one_update_per_block():
+    blocks = feed_all(FFmpegProgressParser(), BLOCK + "\n" + BLOCK.replace("frame=250", "frame=500"))
+    assert [block["frame"] for block in blocks] == [250, 500]
+
+
+def test_progress_end_marks_the_last_block():
+    [block] = feed_all(FFmpegProgressParser(), BLOCK.replace("progress=continue", "progress=end"))
+    assert block["end"] is True
+
+
+def test_not_available_values_are_none():
+    block = parse_progress_block({
+        "fps": "N/A",
+        "bitrate": "N/A",
+        "speed": "N/A",
+        "total_size": "N/A",
+        "out_time_us": "N/A",
+        "progress": "continue",
+    })
+    assert block["fps"] is None
+    assert block["bitrate_kbps"] is None
+    assert block["speed"] is None
+    assert block["total_size"] is None
+    assert block["out_time"] is None
+    assert block["frame"] is None
+
+
+def test_out_time_ms_is_read_as_microseconds():
+    assert parse_progress_block({"out_time_ms": "2500000"})["out_time"] == 2.5
+
+
+def test_negative_out_time_is_clamped():
+    assert parse_progress_block({"out_time_us": "-23220"})["out_time"] == 0.0
+
+
+def test_out_time_never_goes_back():
+    parser = FFmpegProgressParser()
+    first = feed_all(parser, "out_time_us=5000000\nprogress=continue")[0]
+    stalled = feed_all(parser, "out_time_us=N/A\nprogress=continue")[0]
+    back = feed_all(parser, "out_time_us=4000000\nprogress=continue")[0]
+    ahead = feed_all(parser, "out_time_us=6000000\nprogress=end")[0]
+    assert [first["out_time"], stalled["out_time"], back["out_time"], ahead["out_time"]] == [5.0, 5.0, 5.0, 6.0]
+
+
+def test_lines_without_a_value_are_ignored():
+    parser = FFmpegProgressParser()
+    assert parser.feed("") is None
+    assert parser.feed("Press [q] to stop") is None
+    [block] = feed_all(parser, "frame=3\nprogress=continue")
+    assert block["frame"] == 3
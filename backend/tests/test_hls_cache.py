@@ -0,0 +1,92 @@
+import asyncio
+from pathlib import Path
+
+from hls_cache import HLSAssetCache
+from hls_delivery import make_etag
+
+
+def test_evicts_least_recently_used_to_stay_in_budget():
+    cache = HLSAssetCache(max_bytes=10, max_entry_bytes=10)
+    cache.put("v", Path("a"), "e", b"aaaa")
+    cache.put("v", Path("b"), "e", b"bbbb")
+    # Reading "a" makes "b" the oldest entry
+    assert cache.get("v", Path("a"), "e") == b"aaaa"
+    cache.put("v", Path("c"), "e", b"cccc")
+
+    assert cache.get("v", Path("b"), "e") is None
+    assert cache.get("v", Path("a"), "e") == b"aaaa"
+    assert cache.get("v", Path("c"), "e") == b"cccc"
+    assert cache.size_bytes == 8
+    assert cache.evictions == 1
+
+
+def test_replacing_an_entry_does_not_double_count():
+    cache = HLSAssetCache(max_bytes=10, max_entry_bytes=10)
+    cache.put("v", Path("a"), "e1", b"aaaa")
+    cache.put("v", Path("a"), "e2", b"aaaaaa")
+    assert cache.size_bytes == 6
+    assert cache.evictions == 0
+
+
+def test_etag_mismatch_is_a_miss():
+    cache = HLSAssetCache(max_bytes=10, max_entry_bytes=10)
+    cache.put("v", Path("a"), "old", b"aaaa")
+    assert cache.get("v", Path("a"), "new") is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_rejects_empty_and_oversized_entries():
+    cache = HLSAssetCache(max_bytes=100, max_entry_bytes=4)
+    assert not cache.accepts(0)
+    assert not cache.accepts(5)
+    cache.put("v", Path("a"), "e", b"aaaaa")
+    cache.put("v", Path("b"), "e", b"")
+    assert cache.stats()["entries"] == 0
+
+
+def test_entry_limit_never_exceeds_total_budget():
+    cache = HLSAssetCache(max_bytes=4, max_entry_bytes=100)
+    assert cache.max_entry_bytes == 4
+
+
+def test_invalidate_video_only_drops_that_video():
+    cache = HLSAssetCache(max_bytes=100, max_entry_bytes=100)
+    cache.put("one", Path("a"), "e", b"aaaa")
+    cache.put("one", Path("b"), "e", b"bb")
+    cache.put("two", Path("a"), "e", b"cc")
+    cache.invalidate_video("one")
+
+    assert cache.get("one", Path("a"), "e") is None
+    assert cache.get("two", Path("a"), "e") == b"cc"
+    assert cache.size_bytes == 2
+
+
+def test_stats_hit_rate():
+    cache = HLSAssetCache(max_bytes=100, max_entry_bytes=100)
+    assert cache.stats()["hit_rate"] is None
+    cache.put("v", Path("a"), "e", b"aaaa")
+    cache.get("v", Path("a"), "e")
+    cache.get("v", Path("a"), "e")
+    cache.get("v", Path("b"), "e")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_rate"] == 0.6667
+
+
+def test_prewarm_loads_playlists_and_first_segments(tmp_path):
+    (tmp_path / "playlist.m3u8").write_text(
+        "#EXTM3U\n"
+        "#EXTINF:6.0,\nsegment_000.ts\n"
+        "#EXTINF:6.0,\nsegment_001.ts\n"
+        "#EXT-X-ENDLIST\n"
+    )
+    for name in ("segment_000.ts", "segment_001.ts"):
+        (tmp_path / name).write_bytes(b"x" * 16)
+    cache = HLSAssetCache(max_bytes=1024, max_entry_bytes=1024)
+
+    loaded = asyncio.run(cache.prewarm("v", tmp_path, "playlist.m3u8", [], 1))
+
+    first = tmp_path / "segment_000.ts"
+    assert loaded == cache.size_bytes > 16
+    assert cache.get("v", first, make_etag(first.stat())) == b"x" * 16
+    assert cache.get("v", tmp_path / "segment_001.ts", make_etag((tmp_path / "segment_001.ts").stat())) is None
@@ -0,0 +1,117 @@
+import pytest
+
+from hls_delivery import RangeNotSatisfiable, is_not_modified, parse_range, version_playlist
+
+ETAG = '"1a-2b-3c"'
+MTIME = 1700000000.0
+LAST_MODIFIED = "Tue, 14 Nov 2023 22:13:20 GMT"  # MTIME
+EARLIER = "Tue, 14 Nov 2023 22:13:19 GMT"
+SIZE = 1000
+
+
+def test_no_range_header_sends_the_whole_file():
+    assert parse_range({}, SIZE, ETAG, MTIME) is None
+
+
+def test_closed_range():
+    assert parse_range({"range": "bytes=0-99"}, SIZE, ETAG, MTIME) == (0, 99)
+
+
+def test_open_ended_range():
+    assert parse_range({"range": "bytes=900-"}, SIZE, ETAG, MTIME) == (900, 999)
+
+
+def test_range_end_is_clamped_to_the_file():
+    assert parse_range({"range": "bytes=500-5000"}, SIZE, ETAG, MTIME) == (500, 999)
+
+
+def test_suffix_range():
+    assert parse_range({"range": "bytes=-100"}, SIZE, ETAG, MTIME) == (900, 999)
+
+
+def test_suffix_range_longer_than_the_file():
+    assert parse_range({"range": "bytes=-5000"}, SIZE, ETAG, MTIME) == (0, 999)
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=500-100", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range({"range": header}, SIZE, ETAG, MTIME)
+
+
+@pytest.mark.parametrize("header", ["items=0-10", "bytes=0-10,20-30", "bytes=a-b", "bytes=-"])
+def test_unsupported_ranges_send_the_whole_file(header):
+    assert parse_range({"range": header}, SIZE, ETAG, MTIME) is None
+
+
+def test_if_range_with_current_etag():
+    headers = {"range": "bytes=0-99", "if-range": ETAG}
+    assert parse_range(headers, SIZE, ETAG, MTIME) == (0, 99)
+
+
+def test_if_range_with_changed_etag():
+    headers = {"range": "bytes=0-99", "if-range": '"old"'}
+    assert parse_range(headers, SIZE, ETAG, MTIME) is None
+
+
+def test_if_range_compares_strongly():
+    headers = {"range": "bytes=0-99", "if-range": f"W/{ETAG}"}
+    assert parse_range(headers, SIZE, ETAG, MTIME) is None
+
+
+def test_if_range_with_date():
+    assert parse_range({"range": "bytes=0-99", "if-range": LAST_MODIFIED}, SIZE, ETAG, MTIME) == (0, 99)
+    assert parse_range({"range": "bytes=0-99", "if-range": EARLIER}, SIZE, ETAG, MTIME) is None
+
+
+def test_if_none_match():
+    assert is_not_modified({"if-none-match": ETAG}, ETAG, MTIME)
+    assert is_not_modified({"if-none-match": f'"other", {ETAG}'}, ETAG, MTIME)
+    assert is_not_modified({"if-none-match": "*"}, ETAG, MTIME)
+    assert not is_not_modified({"if-none-match": '"other"'}, ETAG, MTIME)
+
+
+def test_if_none_match_compares_weakly():
+    assert is_not_modified({"if-none-match": f"W/{ETAG}"}, ETAG, MTIME)
+    assert is_not_modified({"if-none-match": ETAG}, f"W/{ETAG}", MTIME)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    headers = {"if-none-match": '"other"', "if-modified-since": LAST_MODIFIED}
+    assert not is_not_modified(headers, ETAG, MTIME)
+
+
+def test_if_modified_since():
+    assert is_not_modified({"if-modified-since": LAST_MODIFIED}, ETAG, MTIME)
+    assert not is_not_modified({"if-modified-since": EARLIER}, ETAG, MTIME)
+    assert not is_not_modified({"if-modified-since": "not a date"}, ETAG, MTIME)
+    assert not is_not_modified({}, ETAG, MTIME)
+
+
+def test_version_playlist():
+    playlist = (
+        "#EXTM3U\n"
+        '#EXT-X-MAP:URI="init.mp4"\n'
+        "#EXTINF:6.0,\n"
+        "segment_000.ts\n"
+        "#EXTINF:6.0,\n"
+        "segment_001.ts?token=x\n"
+        "#EXTINF:6.0,\n"
+        "https://cdn.example.com/segment_002.ts\n"
+        "#EXTINF:6.0,\n"
+        "/hls/other/segment_003.ts\n"
+        "#EXT-X-ENDLIST\n"
+    )
+    assert version_playlist(playlist, "abc") == (
+        "#EXTM3U\n"
+        '#EXT-X-MAP:URI="init.mp4?v=abc"\n'
+        "#EXTINF:6.0,\n"
+        "segment_000.ts?v=abc\n"
+        "#EXTINF:6.0,\n"
+        "segment_001.ts?token=x&v=abc\n"
+        "#EXTINF:6.0,\n"
+        "https://cdn.example.com/segment_002.ts\n"
+        "#EXTINF:6.0,\n"
+        "/hls/other/segment_003.ts\n"
+        "#EXT-X-ENDLIST\n"
+    )
@@ -0,0 +1,86 @@
+from hls_playlist import parse_init_sections, parse_media_playlist, write_media_playlist
+
+FFMPEG_PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:7
+#EXT-X-MEDIA-SEQUENCE:0
+#EXTINF:6.006000,
+segment_000.ts
+#EXTINF:6.006000,
+segment_001.ts
+
+#EXTINF:2.502500,
+segment_002.ts
+#EXT-X-ENDLIST
+"""
+
+
+def test_parse_media_playlist(tmp_path):
+    playlist = tmp_path / "playlist.m3u8"
+    playlist.write_text(FFMPEG_PLAYLIST)
+    assert parse_media_playlist(playlist) == [
+        (6.006, "segment_000.ts"),
+        (6.006, "segment_001.ts"),
+        (2.5025, "segment_002.ts"),
+    ]
+
+
+def test_parse_skips_tags_and_unlisted_uris(tmp_path):
+    playlist = tmp_path / "playlist.m3u8"
+    playlist.write_text(
+        "#EXTM3U\n"
+        '#EXT-X-MAP:URI="init.mp4"\n'
+        "orphan.ts\n"
+        "#EXTINF:4.0,title\n"
+        "#EXT-X-DISCONTINUITY\n"
+        "segment_000.m4s\n"
+    )
+    assert parse_media_playlist(playlist) == [(4.0, "segment_000.m4s")]
+    assert parse_init_sections(playlist) == ["init.mp4"]
+
+
+def test_write_media_playlist(tmp_path):
+    playlist = tmp_path / "playlist.m3u8"
+    write_media_playlist(playlist, [(6.0, "segment_000.ts"), (4.2, "segment_001.ts")])
+    assert playlist.read_text() == (
+        "#EXTM3U\n"
+        "#EXT-X-VERSION:3\n"
+        "#EXT-X-TARGETDURATION:6\n"
+        "#EXT-X-MEDIA-SEQUENCE:0\n"
+        "#EXTINF:6.000000,\n"
+        "segment_000.ts\n"
+        "#EXTINF:4.200000,\n"
+        "segment_001.ts\n"
+        "#EXT-X-ENDLIST\n"
+    )
+    assert not (tmp_path / "playlist.m3u8.tmp").exists()
+
+
+def test_target_duration_rounds_up(tmp_path):
+    playlist = tmp_path / "playlist.m3u8"
+    write_media_playlist(playlist, [(6.006, "a.ts"), (2.0, "b.ts")])
+    assert "#EXT-X-TARGETDURATION:7\n" in playlist.read_text()
+
+
+def test_open_playlist_has_no_endlist(tmp_path):
+    playlist = tmp_path / "playlist.m3u8"
+    write_media_playlist(playlist, [(6.0, "a.ts")], ended=False)
+    assert "#EXT-X-ENDLIST" not in playlist.read_text()
+
+
+def test_discontinuities_precede_their_segments(tmp_path):
+    playlist = tmp_path / "playlist.m3u8"
+    entries = [(6.0, f"segment_{i:03d}.ts") for i in range(4)]
+    write_media_playlist(playlist, entries, discontinuities={0, 2})
+    lines = playlist.read_text().splitlines()
+    # Nothing to be discontinuous with before the first segment
+    assert lines.count("#EXT-X-DISCONTINUITY") == 1
+    assert lines[lines.index("#EXT-X-DISCONTINUITY") + 2] == "segment_002.ts"
+    assert parse_media_playlist(playlist) == entries
+
+
+def test_written_playlist_reads_back(tmp_path):
+    playlist = tmp_path / "playlist.m3u8"
+    entries = [(6.006, "segment_000.ts"), (6.006, "segment_001.ts"), (1.5, "segment_002.ts")]
+    write_media_playlist(playlist, entries)
+    assert parse_media_playlist(playlist) == entries
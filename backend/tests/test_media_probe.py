@@ -0,0 +1,48 @@
+from media_probe import _parse_keyframes, is_streamable
+
+
+def box(box_type: bytes, payload_size: int = 8) -> bytes:
+    return (8 + payload_size).to_bytes(4, "big") + box_type + b"\0" * payload_size
+
+
+def large_box(box_type: bytes, payload_size: int = 8) -> bytes:
+    # size 1: the real size follows as a 64-bit field
+    return (1).to_bytes(4, "big") + box_type + (16 + payload_size).to_bytes(8, "big") + b"\0" * payload_size
+
+
+def test_pipe_friendly_containers_are_streamable():
+    for name in ("clip.mkv", "clip.WEBM", "clip.flv"):
+        assert is_streamable(name, b"")
+
+
+def test_other_containers_are_not():
+    assert not is_streamable("clip.avi", box(b"moov"))
+    assert not is_streamable("clip.wmv", b"")
+
+
+def test_mp4_with_moov_first_is_streamable():
+    assert is_streamable("clip.mp4", box(b"ftyp") + box(b"moov") + box(b"mdat"))
+    assert is_streamable("clip.mov", box(b"ftyp") + box(b"free") + box(b"moov"))
+
+
+def test_mp4_with_mdat_first_is_not():
+    assert not is_streamable("clip.mp4", box(b"ftyp") + box(b"mdat") + box(b"moov"))
+
+
+def test_large_boxes_are_skipped():
+    assert is_streamable("clip.m4v", box(b"ftyp") + large_box(b"free") + box(b"moov"))
+
+
+def test_head_ending_before_moov_is_not_streamable():
+    head = box(b"ftyp") + box(b"free", 1000)
+    assert not is_streamable("clip.mp4", head[:100])
+    assert not is_streamable("clip.mp4", box(b"ftyp") + (1).to_bytes(4, "big") + b"free")
+
+
+def test_corrupt_box_size_is_not_streamable():
+    assert not is_streamable("clip.mp4", (4).to_bytes(4, "big") + b"ftyp" + box(b"moov"))
+
+
+def test_keyframes_are_read_from_packet_csv():
+    output = "0.000000,K__\n0.040000,___\n2.000000,K_\n4.000000,K__\nN/A,K__\n1.000000,K__\n"
+    assert _parse_keyframes(output) == [0.0, 1.0, 2.0, 4.0]
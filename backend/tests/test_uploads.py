@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from uploads import as_utc, merge_range, received_bytes
+
+
+def test_merge_into_empty():
+    assert merge_range([], 0, 10) == [[0, 10]]
+
+
+def test_disjoint_ranges_stay_sorted():
+    ranges = merge_range([[20, 30]], 0, 10)
+    assert ranges == [[0, 10], [20, 30]]
+    assert received_bytes(ranges) == 20
+
+
+def test_overlapping_ranges_merge():
+    assert merge_range([[0, 10]], 5, 15) == [[0, 15]]
+    assert merge_range([[5, 15]], 0, 10) == [[0, 15]]
+
+
+def test_contained_range_changes_nothing():
+    assert merge_range([[0, 100]], 10, 20) == [[0, 100]]
+
+
+def test_adjacent_ranges_merge():
+    assert merge_range([[0, 10]], 10, 20) == [[0, 20]]
+    assert merge_range([[10, 20]], 0, 10) == [[0, 20]]
+
+
+def test_range_bridging_a_gap_merges_both_neighbours():
+    assert merge_range([[0, 10], [20, 30]], 10, 20) == [[0, 30]]
+    assert merge_range([[0, 10], [20, 30], [40, 50]], 5, 45) == [[0, 50]]
+
+
+def test_out_of_order_chunks_complete_the_file():
+    ranges = []
+    for start in (30, 10, 0, 40, 20):
+        ranges = merge_range(ranges, start, start + 10)
+    assert ranges == [[0, 50]]
+    assert received_bytes(ranges) == 50
+
+
+def test_duplicate_chunk_is_counted_once():
+    ranges = merge_range(merge_range([], 0, 10), 0, 10)
+    assert ranges == [[0, 10]]
+    assert received_bytes(ranges) == 10
+
+
+def test_as_utc_treats_naive_values_as_utc():
+    naive = datetime(2024, 1, 1, 12, 0)
+    assert as_utc(naive) == datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def test_as_utc_converts_aware_values():
+    aware = datetime(2024, 1, 1, 14, 0, tzinfo=timezone(timedelta(hours=2)))
+    result = as_utc(aware)
+    assert result.tzinfo == timezone.utc
+    assert result.hour == 12
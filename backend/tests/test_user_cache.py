@@ -0,0 +1,48 @@
+import time
+
+from models import User
+from user_cache import AuthUser, UserCache
+
+
+def make_user(user_id=1, username="alice"):
+    return AuthUser.of(User(id=user_id, username=username, email=f"{username}@example.com", is_active=True))
+
+
+def test_caches_an_immutable_snapshot():
+    user = make_user()
+    assert user == AuthUser(1, "alice", True)
+    cache = UserCache()
+    cache.put("header.payload.sig", user)
+    cached = cache.get("header.payload.sig")
+    assert cached == user
+    assert not isinstance(cached, User)
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_expired_token_is_a_miss():
+    cache = UserCache(ttl=60)
+    cache.put("a.b.expired", make_user(), token_expires=time.time() - 1)
+    assert cache.get("a.b.expired") is None
+    assert cache.misses == 1
+
+
+def test_invalidate_user_drops_all_tokens():
+    cache = UserCache()
+    cache.put("a.b.one", make_user())
+    cache.put("a.b.two", make_user())
+    cache.put("a.b.three", make_user(2, "bob"))
+    cache.invalidate_user(1)
+    assert cache.get("a.b.one") is None
+    assert cache.get("a.b.two") is None
+    assert cache.get("a.b.three") == AuthUser(2, "bob", True)
+
+
+def test_evicts_least_recently_used_token():
+    cache = UserCache(max_size=2)
+    cache.put("a.b.one", make_user())
+    cache.put("a.b.two", make_user(2, "bob"))
+    cache.get("a.b.one")
+    cache.put("a.b.three", make_user(3, "carol"))
+    assert cache.get("a.b.two") is None
+    assert cache.get("a.b.one") is not None
+    assert cache.stats()["size"] == 2
@@ -0,0 +1,130 @@
+import asyncio
+
+from ws_connections import ALL_TOPIC, ClientConnection, ConnectionRegistry, topics_of_video, user_topic, video_topic
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.accepted = False
+        self.closed = False
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+class BrokenWebSocket(FakeWebSocket):
+    async def send_json(self, message):
+        raise RuntimeError("connection reset")
+
+
+async def until(condition, timeout=1.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_offer_coalesces_same_key():
+    connection = ClientConnection(FakeWebSocket(), max_pending=4, send_timeout=1)
+    assert connection.offer("a", {"progress": 10})
+    assert connection.offer("b", {"progress": 5})
+    assert connection.offer("a", {"progress": 20})
+    # The newer state replaces the unsent one and keeps its place in the queue
+    assert list(connection._pending.items()) == [("a", {"progress": 20}), ("b", {"progress": 5})]
+    assert connection.dropped == 0
+
+
+def test_offer_drops_oldest_when_full():
+    connection = ClientConnection(FakeWebSocket(), max_pending=2, send_timeout=1)
+    assert connection.offer("a", {})
+    assert connection.offer("b", {})
+    assert not connection.offer("c", {})
+    assert list(connection._pending) == ["b", "c"]
+    assert connection.dropped == 1
+
+
+def test_topics_of_video():
+    assert topics_of_video("clip", None) == [video_topic("clip"), ALL_TOPIC]
+    assert topics_of_video("clip", 7) == [video_topic("clip"), ALL_TOPIC, user_topic(7)]
+
+
+def test_publish_reaches_each_subscriber_once():
+    registry = ConnectionRegistry(max_pending=4)
+    by_video = ClientConnection(FakeWebSocket(), 4, 1)
+    by_owner = ClientConnection(FakeWebSocket(), 4, 1)
+    by_both = ClientConnection(FakeWebSocket(), 4, 1)
+    other = ClientConnection(FakeWebSocket(), 4, 1)
+    registry.subscribe(by_video, video_topic("clip"))
+    registry.subscribe(by_owner, user_topic(7))
+    registry.subscribe(by_both, video_topic("clip"))
+    registry.subscribe(by_both, ALL_TOPIC)
+    registry.subscribe(other, video_topic("other"))
+
+    registry.publish_progress("clip", 7, {"progress": 50})
+
+    expected = {"type": "progress", "video_name": "clip", "progress": 50}
+    for connection in (by_video, by_owner, by_both):
+        assert list(connection._pending.items()) == [("clip", expected)]
+    assert not other._pending
+
+
+def test_unsubscribe_removes_empty_topics():
+    registry = ConnectionRegistry()
+    connection = ClientConnection(FakeWebSocket(), 4, 1)
+    registry.subscribe(connection, video_topic("clip"))
+    registry.unsubscribe(connection, video_topic("clip"))
+    assert registry.topics == {}
+    registry.publish([video_topic("clip")], "clip", {})
+    assert not connection._pending
+
+
+def test_dropped_messages_are_counted():
+    registry = ConnectionRegistry(max_pending=1)
+    connection = ClientConnection(FakeWebSocket(), 1, 1)
+    registry.subscribe(connection, ALL_TOPIC)
+    registry.publish([ALL_TOPIC], "a", {})
+    registry.publish([ALL_TOPIC], "a", {})
+    assert registry.dropped_messages == 0
+    registry.publish([ALL_TOPIC], "b", {})
+    assert registry.dropped_messages == 1
+
+
+def test_writer_sends_latest_state_in_order():
+    async def scenario():
+        registry = ConnectionRegistry(max_pending=4)
+        websocket = FakeWebSocket()
+        connection = await registry.connect(websocket)
+        # Queued before the writer gets to run, so "a" is coalesced
+        connection.offer("a", {"n": 1})
+        connection.offer("b", {"n": 2})
+        connection.offer("a", {"n": 3})
+        await until(lambda: len(websocket.sent) == 2)
+        registry.disconnect(connection)
+        return websocket
+
+    websocket = asyncio.run(scenario())
+    assert websocket.accepted
+    assert websocket.sent == [{"n": 3}, {"n": 2}]
+
+
+def test_writer_failure_disconnects_client():
+    async def scenario():
+        registry = ConnectionRegistry()
+        websocket = BrokenWebSocket()
+        connection = await registry.connect(websocket)
+        registry.subscribe(connection, ALL_TOPIC)
+        connection.offer("a", {})
+        await until(lambda: websocket.closed)
+        return registry, websocket
+
+    registry, websocket = asyncio.run(scenario())
+    assert websocket.closed
+    assert not registry.connections
+    assert registry.topics == {}
@@ -0,0 +1,150 @@
+"""
+Deferred deletion
+Output directories are renamed into a trash directory (instant, atomic) and
+removed in the background by a reaper with bounded I/O concurrency
+"""
+import asyncio
+import os
+import secrets
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from disk_usage import format_size
+
+UNLINK_BATCH_SIZE = 256  # files removed per worker-thread call
+
+
+def _list_tree(root: Path) -> Tuple[List[str], List[str]]:
+    """Return (files, directories) under ``root``; directories deepest first"""
+    files: List[str] = []
+    directories: List[str] = []
+    pending = [str(root)]
+    while pending:
+        directory = pending.pop()
+        directories.append(directory)
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(entry.path)
+            else:
+                files.append(entry.path)
+    directories.reverse()
+    return files, directories
+
+
+def _unlink_batch(paths: List[str]) -> int:
+    """Unlink files; returns the bytes actually freed
+
+    Files with other hard links (e.g. shared with the conversion cache) free nothing.
+    """
+    freed = 0
+    for path in paths:
+        try:
+            stat_result = os.lstat(path)
+            os.unlink(path)
+        except FileNotFoundError:
+            continue
+        if stat_result.st_nlink <= 1:
+            freed += stat_result.st_size
+    return freed
+
+
+def _remove_directories(directories: List[str]):
+    for directory in directories:
+        try:
+            os.rmdir(directory)
+        except FileNotFoundError:
+            pass
+
+
+class TrashReaper:
+    """Move directories into ``trash_dir`` and delete them in the background
+
+    ``trash_dir`` must be on the same filesystem as the directories trashed, so
+    moving one is a single rename. At most ``concurrency`` worker threads unlink
+    files at a time, leaving the default thread pool to the rest of the server.
+    """
+
+    def __init__(self, trash_dir: Path, concurrency: int = 4):
+        self.trash_dir = trash_dir
+        self.concurrency = max(1, concurrency)
+        self.reclaimed_bytes = 0
+        self.reaped = 0
+        self._wakeup = asyncio.Event()
+
+    def move_to_trash(self, path: Path) -> Optional[Path]:
+        """Rename ``path`` into the trash; returns the new location, None if it did not exist
+
+        Runs in a worker thread and does not wake the reaper; use ``trash()`` from the event loop.
+        """
+        self.trash_dir.mkdir(parents=True, exist_ok=True)
+        target = self.trash_dir / f"{path.name}.{secrets.token_hex(4)}"
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            return None
+        return target
+
+    async def trash(self, path: Path) -> Optional[Path]:
+        target = await asyncio.to_thread(self.move_to_trash, path)
+        # asyncio.Event is not thread-safe, so it is only set back on the loop
+        if target is not None:
+            self._wakeup.set()
+        return target
+
+    def pending(self) -> int:
+        try:
+            return sum(1 for _ in os.scandir(self.trash_dir))
+        except FileNotFoundError:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending(),
+            "reaped": self.reaped,
+            "reclaimed_bytes": self.reclaimed_bytes,
+        }
+
+    async def reap(self) -> Tuple[int, int]:
+        """Delete everything currently in the trash; returns (entries removed, bytes freed)"""
+        try:
+            entries = await asyncio.to_thread(lambda: list(os.scandir(self.trash_dir)))
+        except FileNotFoundError:
+            return 0, 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def unlink(batch: List[str]) -> int:
+            async with semaphore:
+                return await asyncio.to_thread(_unlink_batch, batch)
+
+        removed = 0
+        freed = 0
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                files, directories = await asyncio.to_thread(_list_tree, Path(entry.path))
+                batches = [files[i:i + UNLINK_BATCH_SIZE] for i in range(0, len(files), UNLINK_BATCH_SIZE)]
+                freed += sum(await asyncio.gather(*(unlink(batch) for batch in batches)))
+                await asyncio.to_thread(_remove_directories, directories)
+            else:
+                freed += await asyncio.to_thread(_unlink_batch, [entry.path])
+            removed += 1
+
+        self.reaped += removed
+        self.reclaimed_bytes += freed
+        return removed, freed
+
+    async def run(self):
+        """Reap whenever something is trashed (and once at startup, for leftovers)"""
+        while True:
+            self._wakeup.clear()
+            try:
+                removed, freed = await self.reap()
+                if removed:
+                    print(f"Reclaimed {format_size(freed)} from {removed} deleted item(s)")
+            except Exception as e:
+                print(f"Trash cleanup failed: {e}")
+            await self._wakeup.wait()
@@ -0,0 +1,246 @@
+"""
+Resumable chunked uploads
+Clients create a session, PUT byte ranges (in any order, in parallel) and complete it;
+the assembled file is renamed into INPUT_DIR without copying
+"""
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from models import UploadSession
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+WRITE_BUFFER_SIZE = 1024 * 1024  # bytes collected before each positioned write
+GC_INTERVAL_SECONDS = 3600  # how often stale sessions are looked for
+
+# [start, end) byte range
+ByteRange = List[int]
+
+
+class UploadError(Exception):
+    """Invalid upload request; ``status_code`` is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def as_utc(value: datetime) -> datetime:
+    """Timezone-aware UTC datetime from a column value
+
+    PostgreSQL returns aware datetimes; SQLite returns naive ones, stored in UTC.
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def merge_range(ranges: List[ByteRange], start: int, end: int) -> List[ByteRange]:
+    """Add [start, end) to a sorted list of disjoint ranges, merging neighbours"""
+    merged: List[ByteRange] = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def received_bytes(ranges: List[ByteRange]) -> int:
+    return sum(end - start for start, end in ranges)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _preallocate(path: Path, size: int):
+    # Sparse file of the final size, so chunks can be written at any offset
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+
+async def save_stream(chunks: AsyncIterator[bytes], partial_file: Path, target: Path) -> int:
+    """Write a request body to ``partial_file`` and rename it to ``target``; returns the size"""
+    size = 0
+    try:
+        with open(partial_file, "wb") as f:
+            async for data in chunks:
+                await asyncio.to_thread(f.write, data)
+                size += len(data)
+    except BaseException:
+        partial_file.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(os.replace, partial_file, target)
+    return size
+
+
+class UploadManager:
+    """Upload sessions stored in the database, data in preallocated files under ``upload_dir``
+
+    Chunks are written with positioned writes, so concurrent PUTs of different
+    ranges never interfere. Only the bookkeeping of received ranges is serialized.
+    """
+
+    def __init__(self, upload_dir: Path, ttl_hours: float = 24):
+        self.upload_dir = upload_dir
+        self.ttl = timedelta(hours=ttl_hours)
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def partial_path(self, upload_id: str) -> Path:
+        return self.upload_dir / f"{upload_id}.part"
+
+    def expires_at(self, session: UploadSession) -> datetime:
+        return as_utc(session.updated_at or session.created_at) + self.ttl
+
+    async def create(self, filename: str, size: int, checksum: Optional[str], user_id: Optional[int]) -> UploadSession:
+        upload_id = secrets.token_hex(16)
+        await asyncio.to_thread(_preallocate, self.partial_path(upload_id), size)
+
+        now = datetime.now(timezone.utc)
+        session = UploadSession(
+            id=upload_id,
+            filename=filename,
+            total_size=size,
+            checksum=checksum.lower() if checksum else None,
+            received_ranges="[]",
+            user_id=user_id,
+            created_at=now,
+            updated_at=now,
+        )
+        async with AsyncSessionLocal() as db:
+            db.add(session)
+            await db.commit()
+        return session
+
+    async def get(self, upload_id: str) -> Optional[UploadSession]:
+        async with AsyncSessionLocal() as db:
+            return await db.get(UploadSession, upload_id)
+
+    async def write_chunk(self, session: UploadSession, offset: int, length: Optional[int], body: AsyncIterator[bytes]) -> UploadSession:
+        """Store a request body at ``offset`` and record the range that was actually written
+
+        If the client disconnects midway, the bytes received so far still count.
+        """
+        if offset < 0 or offset >= session.total_size:
+            raise UploadError("Offset outside of the file", 416)
+        if length is not None and offset + length > session.total_size:
+            raise UploadError("Chunk extends past the end of the file", 416)
+
+        written = 0
+        fd = await asyncio.to_thread(os.open, self.partial_path(session.id), os.O_WRONLY)
+        try:
+            buffer = bytearray()
+            async for data in body:
+                if offset + written + len(buffer) + len(data) > session.total_size:
+                    raise UploadError("Chunk extends past the end of the file", 416)
+                buffer += data
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    await asyncio.to_thread(os.pwrite, fd, bytes(buffer), offset + written)
+                    written += len(buffer)
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(os.pwrite, fd, bytes(buffer), offset + written)
+                written += len(buffer)
+        finally:
+            await asyncio.to_thread(os.close, fd)
+            if written:
+                session = await self._record(session.id, offset, offset + written)
+        return session
+
+    async def _record(self, upload_id: str, start: int, end: int) -> UploadSession:
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            async with AsyncSessionLocal() as db:
+                session = await db.get(UploadSession, upload_id)
+                if session is None:
+                    raise UploadError("Upload session not found", 404)
+                ranges = merge_range(json.loads(session.received_ranges or "[]"), start, end)
+                session.received_ranges = json.dumps(ranges)
+                session.updated_at = datetime.now(timezone.utc)
+                await db.commit()
+                return session
+
+    async def complete(self, session: UploadSession, target: Path, checksum: Optional[str]) -> int:
+        """Verify the assembled file and move it to ``target``; returns the file size"""
+        lock = self._locks.setdefault(session.id, asyncio.Lock())
+        async with lock:
+            async with AsyncSessionLocal() as db:
+                session = await db.get(UploadSession, session.id)
+                if session is None:
+                    raise UploadError("Upload session not found", 404)
+
+                ranges = json.loads(session.received_ranges or "[]")
+                if ranges != [[0, session.total_size]] and session.total_size > 0:
+                    missing = session.total_size - received_bytes(ranges)
+                    raise UploadError(f"Upload incomplete, {missing} bytes missing", 409)
+
+                partial = self.partial_path(session.id)
+                expected = (checksum or session.checksum or "").lower()
+                if expected:
+                    actual = await asyncio.to_thread(file_sha256, partial)
+                    if actual != expected:
+                        raise UploadError("Checksum mismatch", 422)
+
+                # Same filesystem: a rename, the data is not copied
+                await asyncio.to_thread(os.replace, partial, target)
+                await db.delete(session)
+                await db.commit()
+
+        self._locks.pop(session.id, None)
+        return session.total_size
+
+    async def abort(self, session: UploadSession):
+        async with AsyncSessionLocal() as db:
+            stored = await db.get(UploadSession, session.id)
+            if stored is not None:
+                await db.delete(stored)
+                await db.commit()
+        self.partial_path(session.id).unlink(missing_ok=True)
+        self._locks.pop(session.id, None)
+
+    async def collect_garbage(self) -> int:
+        """Delete sessions idle for longer than the TTL, and orphaned partial files"""
+        cutoff = datetime.now(timezone.utc) - self.ttl
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(UploadSession))
+            sessions = result.scalars().all()
+            known = {session.id for session in sessions}
+            stale = [session for session in sessions if as_utc(session.updated_at or session.created_at) < cutoff]
+            for session in stale:
+                await db.delete(session)
+            await db.commit()
+
+        for session in stale:
+            self.partial_path(session.id).unlink(missing_ok=True)
+            self._locks.pop(session.id, None)
+
+        # Partial files without a session (e.g. the row was lost) once they are old enough
+        for path in self.upload_dir.glob("*.part"):
+            if path.stem not in known and datetime.fromtimestamp(path.stat().st_mtime, timezone.utc) < cutoff:
+                path.unlink(missing_ok=True)
+
+        return len(stale)
+
+    async def run_gc(self, interval: float = GC_INTERVAL_SECONDS):
+        """Collect stale sessions forever, every ``interval`` seconds"""
+        while True:
+            try:
+                removed = await self.collect_garbage()
+                if removed:
+                    print(f"Removed {removed} stale upload session(s)")
+            except Exception as e:
+                print(f"Upload cleanup failed: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,127 @@
+"""
+Authenticated-user cache
+Maps verified tokens to user records so repeated requests skip JWT decoding and the users query
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+
+from config import settings
+from models import User
+
+
+class AuthUser(NamedTuple):
+    """Immutable copy of the user fields request handlers need
+
+    Cached entries are shared by concurrent requests, so they must not be ORM
+    objects bound to (or detached from) one request's session.
+    """
+    id: int
+    username: str
+    is_active: bool
+
+    @classmethod
+    def of(cls, user: User) -> "AuthUser":
+        return cls(user.id, user.username, user.is_active)
+
+
+class UserCache:
+    """Bounded TTL/LRU cache of users, keyed by token signature and user id
+
+    Tokens map to a user id and expire after ``ttl`` seconds (or earlier, when the
+    token itself does). Users are stored once per id, so invalidating a user drops
+    every cached token of that user at once.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._tokens: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._users: Dict[int, AuthUser] = {}
+        self._user_refs: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # The signature segment identifies a token and is cheap to hash
+        return token.rsplit(".", 1)[-1]
+
+    def get(self, token: str) -> Optional[AuthUser]:
+        key = self._key(token)
+        entry = self._tokens.get(key)
+        user = None
+        if entry is not None:
+            user_id, expires_at = entry
+            if expires_at > time.monotonic():
+                user = self._users.get(user_id)
+            if user is None:
+                self._drop(key)
+
+        if user is None:
+            self.misses += 1
+            return None
+        self._tokens.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: AuthUser, token_expires: Optional[float] = None):
+        """Cache ``user`` for ``token``; ``token_expires`` is the token's exp claim (epoch seconds)"""
+        ttl = self.ttl
+        if token_expires is not None:
+            ttl = min(ttl, token_expires - time.time())
+        if ttl <= 0 or self.max_size <= 0:
+            return
+
+        key = self._key(token)
+        self._drop(key)
+        self._tokens[key] = (user.id, time.monotonic() + ttl)
+        self._users[user.id] = user
+        self._user_refs[user.id] = self._user_refs.get(user.id, 0) + 1
+
+        while len(self._tokens) > self.max_size:
+            self._drop(next(iter(self._tokens)))
+
+    def invalidate_user(self, user_id: int):
+        """Forget a user, e.g. after it was updated or deactivated"""
+        self._users.pop(user_id, None)
+        self._user_refs.pop(user_id, None)
+
+    def clear(self):
+        self._tokens.clear()
+        self._users.clear()
+        self._user_refs.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._tokens),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def _drop(self, key: str):
+        entry = self._tokens.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0]
+        refs = self._user_refs.get(user_id)
+        if refs is None:
+            return
+        if refs <= 1:
+            self.invalidate_user(user_id)
+        else:
+            self._user_refs[user_id] = refs - 1
+
+
+user_cache = UserCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: User):
+    # Any ORM update (deactivation, password or profile change) evicts the cached record
+    user_cache.invalidate_user(target.id)
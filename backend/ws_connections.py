@@ -0,0 +1,159 @@
+"""
+WebSocket connection registry
+Topic-based progress subscriptions with a bounded, coalescing send queue per client
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+# Topic for updates about all videos (only open to everyone while authentication is disabled)
+ALL_TOPIC = "all"
+
+
+def video_topic(video_name: str) -> str:
+    return f"video:{video_name}"
+
+
+def user_topic(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def topics_of_video(video_name: str, owner_id: Optional[int]) -> List[str]:
+    """Topics whose subscribers hear about a video: its own, its owner's and ``all``"""
+    topics = [video_topic(video_name), ALL_TOPIC]
+    if owner_id is not None:
+        topics.append(user_topic(owner_id))
+    return topics
+
+
+class ClientConnection:
+    """One WebSocket client and its pending outgoing messages
+
+    Messages are keyed (e.g. by video) and a newer message replaces an unsent
+    older one with the same key, so a slow client only ever receives the latest
+    state. When more than ``max_pending`` keys are waiting the oldest is dropped.
+    A dedicated writer task sends the queue, so publishers never await a socket.
+    """
+
+    def __init__(self, websocket: WebSocket, max_pending: int, send_timeout: float):
+        self.websocket = websocket
+        self.topics: Set[str] = set()
+        self.user_id: Optional[int] = None
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        self.dropped = 0
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self, on_close):
+        self._writer = asyncio.create_task(self._write_loop(on_close))
+
+    def stop(self):
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    def offer(self, key: str, message: Dict[str, Any]) -> bool:
+        """Queue a message without blocking; returns False if an older message had to be dropped"""
+        dropped = False
+        if key in self._pending:
+            # Coalesce: only the newest state of a key is worth sending
+            self._pending[key] = message
+        else:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+                dropped = True
+            self._pending[key] = message
+        self._ready.set()
+        return not dropped
+
+    async def _write_loop(self, on_close):
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self._pending:
+                    _, message = self._pending.popitem(last=False)
+                    await asyncio.wait_for(self.websocket.send_json(message), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Stuck or closed socket: stop serving this client
+            print(f"WebSocket send error: {e}")
+            on_close(self)
+            try:
+                await self.websocket.close()
+            except Exception:
+                pass
+
+
+class ConnectionRegistry:
+    """All open progress connections, indexed by topic
+
+    Connections live in sets so connecting, disconnecting and (un)subscribing
+    are O(1) no matter how many viewers are connected. Publishing only enqueues
+    on each subscriber; every connection's writer sends concurrently.
+    """
+
+    def __init__(self, max_pending: int = 64, send_timeout: float = 10):
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        self.connections: Set[ClientConnection] = set()
+        self.topics: Dict[str, Set[ClientConnection]] = {}
+        self.dropped_messages = 0
+
+    async def connect(self, websocket: WebSocket, user_id: Optional[int] = None) -> ClientConnection:
+        await websocket.accept()
+        connection = ClientConnection(websocket, self.max_pending, self.send_timeout)
+        connection.user_id = user_id
+        self.connections.add(connection)
+        connection.start(self.disconnect)
+        return connection
+
+    def disconnect(self, connection: ClientConnection):
+        if connection not in self.connections:
+            return
+        self.connections.discard(connection)
+        for topic in connection.topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(connection)
+                if not subscribers:
+                    del self.topics[topic]
+        connection.topics.clear()
+        connection.stop()
+
+    def subscribe(self, connection: ClientConnection, topic: str):
+        connection.topics.add(topic)
+        self.topics.setdefault(topic, set()).add(connection)
+
+    def unsubscribe(self, connection: ClientConnection, topic: str):
+        connection.topics.discard(topic)
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.topics[topic]
+
+    def publish(self, topics: Iterable[str], key: str, message: Dict[str, Any]):
+        """Queue ``message`` once for every connection subscribed to any of ``topics``"""
+        recipients: Set[ClientConnection] = set()
+        for topic in topics:
+            recipients.update(self.topics.get(topic, ()))
+        self._deliver(recipients, key, message)
+
+    def broadcast(self, key: str, message: Dict[str, Any]):
+        """Queue ``message`` for every open connection"""
+        self._deliver(self.connections, key, message)
+
+    def publish_progress(self, video_name: str, owner_id: Optional[int], data: Dict[str, Any]):
+        """Progress registry listener: push an update to the video, owner and ``all`` topics"""
+        self.publish(topics_of_video(video_name, owner_id), video_name, {"type": "progress", "video_name": video_name, **data})
+
+    def _deliver(self, recipients: Iterable[ClientConnection], key: str, message: Dict[str, Any]):
+        for connection in recipients:
+            if not connection.offer(key, message):
+                self.dropped_messages += 1
@@ -10,6 +10,25 @@ import subprocess
 import os
 import urllib.parse
 
+def read_playlist_layout(playlist):
+    """Return (segment count, segment format) of a media playlist
+
+    Segments are counted from the playlist, so MPEG-TS files, fMP4 fragments
+    (init.mp4 + .m4s) and byte ranges of a single file are all covered.
+    """
+    segments = 0
+    segment_format = 'ts'
+    with open(playlist) as f:
+        for line in f:
+            if line.startswith('#EXTINF:'):
+                segments += 1
+            elif line.startswith('#EXT-X-BYTERANGE:'):
+                segment_format = 'single'
+            elif line.startswith('#EXT-X-MAP:') and segment_format == 'ts':
+                segment_format = 'fmp4'
+    return segments, segment_format
+
+
 class APIHandler(BaseHTTPRequestHandler):
 
     def _set_headers(self, status=200, content_type='application/json'):
@@ -80,7 +99,7 @@ class APIHandler(BaseHTTPRequestHandler):
                         playlist = os.path.join(item_path, 'playlist.m3u8')
                         if os.path.exists(playlist):
                             # Count segments
-                            segments = len([f for f in os.listdir(item_path) if f.endswith('.ts')])
+                            segments, segment_format = read_playlist_layout(playlist)
                             # Get size
                             result = subprocess.run(['du', '-sh', item_path],
                                                   capture_output=True, text=True)
@@ -89,6 +108,7 @@ class APIHandler(BaseHTTPRequestHandler):
                             videos.append({
                                 'name': item,
                                 'segments': segments,
+                                'segment_format': segment_format,
                                 'size': size,
                                 'path': f'output/{item}/playlist.m3u8'
                             })